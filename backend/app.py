@@ -2,8 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import api_router
 from scheduler import start_scheduler, scheduler
+from scheduler.stream_testing import stream_test_scheduler
 from database import init_db
 from config import PATH_LOG_ROOT, LOG_FILE, LOG_LEVEL
+from utils.http_client import http_client
+from modules.stream_tracks.utils.reachability import reachability_client
+from modules.stream_tracks.utils.throughput import throughput_client
 import logging
 import logging.handlers
 import os
@@ -55,6 +59,10 @@ async def lifespan(app: FastAPI):
     if scheduler.running:
         scheduler.shutdown()
         logger.info("Scheduler shutdown")
+    await stream_test_scheduler.stop()
+    await http_client.close()
+    await reachability_client.close()
+    await throughput_client.close()
 
 def create_app():
     app = FastAPI(lifespan=lifespan)
@@ -1,25 +1,87 @@
 import re
+import asyncio
 import sqlite3
+import threading
+import time
 from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Optional
+from typing import Callable, Iterable, List, Optional, Sequence, TypeVar
 from datetime import datetime, timezone, timedelta
 from config import DATABASE_FILE
 
 import logging
 logger = logging.getLogger(__name__)
-# 创建数据库连接池
-db_pool = Queue(maxsize=5)
 
-def init_db_pool():
-    """初始化数据库连接池"""
-    global db_pool
-    for _ in range(5):
-        conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
-        db_pool.put(conn)
-    
-    # 初始化数据库结构
-    init_db()
+T = TypeVar('T')
+
+# 连接池配置
+READER_POOL_SIZE = 4  # 只读连接数，WAL模式下读写互不阻塞
+BUSY_TIMEOUT_MS = 5000  # 等待锁的最长时间（毫秒）
+CACHE_SIZE_KB = 20000  # 每个连接的页缓存大小（KB）
+MMAP_SIZE = 256 * 1024 * 1024  # 内存映射读取的大小（字节）
+
+# 只读连接池
+reader_pool = Queue(maxsize=READER_POOL_SIZE)
+# 唯一的写连接，所有写入经由写锁串行执行
+writer_conn: Optional[sqlite3.Connection] = None
+writer_lock = threading.RLock()
+# 写连接的嵌套持有深度，同一线程内嵌套使用时共享同一事务
+writer_depth = 0
+
+
+class DatabaseMetrics:
+    """连接池等待时间与锁重试统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pool_waits = {
+                'read': {'count': 0, 'total': 0.0, 'max': 0.0},
+                'write': {'count': 0, 'total': 0.0, 'max': 0.0}
+            }
+            self.lock_retries = 0
+            self.lock_errors = 0
+
+    def record_wait(self, kind: str, seconds: float):
+        with self._lock:
+            stats = self.pool_waits[kind]
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def record_lock_retry(self):
+        with self._lock:
+            self.lock_retries += 1
+
+    def record_lock_error(self):
+        with self._lock:
+            self.lock_errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'pool_wait': {
+                    kind: {
+                        'count': stats['count'],
+                        'total_ms': round(stats['total'] * 1000, 3),
+                        'avg_ms': round(stats['total'] * 1000 / stats['count'], 3) if stats['count'] else 0.0,
+                        'max_ms': round(stats['max'] * 1000, 3)
+                    }
+                    for kind, stats in self.pool_waits.items()
+                },
+                'lock_retries': self.lock_retries,
+                'lock_errors': self.lock_errors,
+                'reader_pool_size': READER_POOL_SIZE,
+                'readers_available': reader_pool.qsize()
+            }
+
+
+db_metrics = DatabaseMetrics()
+
 
 def regexp(pattern, text):
     try:
@@ -27,20 +89,157 @@ def regexp(pattern, text):
     except re.error:
         return False
 
+
+def _connect(readonly: bool = False) -> sqlite3.Connection:
+    """创建并调优数据库连接"""
+    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    conn.create_function("regexp", 2, regexp, deterministic=True)
+    return conn
+
+
+def init_db_pool():
+    """初始化数据库连接池"""
+    global writer_conn
+    writer_conn = _connect()
+    # WAL模式为数据库级设置，由写连接开启一次即可
+    writer_conn.execute("PRAGMA journal_mode = WAL")
+
+    # 初始化数据库结构
+    init_db()
+
+    for _ in range(READER_POOL_SIZE):
+        reader_pool.put(_connect(readonly=True))
+
+
+def _is_locked_error(e: Exception) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and 'locked' in str(e)
+
+
 @contextmanager
-def get_db_connection():
-    """获取数据库连接的上下文管理器"""
-    conn = db_pool.get()
+def get_read_connection():
+    """获取只读连接的上下文管理器"""
+    started = time.perf_counter()
+    conn = reader_pool.get()
+    db_metrics.record_wait('read', time.perf_counter() - started)
     try:
         yield conn
+    except Exception as e:
+        if _is_locked_error(e):
+            db_metrics.record_lock_error()
+        raise
     finally:
-        db_pool.put(conn)
+        # 结束可能残留的读事务，避免长期占用WAL快照
+        if conn.in_transaction:
+            conn.rollback()
+        reader_pool.put(conn)
+
+
+@contextmanager
+def get_write_connection():
+    """获取写连接的上下文管理器，同一时间只有一个持有者"""
+    global writer_depth
+    started = time.perf_counter()
+    writer_lock.acquire()
+    db_metrics.record_wait('write', time.perf_counter() - started)
+    writer_depth += 1
+    try:
+        yield writer_conn
+        # 最外层释放时提交遗留的事务，避免写事务长期占用写锁
+        if writer_depth == 1 and writer_conn.in_transaction:
+            writer_conn.commit()
+    except Exception as e:
+        if _is_locked_error(e):
+            db_metrics.record_lock_error()
+        if writer_depth == 1 and writer_conn.in_transaction:
+            writer_conn.rollback()
+        raise
+    finally:
+        writer_depth -= 1
+        writer_lock.release()
+
+
+
+class AsyncDatabase:
+    """数据库访问的异步封装
+
+    读操作在读线程池中使用只读连接执行，写操作在单一写线程中串行执行，
+    SQLite调用不会阻塞事件循环。
+    """
+
+    def __init__(self):
+        self.read_executor = ThreadPoolExecutor(max_workers=READER_POOL_SIZE, thread_name_prefix="db_read")
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db_write")
+
+    async def read(self, func: Callable[..., T], *args) -> T:
+        """在只读连接上执行 func(conn, *args)"""
+        def run():
+            with get_read_connection() as conn:
+                return func(conn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.read_executor, run)
+
+    async def write(self, func: Callable[..., T], *args) -> T:
+        """在写连接上执行 func(conn, *args)，未提交的事务在返回时自动提交"""
+        def run():
+            with get_write_connection() as conn:
+                return func(conn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.write_executor, run)
+
+    async def fetch_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetch_all(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetch_dicts(self, sql: str, params: Sequence = ()) -> List[dict]:
+        """查询并将每行转换为以列名为键的字典"""
+        def query(conn):
+            c = conn.execute(sql, params)
+            columns = [description[0] for description in c.description]
+            return [dict(zip(columns, row)) for row in c.fetchall()]
+        return await self.read(query)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        """执行单条写语句并提交，返回游标以读取 rowcount / lastrowid"""
+        def run(conn):
+            c = conn.execute(sql, params)
+            conn.commit()
+            return c
+        return await self.write(run)
+
+    async def execute_many(self, sql: str, seq_of_params: Iterable[Sequence]) -> sqlite3.Cursor:
+        def run(conn):
+            c = conn.executemany(sql, seq_of_params)
+            conn.commit()
+            return c
+        return await self.write(run)
+
+
+# 全局的异步数据库访问入口
+async_db = AsyncDatabase()
+
+
+def get_db_metrics() -> dict:
+    """获取连接池与锁的统计信息"""
+    return db_metrics.snapshot()
+
 
 def cleanup():
     """清理数据库连接池"""
-    while not db_pool.empty():
-        conn = db_pool.get()
+    global writer_conn
+    while not reader_pool.empty():
+        conn = reader_pool.get()
         conn.close()
+    with writer_lock:
+        if writer_conn is not None:
+            writer_conn.close()
+            writer_conn = None
 
 def load_migration_scripts():
     """加载migrations目录下的SQL脚本"""
@@ -62,7 +261,7 @@ def load_migration_scripts():
 
 def init_db():
     """初始化数据库结构和版本控制"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         c = conn.cursor()
         
         # 创建版本控制表
@@ -0,0 +1,10 @@
+-- 记录源数据的拉取状态，用于条件请求和内容去重
+ALTER TABLE stream_sources ADD COLUMN etag TEXT;
+ALTER TABLE stream_sources ADD COLUMN last_modified TEXT;
+ALTER TABLE stream_sources ADD COLUMN content_hash TEXT;
+ALTER TABLE stream_sources ADD COLUMN content_size INTEGER;
+
+ALTER TABLE epg_sources ADD COLUMN etag TEXT;
+ALTER TABLE epg_sources ADD COLUMN last_modified TEXT;
+ALTER TABLE epg_sources ADD COLUMN content_hash TEXT;
+ALTER TABLE epg_sources ADD COLUMN content_size INTEGER;
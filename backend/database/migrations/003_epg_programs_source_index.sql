@@ -0,0 +1,7 @@
+-- 同步时按源比对节目，覆盖 (source_id, channel_id, start_time, title) 的查找
+CREATE INDEX IF NOT EXISTS idx_epg_programs_source_key ON epg_programs (
+    source_id,
+    channel_id,
+    start_time,
+    title
+);
@@ -0,0 +1,178 @@
+-- 物化的频道解析结果：每个直播源频道按名称关联的EPG频道、台标、语言、分类和EPG源，
+-- 与 stream_tracks LEFT JOIN epg_channels LEFT JOIN epg_sources 的结果一一对应，
+-- 台标按 EPG本地台标 > EPG台标 > 默认台标 的顺序解析。
+-- 由下方触发器在直播源频道、EPG频道、EPG源和默认台标变化时增量维护。
+CREATE TABLE IF NOT EXISTS resolved_channels (
+    track_id       INTEGER NOT NULL,
+    epg_channel_id INTEGER,
+    channel_id     TEXT,
+    language       TEXT,
+    category       TEXT,
+    logo_url       TEXT,
+    source_name    TEXT,
+    source_id      INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_resolved_channels_track ON resolved_channels (
+    track_id,
+    epg_channel_id
+);
+
+CREATE INDEX IF NOT EXISTS idx_resolved_channels_source ON resolved_channels (
+    source_id
+);
+
+INSERT INTO resolved_channels (track_id, epg_channel_id, channel_id, language, category, logo_url, source_name, source_id)
+SELECT stream_tracks.id, epg_channels.id, epg_channels.channel_id, epg_channels.language, epg_channels.category,
+       COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                 ORDER BY priority DESC LIMIT 1)),
+       epg_sources.name, epg_sources.id
+FROM stream_tracks
+LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id;
+
+
+-- 直播源频道
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_track_insert
+AFTER INSERT ON stream_tracks
+BEGIN
+    DELETE FROM resolved_channels WHERE track_id = NEW.id;
+    INSERT INTO resolved_channels (track_id, epg_channel_id, channel_id, language, category, logo_url, source_name, source_id)
+    SELECT stream_tracks.id, epg_channels.id, epg_channels.channel_id, epg_channels.language, epg_channels.category,
+           COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                     ORDER BY priority DESC LIMIT 1)),
+           epg_sources.name, epg_sources.id
+    FROM stream_tracks
+    LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+    LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+    WHERE stream_tracks.id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_track_rename
+AFTER UPDATE OF name ON stream_tracks
+WHEN OLD.name IS NOT NEW.name
+BEGIN
+    DELETE FROM resolved_channels WHERE track_id = NEW.id;
+    INSERT INTO resolved_channels (track_id, epg_channel_id, channel_id, language, category, logo_url, source_name, source_id)
+    SELECT stream_tracks.id, epg_channels.id, epg_channels.channel_id, epg_channels.language, epg_channels.category,
+           COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                     ORDER BY priority DESC LIMIT 1)),
+           epg_sources.name, epg_sources.id
+    FROM stream_tracks
+    LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+    LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+    WHERE stream_tracks.id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_track_delete
+AFTER DELETE ON stream_tracks
+BEGIN
+    DELETE FROM resolved_channels WHERE track_id = OLD.id;
+END;
+
+
+-- EPG频道：重新解析同名的直播源频道
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_epg_insert
+AFTER INSERT ON epg_channels
+BEGIN
+    DELETE FROM resolved_channels WHERE track_id IN (SELECT id FROM stream_tracks WHERE name = NEW.display_name);
+    INSERT INTO resolved_channels (track_id, epg_channel_id, channel_id, language, category, logo_url, source_name, source_id)
+    SELECT stream_tracks.id, epg_channels.id, epg_channels.channel_id, epg_channels.language, epg_channels.category,
+           COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                     ORDER BY priority DESC LIMIT 1)),
+           epg_sources.name, epg_sources.id
+    FROM stream_tracks
+    LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+    LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+    WHERE stream_tracks.name = NEW.display_name;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_epg_update
+AFTER UPDATE ON epg_channels
+BEGIN
+    DELETE FROM resolved_channels
+    WHERE track_id IN (SELECT id FROM stream_tracks WHERE name IN (OLD.display_name, NEW.display_name));
+    INSERT INTO resolved_channels (track_id, epg_channel_id, channel_id, language, category, logo_url, source_name, source_id)
+    SELECT stream_tracks.id, epg_channels.id, epg_channels.channel_id, epg_channels.language, epg_channels.category,
+           COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                     ORDER BY priority DESC LIMIT 1)),
+           epg_sources.name, epg_sources.id
+    FROM stream_tracks
+    LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+    LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+    WHERE stream_tracks.name IN (OLD.display_name, NEW.display_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_epg_delete
+AFTER DELETE ON epg_channels
+BEGIN
+    DELETE FROM resolved_channels WHERE track_id IN (SELECT id FROM stream_tracks WHERE name = OLD.display_name);
+    INSERT INTO resolved_channels (track_id, epg_channel_id, channel_id, language, category, logo_url, source_name, source_id)
+    SELECT stream_tracks.id, epg_channels.id, epg_channels.channel_id, epg_channels.language, epg_channels.category,
+           COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                     ORDER BY priority DESC LIMIT 1)),
+           epg_sources.name, epg_sources.id
+    FROM stream_tracks
+    LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+    LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+    WHERE stream_tracks.name = OLD.display_name;
+END;
+
+
+-- EPG源：只影响源名称
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_source_rename
+AFTER UPDATE OF name ON epg_sources
+WHEN OLD.name IS NOT NEW.name
+BEGIN
+    UPDATE resolved_channels SET source_name = NEW.name WHERE source_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_source_delete
+AFTER DELETE ON epg_sources
+BEGIN
+    UPDATE resolved_channels SET source_name = NULL, source_id = NULL WHERE source_id = OLD.id;
+END;
+
+
+-- 默认台标：只影响未设置EPG台标的同名频道
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_logo_insert
+AFTER INSERT ON default_channel_logos
+BEGIN
+    UPDATE resolved_channels
+    SET logo_url = (SELECT COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                                     ORDER BY priority DESC LIMIT 1))
+                    FROM stream_tracks LEFT JOIN epg_channels ON epg_channels.id = resolved_channels.epg_channel_id
+                    WHERE stream_tracks.id = resolved_channels.track_id)
+    WHERE track_id IN (SELECT id FROM stream_tracks WHERE name = NEW.channel_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_logo_update
+AFTER UPDATE ON default_channel_logos
+BEGIN
+    UPDATE resolved_channels
+    SET logo_url = (SELECT COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                                     ORDER BY priority DESC LIMIT 1))
+                    FROM stream_tracks LEFT JOIN epg_channels ON epg_channels.id = resolved_channels.epg_channel_id
+                    WHERE stream_tracks.id = resolved_channels.track_id)
+    WHERE track_id IN (SELECT id FROM stream_tracks WHERE name IN (OLD.channel_name, NEW.channel_name));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resolved_channels_logo_delete
+AFTER DELETE ON default_channel_logos
+BEGIN
+    UPDATE resolved_channels
+    SET logo_url = (SELECT COALESCE(epg_channels.local_logo_path, epg_channels.logo_url,
+                                    (SELECT logo_url FROM default_channel_logos WHERE channel_name = stream_tracks.name
+                                     ORDER BY priority DESC LIMIT 1))
+                    FROM stream_tracks LEFT JOIN epg_channels ON epg_channels.id = resolved_channels.epg_channel_id
+                    WHERE stream_tracks.id = resolved_channels.track_id)
+    WHERE track_id IN (SELECT id FROM stream_tracks WHERE name = OLD.channel_name);
+END;
@@ -0,0 +1,208 @@
+-- 数据版本计数：生成结果依赖的表发生写入时递增，用于判断缓存的过滤结果是否仍然有效。
+-- resolved_channels 由触发器维护，EPG频道、EPG源和默认台标的变化也会反映到 channels 版本上。
+CREATE TABLE IF NOT EXISTS data_versions (
+    name    TEXT    PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO data_versions (name, version) VALUES ('channels', 0);
+
+
+-- stream_tracks
+CREATE TRIGGER IF NOT EXISTS trg_data_version_stream_tracks_insert
+AFTER INSERT ON stream_tracks
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_stream_tracks_update
+AFTER UPDATE ON stream_tracks
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_stream_tracks_delete
+AFTER DELETE ON stream_tracks
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- resolved_channels
+CREATE TRIGGER IF NOT EXISTS trg_data_version_resolved_channels_insert
+AFTER INSERT ON resolved_channels
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_resolved_channels_update
+AFTER UPDATE ON resolved_channels
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_resolved_channels_delete
+AFTER DELETE ON resolved_channels
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- filter_rules
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rules_insert
+AFTER INSERT ON filter_rules
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rules_update
+AFTER UPDATE ON filter_rules
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rules_delete
+AFTER DELETE ON filter_rules
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- filter_rule_sets
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_sets_insert
+AFTER INSERT ON filter_rule_sets
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_sets_update
+AFTER UPDATE ON filter_rule_sets
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_sets_delete
+AFTER DELETE ON filter_rule_sets
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- filter_rule_set_mappings
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_set_mappings_insert
+AFTER INSERT ON filter_rule_set_mappings
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_set_mappings_update
+AFTER UPDATE ON filter_rule_set_mappings
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_set_mappings_delete
+AFTER DELETE ON filter_rule_set_mappings
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- filter_rule_set_children
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_set_children_insert
+AFTER INSERT ON filter_rule_set_children
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_set_children_update
+AFTER UPDATE ON filter_rule_set_children
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_filter_rule_set_children_delete
+AFTER DELETE ON filter_rule_set_children
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- group_mappings
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mappings_insert
+AFTER INSERT ON group_mappings
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mappings_update
+AFTER UPDATE ON group_mappings
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mappings_delete
+AFTER DELETE ON group_mappings
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- group_mapping_templates
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mapping_templates_insert
+AFTER INSERT ON group_mapping_templates
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mapping_templates_update
+AFTER UPDATE ON group_mapping_templates
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mapping_templates_delete
+AFTER DELETE ON group_mapping_templates
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- group_mapping_template_items
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mapping_template_items_insert
+AFTER INSERT ON group_mapping_template_items
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mapping_template_items_update
+AFTER UPDATE ON group_mapping_template_items
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_group_mapping_template_items_delete
+AFTER DELETE ON group_mapping_template_items
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+
+-- sort_templates
+CREATE TRIGGER IF NOT EXISTS trg_data_version_sort_templates_insert
+AFTER INSERT ON sort_templates
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_sort_templates_update
+AFTER UPDATE ON sort_templates
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_sort_templates_delete
+AFTER DELETE ON sort_templates
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
@@ -0,0 +1,5 @@
+-- 节目按 (channel_id, source_id) 关联所属频道，导出EPG时逐个节目查找频道
+CREATE INDEX IF NOT EXISTS idx_epg_channels_channel_source ON epg_channels (
+    channel_id,
+    source_id
+);
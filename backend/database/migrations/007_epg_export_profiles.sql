@@ -0,0 +1,19 @@
+-- EPG导出配置：按时间窗口导出节目，可限定为规则集合播放列表中的频道，每个配置输出单独的文件
+CREATE TABLE IF NOT EXISTS epg_export_profiles (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    name         TEXT    NOT NULL UNIQUE,
+    rule_set_id  INTEGER,
+    past_hours   INTEGER NOT NULL DEFAULT 24,
+    future_hours INTEGER NOT NULL DEFAULT 168,
+    compress     INTEGER NOT NULL DEFAULT 1,
+    enabled      INTEGER NOT NULL DEFAULT 1,
+    last_export  TEXT,
+    FOREIGN KEY (
+        rule_set_id
+    )
+    REFERENCES filter_rule_sets (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_epg_export_profiles_rule_set ON epg_export_profiles (
+    rule_set_id
+);
@@ -0,0 +1,24 @@
+-- 规则集合输出的构建记录：记录每次重新生成的原因、依赖指纹和耗时，
+-- 最近一次成功构建的指纹用于判断依赖是否发生变化，未变化的规则集合不重新生成。
+CREATE TABLE IF NOT EXISTS rule_set_builds (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule_set_id  INTEGER NOT NULL,
+    cause        TEXT    NOT NULL,
+    changed      TEXT,
+    fingerprint  TEXT,
+    status       TEXT    NOT NULL
+                         CHECK (status IN ('success', 'failed') ),
+    error        TEXT,
+    files        TEXT,
+    started_at   TEXT    NOT NULL,
+    duration_ms  INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (
+        rule_set_id
+    )
+    REFERENCES filter_rule_sets (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_rule_set_builds_rule_set ON rule_set_builds (
+    rule_set_id,
+    id
+);
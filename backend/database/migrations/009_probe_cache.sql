@@ -0,0 +1,13 @@
+-- 流探测结果缓存：按规范化后的URL保存ffprobe的探测结果（编码、分辨率、码率），
+-- 在有效期内且HLS主播放列表指纹未变化时复用，重复测试只需确认可达性和测速。
+CREATE TABLE IF NOT EXISTS probe_cache (
+    url_key       TEXT    PRIMARY KEY,
+    url           TEXT    NOT NULL,
+    fingerprint   TEXT,
+    probe_result  TEXT    NOT NULL,
+    probed_at     TEXT    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_probe_cache_probed_at ON probe_cache (
+    probed_at
+);
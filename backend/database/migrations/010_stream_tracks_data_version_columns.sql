@@ -0,0 +1,25 @@
+-- stream_tracks 的更新只在过滤规则和生成结果读取的列真正变化时递增 channels 版本，
+-- 测试时间、失败次数、延迟等测试记录的写入不再使过滤结果缓存失效、触发输出重新生成。
+-- 列与 CHANNEL_FIELD_COLUMNS 及 _get_filtered_channels 查询的 stream_tracks 列保持一致。
+DROP TRIGGER IF EXISTS trg_data_version_stream_tracks_update;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_stream_tracks_update
+AFTER UPDATE OF name, url, tvg_name, tvg_logo, tvg_language, group_title, test_status,
+                catchup, catchup_source, download_speed, resolution, bitrate, quality_score
+ON stream_tracks
+WHEN OLD.name IS NOT NEW.name
+  OR OLD.url IS NOT NEW.url
+  OR OLD.tvg_name IS NOT NEW.tvg_name
+  OR OLD.tvg_logo IS NOT NEW.tvg_logo
+  OR OLD.tvg_language IS NOT NEW.tvg_language
+  OR OLD.group_title IS NOT NEW.group_title
+  OR OLD.test_status IS NOT NEW.test_status
+  OR OLD.catchup IS NOT NEW.catchup
+  OR OLD.catchup_source IS NOT NEW.catchup_source
+  OR OLD.download_speed IS NOT NEW.download_speed
+  OR OLD.resolution IS NOT NEW.resolution
+  OR OLD.bitrate IS NOT NEW.bitrate
+  OR OLD.quality_score IS NOT NEW.quality_score
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
@@ -0,0 +1,24 @@
+-- EPG导出配置决定播放列表的x-tvg-url：配置增删、名称、规则集合、启用状态变化，
+-- 或首次导出完成（last_export 由空变为非空）时递增 channels 版本，触发播放列表重新生成。
+-- 定期导出只更新 last_export 的时间，不改变播放列表内容，不递增版本。
+CREATE TRIGGER IF NOT EXISTS trg_data_version_epg_export_profiles_insert
+AFTER INSERT ON epg_export_profiles
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_epg_export_profiles_update
+AFTER UPDATE OF name, rule_set_id, enabled, last_export ON epg_export_profiles
+WHEN OLD.name IS NOT NEW.name
+  OR OLD.rule_set_id IS NOT NEW.rule_set_id
+  OR OLD.enabled IS NOT NEW.enabled
+  OR (OLD.last_export IS NULL) IS NOT (NEW.last_export IS NULL)
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_epg_export_profiles_delete
+AFTER DELETE ON epg_export_profiles
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'channels';
+END;
@@ -1,5 +1,124 @@
-from typing import List, Dict
+import io
+import hashlib
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 from config import BASE_URL, RESOURCE_URL_PREFIX
+from utils.output_publisher import publish_file
+
+
+class _PlaylistWriter:
+    """播放列表格式写入器的基类，逐行写入文本流
+
+    行之间以换行分隔，末行不带换行，与按行拼接的结果一致。
+    """
+    extension = ''
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+        self._started = False
+
+    def _write_line(self, line: str):
+        if self._started:
+            self._stream.write('\n')
+        else:
+            self._started = True
+        self._stream.write(line)
+
+    def write_header(self, header_info: dict):
+        pass
+
+    def write_group(self, group: str):
+        pass
+
+    def write_channel(self, channel: Dict):
+        pass
+
+
+class M3UWriter(_PlaylistWriter):
+    """M3U格式"""
+    extension = '.m3u'
+
+    def write_header(self, header_info: dict):
+        # 未指定时指向全量导出的epg.xml
+        x_tvg_url = header_info.get('x_tvg_url') or f"{BASE_URL}{RESOURCE_URL_PREFIX}/m3u/epg.xml"
+        self._write_line(f'#EXTM3U x-tvg-url="{x_tvg_url}"')
+        if 'generated_at' in header_info:
+            self._write_line(f"# Generated at: {header_info['generated_at']}")
+        if 'provider' in header_info:
+            self._write_line(f"# Provider: {header_info['provider']}")
+
+    def write_channel(self, channel: Dict):
+        if not channel.get('stream_url'):
+            return
+
+        extinf = '#EXTINF:-1'
+
+        if channel.get('tvg-id'):
+            extinf += f' tvg-id="{channel["tvg-id"]}"'
+        elif channel.get('tvg-name'):
+            extinf += f' tvg-id="{channel["tvg-name"]}"'
+        elif channel.get('display_name'):
+            extinf += f' tvg-id="{channel["display_name"]}"'
+
+        if channel.get('tvg-name'):
+            extinf += f' tvg-name="{channel["tvg-name"]}"'
+        elif channel.get('display_name'):
+            extinf += f' tvg-name="{channel["display_name"]}"'
+
+        if channel.get('x_tvg_url'):
+            extinf += f' tvg-url="{channel["x_tvg_url"]}"'
+
+        if channel.get('logo_url'):
+            extinf += f' tvg-logo="{BASE_URL}{RESOURCE_URL_PREFIX}{channel["logo_url"]}"'
+        elif channel.get('tvg-logo'):
+            extinf += f' tvg-logo="{channel["tvg-logo"]}"'
+
+        if channel.get('tvg-language'):
+            extinf += f' tvg-language="{channel["tvg-language"]}"'
+
+        if channel.get('catchup'):
+            extinf += f' catchup="{channel["catchup"]}"'
+
+        if channel.get('catchup_source'):
+            extinf += f' catchup-source="{channel["catchup_source"]}"'
+
+        if channel.get('group_title'):
+            extinf += f' group-title="{channel["group_title"]}"'
+
+        extinf += f',{channel["display_name"]}'
+        self._write_line(extinf)
+        self._write_line(channel['stream_url'])
+
+
+class TxtWriter(_PlaylistWriter):
+    """TXT格式（分组行 + 名称,地址）"""
+    extension = '.txt'
+
+    def write_group(self, group: str):
+        self._write_line(f"{group},#genre#")
+
+    def write_channel(self, channel: Dict):
+        self._write_line(f"{channel['display_name']},{channel['stream_url']}")
+
+
+# 支持的输出格式，新增格式只需实现写入器并在此注册
+OUTPUT_FORMATS = {
+    'm3u': M3UWriter,
+    'txt': TxtWriter,
+}
+
+# 写入器输出时读取的频道字段，输出指纹只计算这些字段，测速结果等不影响输出的字段变化不触发重新生成
+CHANNEL_OUTPUT_FIELDS = (
+    'display_name', 'stream_url', 'tvg-id', 'tvg-name', 'tvg-logo', 'tvg-language',
+    'logo_url', 'x_tvg_url', 'catchup', 'catchup_source', 'group_title',
+)
+
+
+def build_filename(rule_names: List[str], extension: str) -> str:
+    """根据规则名称生成输出文件名"""
+    filename = '_'.join(rule_names) + extension if rule_names else 'filtered' + extension
+    return ''.join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
 
 
 class M3UGenerator:
@@ -102,7 +221,7 @@ class M3UGenerator:
         
         # 首先处理group_order中指定的分组
         for group in group_order:
-            if group in sorted_groups:
+            if group in sorted_groups and group not in processed_groups:
                 final_channels.extend(sorted_groups[group])
                 processed_groups.add(group)
         
@@ -116,120 +235,111 @@ class M3UGenerator:
         
         return final_channels
 
+    def iter_channels(self, channels: List[Dict], sort_by: str = 'display_name',
+                      group_order: List[str] = [], sort_templates: Dict[str, List[str]] = {}) -> Iterator[Tuple[str, Dict]]:
+        """去重、分组并排序，按最终输出顺序产出 (分组, 频道)
+
+        分组顺序为group_order中指定的分组在前，其余分组按名称排序。
+        """
+        filtered_channels = self._deduplicate_channels(channels)
+        for channel in self._sort_and_group_channels(filtered_channels, sort_by, group_order, sort_templates):
+            yield channel['group_title'], channel
+
+    def fingerprint(self, channels: List[Dict], sort_by: str = 'display_name', group_order: List[str] = [],
+                    sort_templates: Dict[str, List[str]] = {}) -> str:
+        """按最终输出顺序计算频道的指纹，指纹相同则各格式的频道部分输出相同"""
+        digest = hashlib.sha1()
+        for _, channel in self.iter_channels(channels, sort_by, group_order, sort_templates):
+            digest.update(repr(tuple(channel.get(field) for field in CHANNEL_OUTPUT_FIELDS)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def write_outputs(self, channels: List[Dict], streams: Dict[str, TextIO], header_info: dict = {},
+                      sort_by: str = 'display_name', group_order: List[str] = [],
+                      sort_templates: Dict[str, List[str]] = {}):
+        """单次遍历排序后的频道，同时写出多种格式
+
+        Args:
+            channels: 频道列表
+            streams: 格式名称到输出文本流的映射，格式名称见 OUTPUT_FORMATS
+        """
+        writers = [OUTPUT_FORMATS[fmt](stream) for fmt, stream in streams.items()]
+        for _ in self._write_channels(writers, channels, header_info, sort_by, group_order, sort_templates):
+            pass
+
+    def _write_channels(self, writers: List[_PlaylistWriter], channels: List[Dict], header_info: dict,
+                        sort_by: str, group_order: List[str], sort_templates: Dict[str, List[str]]) -> Iterator[None]:
+        """驱动写入器输出全部内容，每写完一个频道让出一次，便于调用方分块取走输出"""
+        for writer in writers:
+            writer.write_header(header_info)
+
+        current_group = None
+        for group, channel in self.iter_channels(channels, sort_by, group_order, sort_templates):
+            if group != current_group:
+                current_group = group
+                for writer in writers:
+                    writer.write_group(group)
+            for writer in writers:
+                writer.write_channel(channel)
+            yield
+
+    def iter_chunks(self, channels: List[Dict], fmt: str, header_info: dict = {}, sort_by: str = 'display_name',
+                    group_order: List[str] = [], sort_templates: Dict[str, List[str]] = {},
+                    chunk_size: int = 64 * 1024) -> Iterator[str]:
+        """按块产出单一格式的内容，用于流式响应
+
+        Args:
+            fmt: 格式名称，见 OUTPUT_FORMATS
+            chunk_size: 每块的大致字符数
+        """
+        buffer = io.StringIO()
+        writers = [OUTPUT_FORMATS[fmt](buffer)]
+        for _ in self._write_channels(writers, channels, header_info, sort_by, group_order, sort_templates):
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def generate_files(self, channels: List[Dict], output_dir: Union[str, Path], formats: Iterable[str] = ('m3u', 'txt'),
+                       rule_names: List[str] = [], header_info: dict = {}, sort_by: str = 'display_name',
+                       group_order: List[str] = [], sort_templates: Dict[str, List[str]] = {},
+                       changed: Optional[Dict[str, bool]] = None) -> Dict[str, str]:
+        """将多种格式直接写入文件，内容不在内存中拼接
+
+        各文件通过OutputPublisher原子发布，内容未变化的文件保持不变。
+
+        Args:
+            changed: 传入字典时在其中记录各格式的文件内容是否发生变化
+
+        Returns:
+            dict: 格式名称到文件名的映射
+        """
+        output_dir = Path(output_dir)
+        filenames = {fmt: build_filename(rule_names, OUTPUT_FORMATS[fmt].extension) for fmt in formats}
+        results = {fmt: {} for fmt in filenames}
+        with ExitStack() as stack:
+            files = {
+                fmt: stack.enter_context(publish_file(output_dir / filename, result=results[fmt]))
+                for fmt, filename in filenames.items()
+            }
+            self.write_outputs(channels, files, header_info, sort_by, group_order, sort_templates)
+
+        if changed is not None:
+            changed.update({fmt: result['changed'] for fmt, result in results.items()})
+        return filenames
+
+    def _generate_content(self, fmt: str, channels: List[Dict], rule_names: List[str], header_info: dict,
+                          sort_by: str, group_order: List[str], sort_templates: Dict[str, List[str]]) -> tuple[str, str]:
+        buffer = io.StringIO()
+        self.write_outputs(channels, {fmt: buffer}, header_info, sort_by, group_order, sort_templates)
+        return buffer.getvalue(), build_filename(rule_names, OUTPUT_FORMATS[fmt].extension)
+
     def generate_txt(self, channels: List[Dict], rule_names: List[str] = [], sort_by: str = 'display_name', 
                     group_order: List[str] = [], sort_templates: Dict[str, List[str]] = {}) -> tuple[str, str]:
-        # 去重处理
-        filtered_channels = self._deduplicate_channels(channels)
-        
-        # 排序和分组处理
-        filtered_channels = self._sort_and_group_channels(filtered_channels, sort_by, group_order, sort_templates)
-        
-        # 按分组重新组织频道（保持分组顺序）
-        grouped_channels = self._group_channels(filtered_channels)
-        
-        # 生成TXT格式内容
-        txt_lines = []
-        
-        # 按照group_order的顺序输出分组
-        for group in group_order:
-            if group in grouped_channels:
-                txt_lines.append(f"{group},#genre#")
-                for channel in grouped_channels[group]:
-                    txt_lines.append(f"{channel['display_name']},{channel['stream_url']}")
-                grouped_channels.pop(group)
-        
-        # 输出剩余的分组（按字母顺序）
-        for group in sorted(grouped_channels.keys()):
-            txt_lines.append(f"{group},#genre#")
-            for channel in grouped_channels[group]:
-                txt_lines.append(f"{channel['display_name']},{channel['stream_url']}")
-        
-        txt_content = "\n".join(txt_lines)
-        
-        # 生成文件名
-        filename = '_'.join(rule_names) + '.txt' if rule_names else 'filtered.txt'
-        filename = ''.join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-        
-        return txt_content, filename
+        return self._generate_content('txt', channels, rule_names, {}, sort_by, group_order, sort_templates)
 
     def generate_m3u(self, channels: List[Dict], rule_names: List[str] = [], header_info: dict = {}, 
                     sort_by: str = 'display_name', group_order: List[str] = [], 
                     sort_templates: Dict[str, List[str]] = {}) -> tuple[str, str]:
-        # 去重处理
-        filtered_channels = self._deduplicate_channels(channels)
-        
-        # 排序和分组处理
-        filtered_channels = self._sort_and_group_channels(filtered_channels, sort_by, group_order, sort_templates)
-        
-        # 按分组重新组织频道（保持分组顺序）
-        grouped_channels = self._group_channels(filtered_channels)
-        
-        # 初始化M3U文件内容
-        lines = [f'#EXTM3U x-tvg-url="{BASE_URL}{RESOURCE_URL_PREFIX}/m3u/epg.xml"']
-        
-        # 添加header_info
-        if 'generated_at' in header_info:
-            lines.append(f"# Generated at: {header_info['generated_at']}")
-        if 'provider' in header_info:
-            lines.append(f"# Provider: {header_info['provider']}")
-        
-        def add_channel_to_lines(channel):
-            if not channel.get('stream_url'):
-                return
-                
-            extinf = '#EXTINF:-1'
-            
-            if channel.get('tvg-id'):
-                extinf += f' tvg-id="{channel["tvg-id"]}"'
-            elif channel.get('tvg-name'):
-                extinf += f' tvg-id="{channel["tvg-name"]}"'
-            elif channel.get('display_name'):
-                extinf += f' tvg-id="{channel["display_name"]}"'
-
-            if channel.get('tvg-name'):
-                extinf += f' tvg-name="{channel["tvg-name"]}"'
-            elif channel.get('display_name'):
-                extinf += f' tvg-name="{channel["display_name"]}"'
-
-            if channel.get('x_tvg_url'):
-                extinf += f' tvg-url="{channel["x_tvg_url"]}"'
-
-            if channel.get('logo_url'):
-                extinf += f' tvg-logo="{BASE_URL}{RESOURCE_URL_PREFIX}{channel["logo_url"]}"'
-            elif channel.get('tvg-logo'):
-                extinf += f' tvg-logo="{channel["tvg-logo"]}"'
-            
-            if channel.get('tvg-language'):
-                extinf += f' tvg-language="{channel["tvg-language"]}"'
-            
-            if channel.get('catchup'):
-                extinf += f' catchup="{channel["catchup"]}"'
-
-            if channel.get('catchup_source'):
-                extinf += f' catchup-source="{channel["catchup_source"]}"'
-
-            if channel.get('group_title'):
-                extinf += f' group-title="{channel["group_title"]}"'
-            
-            extinf += f',{channel["display_name"]}'
-            lines.extend([extinf, channel['stream_url']])
-        
-        # 按照group_order的顺序输出分组
-        for group in group_order:
-            if group in grouped_channels:
-                for channel in grouped_channels[group]:
-                    add_channel_to_lines(channel)
-                grouped_channels.pop(group)
-        
-        # 输出剩余的分组（按字母顺序）
-        for group in sorted(grouped_channels.keys()):
-            for channel in grouped_channels[group]:
-                add_channel_to_lines(channel)
-        
-        m3u_content = '\n'.join(lines)
-        
-        # 生成文件名
-        filename = '_'.join(rule_names) + '.m3u' if rule_names else 'filtered.m3u'
-        filename = ''.join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-        
-        return m3u_content, filename
\ No newline at end of file
+        return self._generate_content('m3u', channels, rule_names, header_info, sort_by, group_order, sort_templates)
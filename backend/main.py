@@ -7,6 +7,9 @@ logger = logging.getLogger(__name__)
 if __name__ == "__main__":
     import uvicorn
     import sys
+    import multiprocessing
+    # 同步解析使用进程池，打包运行时需要
+    multiprocessing.freeze_support()
     # 检查是否已经运行了 uvicorn
     if "uvicorn" not in " ".join(sys.argv):
         # 启动调度器
@@ -1,6 +1,5 @@
 from pydantic import BaseModel
 from typing import TypeVar, Generic, Optional, Any, Dict, List
-from database import get_db_connection
 from .rules import FilterRule, FilterRuleSet
 
 class ProxyConfig(BaseModel):
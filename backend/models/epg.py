@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
 class EPGSource(BaseModel):
@@ -32,4 +32,14 @@ class DefaultChannelLogo(BaseModel):
     id: Optional[int] = None
     channel_name: str
     logo_url: str
-    priority: Optional[int] = 0  # 优先级，用于处理同名频道的情况
\ No newline at end of file
+    priority: Optional[int] = 0  # 优先级，用于处理同名频道的情况
+
+class EPGExportProfile(BaseModel):
+    id: Optional[int] = None
+    name: str
+    rule_set_id: Optional[int] = None  # 只导出该规则集合播放列表中的频道，为空时导出全部频道
+    past_hours: int = Field(24, ge=0)  # 导出当前时间之前多少小时内开始的节目
+    future_hours: int = Field(168, ge=0)  # 导出当前时间之后多少小时内开始的节目
+    compress: bool = True  # 同时输出gzip文件
+    enabled: bool = True
+    last_export: Optional[str] = None
@@ -0,0 +1,556 @@
+import re
+from itertools import compress
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .rules import FilterRule
+
+# 规则类型与频道字段的对应关系
+RULE_FIELDS = {
+    'name': 'display_name',
+    'group': 'group_title',
+    'source_name': 'source_name',
+    'resolution': 'resolution',
+    'bitrate': 'bitrate',
+    'status': 'test_status',
+}
+# 关键字规则匹配的字段
+KEYWORD_FIELDS = ('display_name', 'group_title', 'source_name', 'stream_url')
+# 分辨率、状态规则允许的取值
+RESOLUTION_OPTIONS = frozenset(['4k', '2k', '1080p', '720p', '576p', '480p'])
+STATUS_OPTIONS = frozenset(['1', '0'])
+
+# 各类检查的估算代价，同一节点内按代价从低到高执行以便尽早短路
+RULE_COST = {
+    'option': 1,
+    'bitrate': 2,
+    'literal': 3,
+    'regex': 5,
+}
+
+
+class _Check:
+    """编译后的检查项
+
+    叶子检查对应一条（或合并后的一组）规则，记录字段、取值判断函数和动作；
+    组合检查记录子检查及其逻辑。fn 为逐频道执行的函数。
+
+    Attributes:
+        fn: 接收频道字典返回bool的函数
+        cost: 估算代价
+        label: 执行计划中的描述
+        spec: 叶子检查的匹配方式，用于转换为SQL条件
+    """
+    __slots__ = ('fn', 'cost', 'label', 'fields', 'test', 'spec', 'include', 'children', 'is_and')
+
+    def __init__(self, fn: Callable[[Dict[str, Any]], bool], cost: float, label: str,
+                 fields: Tuple[str, ...] = (), test: Optional[Callable[[Any], bool]] = None,
+                 spec: Optional[tuple] = None, include: bool = True,
+                 children: Tuple['_Check', ...] = (), is_and: bool = True):
+        self.fn = fn
+        self.cost = cost
+        self.label = label
+        self.fields = fields
+        self.test = test
+        self.spec = spec
+        self.include = include
+        self.children = children
+        self.is_and = is_and
+
+
+# 编译结果：True/False 表示与频道无关的常量结果
+_Compiled = Union[bool, _Check]
+
+
+def _text_test(fold: bool, test: Callable[[str], Any]) -> Callable[[Any], bool]:
+    """构造文本取值判断函数，按需先转为小写"""
+    if fold:
+        return lambda value: bool(test(str(value).lower()))
+    return lambda value: bool(test(str(value)))
+
+
+def _leaf(fields: Tuple[str, ...], test: Callable[[Any], bool], include: bool,
+          cost: float, label: str, spec: tuple) -> _Check:
+    """构造叶子检查：任一字段的非空取值满足test即视为匹配，再按动作取反"""
+    if len(fields) == 1:
+        field = fields[0]
+
+        def match(channel):
+            value = channel.get(field)
+            return value is not None and test(value)
+    else:
+        def match(channel):
+            for field in fields:
+                value = channel.get(field)
+                if value is not None and test(value):
+                    return True
+            return False
+
+    if include:
+        fn = match
+    else:
+        def fn(channel):
+            return not match(channel)
+        label = f"not {label}"
+    return _Check(fn, cost, label, fields=fields, test=test, spec=spec, include=include)
+
+
+def _rule_fields(rule: FilterRule) -> Optional[Tuple[str, ...]]:
+    if rule.type == 'keyword':
+        return KEYWORD_FIELDS
+    field = RULE_FIELDS.get(rule.type)
+    return (field,) if field else None
+
+
+def _compile_matcher(rule: FilterRule, fields: Tuple[str, ...]) -> Union[bool, Tuple[Callable, float, str]]:
+    """编译规则对单个取值的判断（不含include/exclude），模式无法匹配任何值时返回False
+
+    Returns:
+        tuple: (取值判断函数, 估算代价, 描述, 匹配方式)
+    """
+    pattern = rule.pattern or ''
+    field_cost = len(fields)
+
+    if rule.type in ('resolution', 'status'):
+        options = RESOLUTION_OPTIONS if rule.type == 'resolution' else STATUS_OPTIONS
+        expected = pattern.lower()
+        if expected not in options:
+            return False
+        return ((lambda value: str(value).lower() == expected), RULE_COST['option'],
+                f"{fields[0]} == {expected!r}", ('option', (expected,)))
+
+    if rule.type == 'bitrate':
+        min_value, max_value = rule.min_value, rule.max_value
+
+        def in_range(value):
+            try:
+                num_value = float(str(value))
+            except (ValueError, TypeError):
+                return False
+            if min_value is not None and num_value < min_value:
+                return False
+            if max_value is not None and num_value > max_value:
+                return False
+            return True
+        return (in_range, RULE_COST['bitrate'], f"{fields[0]} in [{min_value}, {max_value}]",
+                ('range', min_value, max_value))
+
+    fold = not rule.case_sensitive
+    if fold:
+        pattern = pattern.lower()
+    if rule.regex_mode:
+        try:
+            search = re.compile(pattern).search
+        except re.error:
+            return False
+        return (_text_test(fold, search), RULE_COST['regex'] * field_cost,
+                f"{'|'.join(fields)} ~ /{pattern}/", ('regex', pattern, fold))
+    return (_text_test(fold, lambda value: pattern in value), RULE_COST['literal'] * field_cost,
+            f"{'|'.join(fields)} contains {pattern!r}", ('literal', (pattern,), fold))
+
+
+def _merge_key(rule: FilterRule, fields: Tuple[str, ...]):
+    """可合并规则的分组键，不可合并时返回None
+
+    同一字段上的普通字符串规则合并为一个正则分支，
+    同一字段上的分辨率/状态规则合并为一次集合判断。
+    """
+    if rule.type in ('resolution', 'status'):
+        return ('option', rule.type)
+    if rule.type == 'bitrate' or rule.regex_mode:
+        return None
+    return ('literal', fields, not rule.case_sensitive)
+
+
+def _compile_merged(key, rules: List[FilterRule], fields: Tuple[str, ...]) -> Union[bool, Tuple[Callable, float, str]]:
+    """将多条同类规则合并为一个匹配函数（任一规则匹配即视为匹配）"""
+    if key[0] == 'option':
+        options = RESOLUTION_OPTIONS if key[1] == 'resolution' else STATUS_OPTIONS
+        expected = frozenset(p for p in ((r.pattern or '').lower() for r in rules) if p in options)
+        if not expected:
+            return False
+        return ((lambda value: str(value).lower() in expected), RULE_COST['option'],
+                f"{fields[0]} in {sorted(expected)}", ('option', tuple(sorted(expected))))
+
+    fold = key[2]
+    patterns = list(dict.fromkeys((r.pattern or '').lower() if fold else (r.pattern or '') for r in rules))
+    search = re.compile('|'.join(re.escape(p) for p in patterns)).search
+    return (_text_test(fold, search), RULE_COST['literal'] * len(fields) + 1,
+            f"{'|'.join(fields)} contains any{patterns!r}", ('literal', tuple(patterns), fold))
+
+
+def _compile_rules(rules: List[FilterRule], is_and: bool) -> List[_Compiled]:
+    """编译节点内的规则，合并可在当前逻辑下合并的规则
+
+    OR节点中的include规则、AND节点中的exclude规则满足：
+    结果 = 任一匹配（OR）或 无一匹配（AND），因此同组规则可合并为一次匹配。
+    """
+    compiled: List[_Compiled] = []
+    groups: Dict[Any, List[FilterRule]] = {}
+    for rule in rules:
+        include = rule.action == 'include'
+        fields = _rule_fields(rule)
+        if fields is None:
+            # 未知规则类型永远不会匹配
+            compiled.append(not include)
+            continue
+        key = _merge_key(rule, fields)
+        if key is not None and include != is_and:
+            groups.setdefault((key, fields), []).append(rule)
+            continue
+        result = _compile_matcher(rule, fields)
+        if result is False:
+            compiled.append(not include)
+            continue
+        test, cost, label, spec = result
+        compiled.append(_leaf(fields, test, include, cost, label, spec))
+
+    include = not is_and
+    for (key, fields), group in groups.items():
+        result = _compile_merged(key, group, fields) if len(group) > 1 else _compile_matcher(group[0], fields)
+        if result is False:
+            compiled.append(not include)
+            continue
+        test, cost, label, spec = result
+        compiled.append(_leaf(fields, test, include, cost, label, spec))
+    return compiled
+
+
+def _is_empty(node) -> bool:
+    return not node.rules and not node.children
+
+
+def _combine(checks: List[_Check], is_and: bool) -> _Check:
+    """按代价排序后组合为一个短路执行的检查"""
+    if len(checks) == 1:
+        return checks[0]
+    checks = sorted(checks, key=lambda c: c.cost)
+    fns = tuple(c.fn for c in checks)
+    cost = sum(c.cost for c in checks)
+    label = f"{'AND' if is_and else 'OR'}(" + ', '.join(c.label for c in checks) + ")"
+
+    if is_and:
+        def evaluate_and(channel):
+            for fn in fns:
+                if not fn(channel):
+                    return False
+            return True
+        return _Check(evaluate_and, cost, label, children=tuple(checks), is_and=True)
+
+    def evaluate_or(channel):
+        for fn in fns:
+            if fn(channel):
+                return True
+        return False
+    return _Check(evaluate_or, cost, label, children=tuple(checks), is_and=False)
+
+
+def compile_rule_node(node) -> _Compiled:
+    """将规则节点编译为检查项
+
+    与父节点逻辑相同的子节点会被展开到父节点中，
+    空节点视为True，结果与RuleNode.evaluate完全一致。
+    """
+    if _is_empty(node):
+        return True
+    is_and = node.logic_type == 'AND'
+
+    # 展开逻辑相同的子节点
+    rules: List[FilterRule] = []
+    sub_nodes = []
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        rules.extend(current.rules)
+        for child in current.children:
+            if _is_empty(child):
+                if is_and:
+                    continue
+                return True
+            if (child.logic_type == 'AND') == is_and:
+                pending.append(child)
+            else:
+                sub_nodes.append(child)
+
+    items = _compile_rules(rules, is_and)
+    items.extend(compile_rule_node(child) for child in sub_nodes)
+
+    checks: List[_Check] = []
+    for item in items:
+        if item is True:
+            if is_and:
+                continue
+            return True
+        if item is False:
+            if is_and:
+                return False
+            continue
+        checks.append(item)
+
+    if not checks:
+        # AND中全部为True，或OR中全部为False
+        return is_and
+    return _combine(checks, is_and)
+
+
+class ChannelColumns:
+    """按列存储的频道数据，用于整列批量评估规则
+
+    掩码使用Python整数表示，每个频道占一个字节（值为0或1），
+    多个规则的结果通过整数的 & | ^ 运算一次性合并。
+    """
+
+    def __init__(self, columns: Sequence[str], rows: Sequence[Sequence[Any]]):
+        self.names = list(columns)
+        self.rows = rows
+        self.size = len(rows)
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        self._columns: Dict[str, List[Any]] = {}
+        self._zeros: Dict[str, Dict[Any, int]] = {}
+        self._mixed_numeric: Dict[str, bool] = {}
+        self.all_mask = int.from_bytes(b'\x01' * self.size, 'little')
+
+    def column(self, name: str) -> Optional[List[Any]]:
+        """按需取出一列，不存在的列返回None"""
+        if name not in self._columns:
+            if name not in self._positions:
+                return None
+            self._columns[name] = list(map(itemgetter(self._positions[name]), self.rows))
+        return self._columns[name]
+
+    def _column_mask(self, name: str, test: Callable[[Any], bool], scope: int) -> int:
+        """对整列计算判断结果，只判断scope中出现的不同取值，每个取值只判断一次"""
+        values = self.column(name)
+        if not values:
+            return 0
+        if name not in self._zeros:
+            self._zeros[name] = dict.fromkeys(values, 0)
+            # 1 与 1.0 等相等的数值在字典中会合并，但转换为字符串后不同
+            types = set(map(type, values))
+            self._mixed_numeric[name] = len(types & {int, float, bool}) > 1
+        if self._mixed_numeric[name]:
+            flags = bytes(1 if value is not None and test(value) else 0 for value in values)
+        else:
+            if scope == self.all_mask:
+                candidates = self._zeros[name]
+            else:
+                candidates = set(compress(values, scope.to_bytes(self.size, 'little')))
+            results = self._zeros[name].copy()
+            for value in candidates:
+                if value is not None and test(value):
+                    results[value] = 1
+            flags = bytes(map(results.__getitem__, values))
+        return int.from_bytes(flags, 'little') & scope
+
+    def evaluate(self, check: _Check, scope: Optional[int] = None) -> int:
+        """计算检查项的结果掩码
+
+        Args:
+            check: 编译后的检查项
+            scope: 需要评估的行掩码，范围外的行结果为0；默认为全部行
+        """
+        if scope is None:
+            scope = self.all_mask
+        if check.test is not None:
+            mask = 0
+            for field in check.fields:
+                mask |= self._column_mask(field, check.test, scope)
+            return mask if check.include else scope ^ mask
+
+        if check.is_and:
+            # 后续检查只评估仍满足条件的行
+            mask = scope
+            for child in check.children:
+                if not mask:
+                    break
+                mask = self.evaluate(child, mask)
+            return mask
+
+        # 后续检查只评估尚未匹配的行
+        mask = 0
+        remaining = scope
+        for child in check.children:
+            if not remaining:
+                break
+            matched = self.evaluate(child, remaining)
+            mask |= matched
+            remaining ^= matched
+        return mask
+
+    def select(self, mask: int) -> List[Dict[str, Any]]:
+        """将掩码选中的行转换为频道字典"""
+        names = self.names
+        return [dict(zip(names, row)) for row in compress(self.rows, mask.to_bytes(self.size, 'little'))]
+
+
+def _sql_safe_lower(pattern: str) -> bool:
+    """SQLite的lower()只转换ASCII字母，模式中的非ASCII字符必须无大小写之分才能下推"""
+    return all(c.isascii() or c.upper() == c.lower() for c in pattern)
+
+
+# SQL条件：(条件, 参数)
+_Sql = Tuple[str, List[Any]]
+
+
+def _leaf_to_sql(check: _Check, field_columns: Dict[str, str]) -> Optional[Tuple[_Sql, _Sql]]:
+    """将叶子检查转换为SQL条件，无法表达时返回None
+
+    Returns:
+        tuple: (上界条件, 下界条件)。满足下界的行一定匹配，匹配的行一定满足上界，
+               两者相同时表示可以等价表达
+    """
+    if check.spec is None or any(field not in field_columns for field in check.fields):
+        return None
+    kind = check.spec[0]
+    if kind == 'regex':
+        return None
+    if kind == 'literal' and check.spec[2] and not all(_sql_safe_lower(p) for p in check.spec[1]):
+        return None
+
+    upper_parts, lower_parts = [], []
+    upper_params: List[Any] = []
+    lower_params: List[Any] = []
+    for field in check.fields:
+        column = field_columns[field]
+        if kind == 'option':
+            options = check.spec[1]
+            condition = (f"({column} IS NOT NULL AND lower(CAST({column} AS TEXT)) IN "
+                         f"({', '.join('?' * len(options))}))")
+            params = list(options)
+            upper_parts.append(condition)
+            lower_parts.append(condition)
+        elif kind == 'range':
+            _, min_value, max_value = check.spec
+            condition = f"{column} IS NOT NULL AND typeof({column}) IN ('integer', 'real')"
+            params = []
+            if min_value is not None:
+                condition += f" AND {column} >= ?"
+                params.append(min_value)
+            if max_value is not None:
+                condition += f" AND {column} <= ?"
+                params.append(max_value)
+            lower_parts.append(f"({condition})")
+            # 文本值（如'inf'）在Python中仍可能被解析为数值，交由Python判断
+            upper_parts.append(f"({condition} OR typeof({column}) = 'text')")
+        else:
+            _, patterns, fold = check.spec
+            target = f"lower({column})" if fold else column
+            matches = ' OR '.join(f"instr({target}, ?) > 0" for _ in patterns)
+            condition = f"({column} IS NOT NULL AND ({matches}))"
+            params = list(patterns)
+            upper_parts.append(condition)
+            lower_parts.append(condition)
+        upper_params.extend(params)
+        lower_params.extend(params)
+
+    def join(parts):
+        return parts[0] if len(parts) == 1 else f"({' OR '.join(parts)})"
+
+    upper = (join(upper_parts), upper_params)
+    lower = (join(lower_parts), lower_params)
+    if check.include:
+        return upper, lower
+    # 取反时上下界互换
+    return (f"NOT {lower[0]}", lower[1]), (f"NOT {upper[0]}", upper[1])
+
+
+def _check_to_sql(check: _Check, field_columns: Dict[str, str]) -> Optional[Tuple[_Sql, _Sql]]:
+    """将检查项整体转换为SQL条件（上界, 下界），任一部分无法表达时返回None"""
+    if check.test is not None:
+        return _leaf_to_sql(check, field_columns)
+    separator = ' AND ' if check.is_and else ' OR '
+    upper_parts, lower_parts = [], []
+    upper_params: List[Any] = []
+    lower_params: List[Any] = []
+    for child in check.children:
+        result = _check_to_sql(child, field_columns)
+        if result is None:
+            return None
+        (upper, params), (lower, child_lower_params) = result
+        upper_parts.append(upper)
+        upper_params.extend(params)
+        lower_parts.append(lower)
+        lower_params.extend(child_lower_params)
+    return ((f"({separator.join(upper_parts)})", upper_params),
+            (f"({separator.join(lower_parts)})", lower_params))
+
+
+class CompiledRuleTree:
+    """规则树编译后的执行计划
+
+    编译时预编译正则、预先转换大小写、合并同字段的字符串规则，
+    并按规则代价排序以便尽早短路。
+    """
+
+    def __init__(self, root=None, compiled: Optional[_Compiled] = None):
+        if compiled is None:
+            compiled = compile_rule_node(root)
+        self._check = compiled if isinstance(compiled, _Check) else None
+        if self._check is not None:
+            self._match = self._check.fn
+            self.plan = self._check.label
+        else:
+            constant = compiled
+            self._match = lambda channel: constant
+            self.plan = str(constant)
+        self._constant = compiled if self._check is None else None
+
+    def evaluate(self, channel: Dict[str, Any]) -> bool:
+        """评估规则树对单个频道的匹配结果"""
+        return self._match(channel)
+
+    def filter_channels(self, channels: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤频道列表"""
+        return list(filter(self._match, channels))
+
+    def mask(self, data: ChannelColumns) -> int:
+        """按列评估规则树，返回匹配频道的掩码"""
+        if self._check is None:
+            return data.all_mask if self._constant else 0
+        return data.evaluate(self._check)
+
+    def filter_rows(self, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        """按列过滤查询结果，只为匹配的行构造频道字典
+
+        Args:
+            columns: 列名（即频道字典的键）
+            rows: 查询返回的行
+        """
+        data = ChannelColumns(columns, rows)
+        return data.select(self.mask(data))
+
+    def push_down(self, field_columns: Dict[str, str]) -> Tuple[Optional[str], List[Any], 'CompiledRuleTree']:
+        """将可用SQL表达的条件下推到查询中
+
+        根节点为AND时逐个拆分其检查项，能转换为SQL的下推，其余保留在Python中执行；
+        根节点为OR时只有全部可转换才会下推。正则规则始终在Python中执行，
+        无法用SQL等价表达的条件（如文本形式的码率）以宽松条件下推，同时保留在Python中复核。
+
+        Args:
+            field_columns: 频道字段与查询中SQL表达式的对应关系
+
+        Returns:
+            tuple: (WHERE条件或None, 参数, 剩余规则的执行计划)
+        """
+        if self._check is None:
+            return None, [], self
+
+        checks = list(self._check.children) if self._check.test is None and self._check.is_and else [self._check]
+        conditions = []
+        params: List[Any] = []
+        remaining = []
+        for check in checks:
+            result = _check_to_sql(check, field_columns)
+            if result is None:
+                remaining.append(check)
+                continue
+            upper, lower = result
+            conditions.append(upper[0])
+            params.extend(upper[1])
+            if upper != lower:
+                remaining.append(check)
+
+        if not conditions:
+            return None, [], self
+        residual = CompiledRuleTree(compiled=_combine(remaining, True) if remaining else True)
+        return ' AND '.join(conditions), params, residual
@@ -1,5 +1,6 @@
-from typing import List, Dict, Optional, Union, Any
+from typing import List, Dict, Optional, Union, Any, Sequence
 from .rules import FilterRule
+from .rule_compiler import CompiledRuleTree
 
 class RuleNode:
     """规则树节点，可以是单个规则或规则集合"""
@@ -139,6 +140,8 @@ class RuleTree:
     """规则树，用于管理和评估规则"""
     def __init__(self):
         self.root = RuleNode(logic_type='AND')  # 根节点默认使用AND逻辑
+        self._compiled: Optional[CompiledRuleTree] = None
+        self._compiled_root: Optional[RuleNode] = None
     
     def build_from_rule_set(self, rule_set_id: int, conn):
         """从数据库中的规则集合构建规则树"""
@@ -250,6 +253,17 @@ class RuleTree:
             max_value=row[10] if len(row) > 10 else None
         )
     
+    def compile(self) -> CompiledRuleTree:
+        """将规则树编译为执行计划，根节点不变时复用已编译的结果"""
+        if self._compiled is None or self._compiled_root is not self.root:
+            self._compiled = CompiledRuleTree(self.root)
+            self._compiled_root = self.root
+        return self._compiled
+
     def filter_channels(self, channels: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """使用规则树过滤频道列表"""
-        return [channel for channel in channels if self.root.evaluate(channel)]
\ No newline at end of file
+        return self.compile().filter_channels(channels)
+
+    def filter_rows(self, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        """按列批量评估规则树，只为匹配的行构造频道字典"""
+        return self.compile().filter_rows(columns, rows)
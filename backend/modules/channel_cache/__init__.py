@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 生成结果依赖的数据版本名称，见 data_versions 表
+CHANNELS_DATA_VERSION = 'channels'
+
+
+def get_data_version(conn, name: str = CHANNELS_DATA_VERSION) -> int:
+    """读取数据版本号，无记录时返回0"""
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+class FilteredChannelCache:
+    """按规则集合缓存过滤后的频道
+
+    缓存键为规则集合ID，缓存值记录计算时的数据版本；
+    频道、规则、分组映射或排序模板发生写入后版本递增，缓存自然失效。
+    同一规则集合的并发请求串行执行，后到的请求直接复用先到请求的结果，
+    保证同一数据版本下各输出格式只做一次过滤。
+    """
+
+    def __init__(self):
+        self._entries: Dict[Any, Tuple[int, Any, datetime]] = {}
+        self._key_locks: Dict[Any, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get_or_compute(self, key, conn, compute: Callable[[], Any]) -> Any:
+        """获取缓存结果，数据版本变化时重新计算
+
+        在读事务中先读取版本号再执行compute，保证结果与版本号对应同一数据快照。
+
+        Args:
+            key: 缓存键（规则集合ID）
+            conn: 数据库连接
+            compute: 计算函数，在同一连接上读取数据
+        """
+        with self._get_key_lock(key):
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            version = get_data_version(conn)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            result = compute()
+            self._entries[key] = (version, result, datetime.now())
+            logger.debug(f"[频道缓存] 规则集合 {key} 已按数据版本 {version} 重新计算")
+            return result
+
+    def get_computed_at(self, key) -> Optional[datetime]:
+        """缓存结果的计算时间，同一数据版本下保持不变，可作为输出内容的生成时间"""
+        entry = self._entries.get(key)
+        return entry[2] if entry else None
+
+    def invalidate(self, key: Optional[Any] = None):
+        """清除指定规则集合（默认全部）的缓存"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# 全局的过滤结果缓存
+channel_cache = FilteredChannelCache()
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import BASE_URL, RESOURCE_URL_PREFIX, RESOURCE_ROOT
+from modules.xmltv import export_xmltv
+
+import logging
+logger = logging.getLogger(__name__)
+
+PROFILE_COLUMNS = "id, name, rule_set_id, past_hours, future_hours, compress, enabled, last_export"
+
+
+def profile_filename(name: str) -> str:
+    """导出配置对应的文件名"""
+    return 'epg_' + ''.join(c for c in name if c.isalnum() or c in ('_', '-', '.')) + '.xml'
+
+
+def profile_url(name: str) -> str:
+    """导出配置对应文件的完整访问地址"""
+    return f"{BASE_URL}{RESOURCE_URL_PREFIX}/m3u/{profile_filename(name)}"
+
+
+def row_to_profile(cursor, row) -> Dict:
+    profile = dict(zip([d[0] for d in cursor.description], row))
+    profile['compress'] = bool(profile['compress'])
+    profile['enabled'] = bool(profile['enabled'])
+    return profile
+
+
+def find_conflicting_profile(conn, name: str, exclude_id: Optional[int] = None) -> Optional[str]:
+    """查找导出文件名与name相同的其他配置，返回其名称
+
+    文件名只保留名称中的部分字符，不同的名称（如"a b"和"ab"）可能对应同一个文件。
+    """
+    filename = profile_filename(name)
+    for profile_id, other_name in conn.execute("SELECT id, name FROM epg_export_profiles"):
+        if profile_id != exclude_id and profile_filename(other_name) == filename:
+            return other_name
+    return None
+
+
+def get_profile(conn, profile_id: int) -> Optional[Dict]:
+    cursor = conn.execute(f"SELECT {PROFILE_COLUMNS} FROM epg_export_profiles WHERE id = ?", (profile_id,))
+    row = cursor.fetchone()
+    return row_to_profile(cursor, row) if row else None
+
+
+def get_rule_set_profile(conn, rule_set_id: int) -> Optional[Dict]:
+    """获取规则集合的第一个启用且已导出的导出配置，播放列表的x-tvg-url指向其文件
+
+    尚未导出的配置没有对应文件，播放列表继续指向全量导出的epg.xml。
+    """
+    cursor = conn.execute(
+        f"SELECT {PROFILE_COLUMNS} FROM epg_export_profiles "
+        "WHERE rule_set_id = ? AND enabled = 1 AND last_export IS NOT NULL ORDER BY id LIMIT 1",
+        (rule_set_id,)
+    )
+    row = cursor.fetchone()
+    return row_to_profile(cursor, row) if row else None
+
+
+def export_profile(conn, profile: Dict, channel_keys: Optional[Iterable[Tuple[str, int]]] = None) -> Dict:
+    """按导出配置的时间窗口导出EPG文件
+
+    Args:
+        conn: 数据库连接
+        profile: 导出配置
+        channel_keys: 规则集合播放列表中频道的 (channel_id, source_id)，None表示全部频道
+    """
+    now = datetime.now()
+    result = export_xmltv(
+        conn,
+        Path(RESOURCE_ROOT) / 'm3u' / profile_filename(profile['name']),
+        BASE_URL + RESOURCE_URL_PREFIX,
+        profile['compress'],
+        start_from=now - timedelta(hours=profile['past_hours']),
+        start_before=now + timedelta(hours=profile['future_hours']),
+        channel_keys=channel_keys
+    )
+    logger.info(f"[EPG导出] 配置 {profile['name']} 导出 {result['channel_count']} 个频道, {result['program_count']} 个节目")
+    return result
@@ -0,0 +1,170 @@
+import re
+from typing import List, Dict
+
+
+def parse_m3u_content(content: str) -> tuple[List[Dict[str, str]], Dict[str, str]]:
+    """解析m3u格式内容"""
+    if not content.strip().startswith('#EXTM3U'):
+        raise ValueError("无效的M3U格式")
+    
+    channels = []
+    current_channel = {}
+    tvg_channel = {}
+    
+    # 解析#EXTM3U行中的全局属性
+    first_line = content.splitlines()[0].strip()
+    for attr in ['x-tvg-url', 'catchup', 'catchup-source']:
+        attr_match = re.search(f'{attr}="([^"]+)"', first_line)
+        if attr_match:
+            tvg_channel[attr.replace('-', '_')] = attr_match.group(1)
+    
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+            
+        if line.startswith('#EXTINF:'):
+            # 解析频道信息
+            # 先提取扩展属性，避免属性值干扰频道名称的提取
+            for attr in ['group-title', 'tvg-id', 'tvg-name', 'tvg-logo', 'tvg-language']:
+                attr_match = re.search(f'{attr}="([^"]+)"', line)
+                if attr_match:
+                    current_channel[attr] = attr_match.group(1)
+            
+            # 提取频道名称 - 使用更灵活的匹配方式
+            name_match = re.search(r'#EXTINF:-?\d+(?:[^,]*,(.+))?$', line)
+            if name_match and name_match.group(1):
+                # 清理可能存在的属性标签
+                name = name_match.group(1)
+                # 移除任何剩余的属性标签
+                name = re.sub(r'[a-zA-Z0-9-]+="[^"]*"', '', name).strip()
+                current_channel['name'] = name
+                
+        elif not line.startswith('#'):
+            # 处理可能存在的$后缀
+            url_parts = line.split('$', 1)
+            url = url_parts[0]
+            route_info = url_parts[1] if len(url_parts) > 1 else None
+            current_channel['url'] = url
+            current_channel['route_info'] = route_info
+            # 这是频道URL
+            if 'name' in current_channel:
+                channels.append(current_channel.copy())
+                current_channel = {}
+            elif 'tvg-name' in current_channel:
+                current_channel['name'] = current_channel['tvg-name']
+                channels.append(current_channel.copy())
+                current_channel = {}
+            elif 'group-title' in current_channel:
+                current_channel['name'] = current_channel['group-title']
+                channels.append(current_channel.copy())
+                current_channel = {}
+
+    return (channels, tvg_channel)
+
+def parse_txt_content(content: str) -> List[Dict[str, str]]:
+    """解析txt格式内容
+    支持以下格式：
+    1. 频道名,播放地址
+    2. 频道名,分组,播放地址
+    3. 单行播放地址（使用URL最后一段作为频道名）
+    4. 分组名,#genre#
+       频道名,播放地址
+    5. 频道名,播放地址$线路信息
+    """
+    channels = []
+    current_group = None
+    # 标准化换行符
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    # 移除 BOM
+    content = content.strip('\ufeff')
+    
+    # 打印更详细的调试信息
+    lines = content.splitlines()
+    print(f"[解析TXT] 总行数: {len(lines)}")
+    print(f"[解析TXT] 原始内容长度: {len(content)}")
+    print(f"[解析TXT] 非空行数: {len([line for line in lines if line.strip()])}")
+    
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        
+        parts = line.split(',')
+        
+        # 检查是否是分组标记行
+        if len(parts) == 2 and parts[1].strip() == '#genre#':
+            current_group = parts[0].strip()
+            continue
+        
+        channel = {}
+        
+        if len(parts) == 1:  # 仅包含URL
+            url = parts[0].strip()
+            # 处理可能存在的$后缀
+            url_parts = url.split('$', 1)
+            url = url_parts[0]
+            route_info = url_parts[1] if len(url_parts) > 1 else None
+            # 从URL中提取名称（使用最后一段，去除扩展名）
+            name = url.split('/')[-1].split('?')[0].rsplit('.', 1)[0]
+            channel = {
+                'name': name,
+                'url': url,
+                'route_info': route_info
+            }
+        elif len(parts) >= 2:  # 名称,URL格式 或 名称,分组,URL格式
+            name = parts[0].strip()
+            if len(parts) >= 3:  # 名称,分组,URL格式
+                channel['group-title'] = parts[1].strip()
+                url_part = parts[2].strip()
+            else:  # 名称,URL格式
+                url_part = parts[1].strip()
+            
+            # 处理URL中的$后缀
+            url_parts = url_part.split('$', 1)
+            url = url_parts[0]
+            route_info = url_parts[1] if len(url_parts) > 1 else None
+            
+            channel.update({
+                'name': name,
+                'url': url,
+                'route_info': route_info
+            })
+        
+        if channel and channel.get('url'):
+            # 如果当前有分组，且channel中没有group-title，则添加分组信息
+            if current_group and 'group-title' not in channel:
+                channel['group-title'] = current_group
+            channels.append(channel)
+    
+    return channels
+
+
+def parse_playlist_payload(payload: Dict) -> Dict:
+    """在解析进程中解析直播源内容
+
+    Args:
+        payload: 包含 content、url、type 以及源的默认 tvg 属性的字典
+
+    Returns:
+        dict: 包含 channels 和 tvg_channel 的解析结果
+    """
+    content = payload['content']
+    url = (payload.get('url') or '').lower()
+    tvg_channel = payload.get('tvg_channel') or {}
+    # 根据文件类型解析内容
+    if url.endswith('.m3u') or url.endswith('.m3u8') or content.strip().startswith('#EXTM3U') or payload.get('type') == 'm3u':
+        channels, tvg_channel = parse_m3u_content(content)
+    else:
+        # 处理txt格式
+        channels = parse_txt_content(content)
+    return {'channels': channels, 'tvg_channel': tvg_channel}
+
+
+def parse_stream_source(payload: Dict) -> Dict:
+    """同步流水线的解析阶段：解析直播源内容，源信息和下载状态原样带回写入阶段
+
+    解析进程按模块路径导入本函数，定义在本模块中，解析进程无需导入同步模块及其依赖。
+    """
+    parsed = parse_playlist_payload(payload)
+    return {'source': payload['source'], 'fetch_state': payload['fetch_state'], **parsed}
@@ -1,11 +1,31 @@
-
 import logging
+import multiprocessing
+import os
 logger = logging.getLogger(__name__)
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 test_executor = ThreadPoolExecutor(
     max_workers=4, 
     thread_name_prefix="test_executor",
     initializer=lambda: logger.info("test worker initialized")
-)
\ No newline at end of file
+)
+
+# 解析EPG/M3U等CPU密集型任务的进程池
+# 使用spawn启动：服务进程是多线程的，fork会复制其他线程持有的锁（如日志处理器的锁），子进程可能死锁
+parse_executor = ProcessPoolExecutor(
+    max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)),
+    mp_context=multiprocessing.get_context('spawn')
+)
+
+# 同步流水线的单写线程，保证写入串行
+sync_writer_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix="sync_writer"
+)
+
+# 输出文件预压缩线程池（zlib/brotli压缩时释放GIL）
+compress_executor = ThreadPoolExecutor(
+    max_workers=2,
+    thread_name_prefix="output_compress"
+)
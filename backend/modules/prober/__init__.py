@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+FFPROBE_BINARY = 'ffprobe'
+# 探测子进程主要在等待网络I/O，每个CPU可并发多个
+PROBES_PER_CPU = 4
+# 测速子进程需要解码，按CPU数量并发
+SPEED_TESTS_PER_CPU = 1
+# 每个并发槽位占用的文件描述符估算：子进程的stdout/stderr管道、创建时的临时管道及测试过程中的网络连接
+FDS_PER_SLOT = 6
+# 为数据库、HTTP客户端、日志等保留的文件描述符
+RESERVED_FDS = 128
+# 并发上限，避免在多核机器上同时发起过多网络请求
+MAX_PROBE_CONCURRENCY = 64
+MAX_SPEED_TEST_CONCURRENCY = 16
+# 子进程被终止后等待其退出的秒数
+TERMINATE_GRACE_SECONDS = 2
+
+
+def get_fd_budget() -> Optional[int]:
+    """可用于探测子进程的文件描述符数量，无法获取限制（如Windows）时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return max(FDS_PER_SLOT * 2, soft - RESERVED_FDS)
+
+
+def compute_capacity() -> Tuple[int, int]:
+    """根据CPU数量和打开文件数限制计算探测和测速的并发数
+
+    Returns:
+        tuple: (探测并发数, 测速并发数)
+    """
+    cpu_count = os.cpu_count() or 2
+    probes = min(cpu_count * PROBES_PER_CPU, MAX_PROBE_CONCURRENCY)
+    speed_tests = min(cpu_count * SPEED_TESTS_PER_CPU, MAX_SPEED_TEST_CONCURRENCY)
+
+    fd_budget = get_fd_budget()
+    if fd_budget is not None:
+        slots = max(2, fd_budget // FDS_PER_SLOT)
+        if probes + speed_tests > slots:
+            # 按比例缩减，两类任务至少各保留一个槽位
+            speed_tests = max(1, slots * speed_tests // (probes + speed_tests))
+            probes = max(1, slots - speed_tests)
+    return probes, speed_tests
+
+
+def options_to_args(options: Dict[str, Optional[object]]) -> List[str]:
+    """将选项字典转换为命令行参数，值为None的选项只输出名称"""
+    args = []
+    for key, value in options.items():
+        args.append(f'-{key}')
+        if value is not None:
+            args.append(str(value))
+    return args
+
+
+class ProbeError(Exception):
+    """子进程执行失败或超时"""
+
+    def __init__(self, message: str, stderr: str = ''):
+        super().__init__(message)
+        self.stderr = stderr
+
+
+class _ProcessSlots:
+    """一类子进程的并发槽位及统计"""
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self._semaphore = asyncio.Semaphore(capacity)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def acquire(self):
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds += time.perf_counter() - started
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    @property
+    def saturated(self) -> bool:
+        """排队数量达到并发数，继续提交只会增加排队"""
+        return self.waiting >= self.capacity
+
+    def snapshot(self) -> dict:
+        return {
+            'capacity': self.capacity,
+            'active': self.active,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'wait_seconds': round(self.wait_seconds, 2),
+        }
+
+
+class StreamProber:
+    """ffprobe/ffmpeg子进程的统一执行入口
+
+    子进程通过asyncio子进程启动，管道以非阻塞方式读取，不占用线程池；
+    超时只终止本次启动的子进程并回收，不影响其他测试。
+    探测与测速分别限流，并发数由CPU数量和打开文件数限制决定；
+    当前事件循环不支持子进程时（如Windows的SelectorEventLoop）退回到专用线程执行。
+    """
+
+    def __init__(self, probe_capacity: Optional[int] = None, speed_test_capacity: Optional[int] = None):
+        default_probes, default_speed_tests = compute_capacity()
+        self.probe_slots = _ProcessSlots('probe', probe_capacity or default_probes)
+        self.speed_test_slots = _ProcessSlots('speed_test', speed_test_capacity or default_speed_tests)
+        self._subprocess_supported: Optional[bool] = None
+        logger.info(
+            f"[探测器] 探测并发: {self.probe_slots.capacity}，测速并发: {self.speed_test_slots.capacity}"
+        )
+
+    @property
+    def capacity(self) -> int:
+        """同时处于探测或测速阶段的测试数量上限"""
+        return self.probe_slots.capacity + self.speed_test_slots.capacity
+
+    @property
+    def saturated(self) -> bool:
+        return self.probe_slots.saturated or self.speed_test_slots.saturated
+
+    def pressure(self) -> dict:
+        """当前的排队与执行情况，供批量测试调整提交速度"""
+        return {
+            'probe': self.probe_slots.snapshot(),
+            'speed_test': self.speed_test_slots.snapshot(),
+            'saturated': self.saturated,
+        }
+
+    async def wait_until_available(self, poll_interval: float = 0.5) -> float:
+        """等待排队回落到并发数以下，返回等待的秒数"""
+        started = time.perf_counter()
+        while self.saturated:
+            await asyncio.sleep(poll_interval)
+        return time.perf_counter() - started
+
+    async def probe(self, url: str, options: Dict[str, Optional[object]], timeout: float) -> dict:
+        """执行ffprobe并返回解析后的JSON结果
+
+        Raises:
+            ProbeError: ffprobe返回非零状态、超时或输出无法解析
+        """
+        args = [FFPROBE_BINARY, '-show_format', '-show_streams', '-of', 'json'] + options_to_args(options) + [url]
+        async with self.probe_slots.acquire():
+            returncode, stdout, stderr, timed_out = await self._execute(args, timeout)
+        if timed_out:
+            self.probe_slots.timeouts += 1
+            raise ProbeError(f"ffprobe超时({timeout}s)", stderr)
+        if returncode != 0:
+            self.probe_slots.failures += 1
+            raise ProbeError(f"ffprobe退出码 {returncode}", stderr)
+        try:
+            return json.loads(stdout.decode('utf-8'))
+        except ValueError as e:
+            self.probe_slots.failures += 1
+            raise ProbeError(f"ffprobe输出无法解析: {str(e)}", stderr)
+
+    async def run_speed_test(self, args: List[str], on_line: Callable[[str], None], duration: float) -> bool:
+        """执行ffmpeg测速，stderr的每一行实时交给on_line处理，到达duration后终止
+
+        Returns:
+            bool: 进程是否在duration内自行结束
+        """
+        async with self.speed_test_slots.acquire():
+            returncode, _, _, timed_out = await self._execute(args, duration, on_line)
+        if returncode not in (0, None) and not timed_out:
+            self.speed_test_slots.failures += 1
+        return not timed_out
+
+    async def _execute(self, args: List[str], timeout: float,
+                       on_line: Optional[Callable[[str], None]] = None) -> Tuple[Optional[int], bytes, str, bool]:
+        """执行子进程，返回 (退出码, stdout, stderr, 是否超时)
+
+        on_line不为空时stderr逐行交给on_line，stdout丢弃；否则收集stdout和stderr。
+        """
+        if self._subprocess_supported is not False:
+            try:
+                return await self._execute_async(args, timeout, on_line)
+            except NotImplementedError:
+                self._subprocess_supported = False
+                logger.warning("[探测器] 当前事件循环不支持子进程，改为在线程中执行")
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._execute_blocking, args, timeout, on_line
+        )
+
+    async def _execute_async(self, args: List[str], timeout: float,
+                             on_line: Optional[Callable[[str], None]]) -> Tuple[Optional[int], bytes, str, bool]:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL if on_line else asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._subprocess_supported = True
+        stderr_lines = []
+
+        async def read_stderr():
+            async for line in process.stderr:
+                text = line.decode('utf-8', errors='ignore')
+                if on_line:
+                    on_line(text)
+                else:
+                    stderr_lines.append(text)
+
+        async def read_stdout():
+            return await process.stdout.read() if process.stdout else b''
+
+        stdout, timed_out = b'', False
+        try:
+            stdout, _ = await asyncio.wait_for(asyncio.gather(read_stdout(), read_stderr()), timeout)
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            await self._terminate(process)
+        return process.returncode, stdout, ''.join(stderr_lines), timed_out
+
+    @staticmethod
+    async def _terminate(process: asyncio.subprocess.Process):
+        """终止并回收子进程，避免遗留僵尸进程"""
+        if process.returncode is not None:
+            return
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"[探测器] 子进程 {process.pid} 未能及时退出")
+
+    @staticmethod
+    def _execute_blocking(args: List[str], timeout: float,
+                          on_line: Optional[Callable[[str], None]]) -> Tuple[Optional[int], bytes, str, bool]:
+        """线程中执行子进程，到期由定时器终止，逐行读取stderr"""
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL if on_line else subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+        stdout, stderr_lines = b'', []
+        try:
+            if on_line:
+                for line in process.stderr:
+                    on_line(line.decode('utf-8', errors='ignore'))
+            else:
+                stdout, stderr = process.communicate()
+                stderr_lines.append(stderr.decode('utf-8', errors='ignore'))
+            process.wait()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if process.stderr:
+                process.stderr.close()
+        return process.returncode, stdout, ''.join(stderr_lines), expired.is_set()
+
+
+# 全局的流探测器
+stream_prober = StreamProber()
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Iterable, List, Optional, TypeVar
+
+from modules.prober import stream_prober
+from modules.stream_tracks.utils.throughput import MAX_THROUGHPUT_CONCURRENCY
+
+import logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# 每个主机同时进行的探测和测速数，避免同一源站短时间内收到大量拉流请求而限流
+HOST_CONCURRENCY = 4
+# 每个主机每秒新发起的测试数（令牌桶的补充速度）
+HOST_RATE_PER_SECOND = 2.0
+# 令牌桶容量，允许的瞬时突发数
+HOST_BURST = 4
+# 主机状态闲置多久（秒）后清理
+HOST_IDLE_SECONDS = 600
+
+
+class _HostState:
+    """单个主机的并发、令牌桶和排队情况"""
+
+    def __init__(self, key: str, concurrency: int, rate: float, burst: int):
+        self.key = key
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.last_used = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def next_token_delay(self) -> float:
+        """距离下一个令牌可用的秒数"""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else 0.0
+
+    @property
+    def saturated(self) -> bool:
+        """并发已满且仍有排队，继续提交只会增加排队"""
+        return self.active >= self.concurrency and len(self.waiters) > 0
+
+    def snapshot(self) -> dict:
+        return {
+            'concurrency': self.concurrency,
+            'active': self.active,
+            'waiting': len(self.waiters),
+            'tokens': round(self.tokens, 2),
+            'rate_per_second': self.rate,
+            'completed': self.completed,
+            'avg_seconds': round(self.total_seconds / self.completed, 2) if self.completed else None,
+        }
+
+
+class HostDispatcher:
+    """按主机分配探测和测速的并发
+
+    全局并发之外，每个主机（get_domain_key 的结果）限制同时进行的测试数，并用令牌桶限制新发起的速度。
+    有空闲槽位时按主机轮流放行排队的请求：并发已满或令牌不足的慢主机只让自己的请求排队，
+    全局槽位继续分给其他主机，不会因少数主机拖慢整轮测试。
+    """
+
+    def __init__(self, global_concurrency: int, host_concurrency: int = HOST_CONCURRENCY,
+                 host_rate: float = HOST_RATE_PER_SECOND, host_burst: int = HOST_BURST):
+        self.global_concurrency = global_concurrency
+        self.host_concurrency = host_concurrency
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.active = 0
+        self._hosts: Dict[str, _HostState] = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _get_host(self, key: str) -> _HostState:
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _HostState(key, self.host_concurrency, self.host_rate, self.host_burst)
+        return host
+
+    def is_saturated(self, key: str) -> bool:
+        host = self._hosts.get(key)
+        return host is not None and host.saturated
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        """占用一个测试槽位，等待主机并发、令牌和全局并发均满足"""
+        host = self._get_host(key)
+        waiter = asyncio.get_running_loop().create_future()
+        host.waiters.append(waiter)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已分配槽位但调用方被取消，归还槽位
+                self._release(host, 0.0)
+            elif waiter in host.waiters:
+                # 已取消的等待者可能已被 _dispatch 清理
+                host.waiters.remove(waiter)
+            raise
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(host, time.perf_counter() - started)
+
+    def _release(self, host: _HostState, elapsed: float):
+        host.active -= 1
+        host.completed += 1
+        host.total_seconds += elapsed
+        host.last_used = time.monotonic()
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """按主机轮流放行排队的请求，直到全局并发已满或没有可放行的主机"""
+        now = time.monotonic()
+        next_delay = None
+        while self.active < self.global_concurrency:
+            granted = False
+            for key in list(self._hosts):
+                if self.active >= self.global_concurrency:
+                    break
+                host = self._hosts[key]
+                while host.waiters and host.waiters[0].done():
+                    host.waiters.popleft()
+                if not host.waiters or host.active >= host.concurrency:
+                    continue
+                host.refill(now)
+                if host.tokens < 1:
+                    delay = host.next_token_delay()
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+                    continue
+                host.tokens -= 1
+                host.active += 1
+                self.active += 1
+                host.waiters.popleft().set_result(None)
+                # 放行后移到末尾，下一个槽位优先分给其他主机
+                self._hosts.move_to_end(key)
+                granted = True
+                break
+            if not granted:
+                break
+
+        if next_delay is not None and self._timer is None:
+            # 有主机在等待令牌，令牌补充后再次分配
+            def on_timer():
+                self._timer = None
+                self._dispatch()
+            self._timer = asyncio.get_running_loop().call_later(next_delay, on_timer)
+        self._cleanup(now)
+
+    def _cleanup(self, now: float):
+        for key in [key for key, host in self._hosts.items()
+                    if not host.active and not host.waiters and now - host.last_used > HOST_IDLE_SECONDS]:
+            del self._hosts[key]
+
+    def snapshot(self, limit: int = 50) -> dict:
+        """全局并发和各主机的限制与排队情况，按排队数和执行数降序"""
+        hosts = sorted(self._hosts.values(), key=lambda h: (len(h.waiters), h.active), reverse=True)
+        return {
+            'global_concurrency': self.global_concurrency,
+            'active': self.active,
+            'waiting': sum(len(h.waiters) for h in self._hosts.values()),
+            'host_count': len(self._hosts),
+            'hosts': {host.key: host.snapshot() for host in hosts[:limit]},
+        }
+
+
+def interleave_by_key(items: Iterable[T], key: Callable[[T], str]) -> List[T]:
+    """按键轮流排列，同一主机的频道分散到各批次中，避免一个批次集中请求同一主机"""
+    groups: Dict[str, Deque[T]] = OrderedDict()
+    for item in items:
+        groups.setdefault(key(item), deque()).append(item)
+    result = []
+    while groups:
+        for group_key in list(groups):
+            group = groups[group_key]
+            result.append(group.popleft())
+            if not group:
+                del groups[group_key]
+    return result
+
+
+# 全局的主机调度器，批量测试和持续测试共用；全局并发为探测器并发数与进程内测速并发数之和
+host_dispatcher = HostDispatcher(stream_prober.capacity + MAX_THROUGHPUT_CONCURRENCY)
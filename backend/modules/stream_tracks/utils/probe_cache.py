@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from database import async_db
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 探测结果的有效期（秒），编码、分辨率等参数很少变化
+PROBE_CACHE_TTL_SECONDS = 24 * 3600
+# 各协议的默认端口，规范化时省略
+_DEFAULT_PORTS = {'http': 80, 'https': 443, 'rtmp': 1935, 'rtsp': 554}
+# 描述HLS多码率和媒体轨道的标签，内容变化说明编码或分辨率可能发生变化
+_FINGERPRINT_TAGS = ('#EXT-X-STREAM-INF:', '#EXT-X-MEDIA:', '#EXT-X-I-FRAME-STREAM-INF:')
+
+
+def normalize_url(url: str) -> str:
+    """规范化URL作为缓存键：协议和主机名小写、省略默认端口、查询参数排序、去掉片段"""
+    try:
+        parsed = urlsplit(url.strip())
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or '').lower()
+        port = parsed.port
+    except ValueError:
+        return url.strip()
+    if ':' in host:
+        host = f'[{host}]'
+    netloc = host
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f'{host}:{port}'
+    if parsed.username:
+        userinfo = parsed.username + (f':{parsed.password}' if parsed.password else '')
+        netloc = f'{userinfo}@{netloc}'
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parsed.path or '/', query, ''))
+
+
+def playlist_fingerprint(body: bytes) -> Optional[str]:
+    """HLS主播放列表的指纹，只取多码率和媒体轨道的属性（去掉可能带令牌的URI）
+
+    媒体播放列表的分片随时间滚动，不具备稳定的指纹，返回None，仅按有效期判断。
+    """
+    lines = []
+    for raw_line in body.decode('utf-8', errors='replace').splitlines():
+        line = raw_line.strip()
+        if line.startswith(_FINGERPRINT_TAGS):
+            attributes = [item for item in line.split(',') if not item.startswith('URI=')]
+            lines.append(','.join(attributes))
+    if not lines:
+        return None
+    return hashlib.sha1('\n'.join(sorted(lines)).encode('utf-8')).hexdigest()
+
+
+def _load_entry(conn, url_key: str) -> Optional[dict]:
+    row = conn.execute(
+        "SELECT fingerprint, probe_result, probed_at FROM probe_cache WHERE url_key = ?", (url_key,)
+    ).fetchone()
+    if not row:
+        return None
+    return {'fingerprint': row[0], 'probe_result': json.loads(row[1]), 'probed_at': datetime.fromisoformat(row[2])}
+
+
+def _store_entry(conn, url_key: str, url: str, fingerprint: Optional[str], probe_result: dict):
+    conn.execute("""
+        INSERT INTO probe_cache (url_key, url, fingerprint, probe_result, probed_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(url_key) DO UPDATE SET
+            url = excluded.url,
+            fingerprint = excluded.fingerprint,
+            probe_result = excluded.probe_result,
+            probed_at = excluded.probed_at
+    """, (url_key, url, fingerprint, json.dumps(probe_result), datetime.now().isoformat()))
+
+
+def prune_probe_cache(conn, ttl_seconds: int = PROBE_CACHE_TTL_SECONDS) -> int:
+    """删除已过期的探测结果，返回删除的记录数"""
+    cutoff = (datetime.now() - timedelta(seconds=ttl_seconds)).isoformat()
+    return conn.execute("DELETE FROM probe_cache WHERE probed_at < ?", (cutoff,)).rowcount
+
+
+class ProbeCache:
+    """按规范化URL缓存ffprobe探测结果
+
+    有效期内且HLS主播放列表指纹未变化时直接复用，只有探测成功的结果才写入缓存；
+    同一URL正在探测时，其他请求等待并共享该次结果，同一轮测试中重复的URL只探测一次。
+    """
+
+    def __init__(self, ttl_seconds: int = PROBE_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.expired = 0
+        self.fingerprint_changes = 0
+
+    def _is_fresh(self, entry: dict, fingerprint: Optional[str]) -> bool:
+        if datetime.now() - entry['probed_at'] > timedelta(seconds=self.ttl_seconds):
+            self.expired += 1
+            return False
+        if fingerprint and entry['fingerprint'] and fingerprint != entry['fingerprint']:
+            self.fingerprint_changes += 1
+            return False
+        return True
+
+    async def get_or_probe(self, url: str, fingerprint: Optional[str],
+                           probe: Callable[[], Awaitable[dict]]) -> dict:
+        """获取缓存的探测结果，缓存缺失、过期或指纹变化时执行probe
+
+        Args:
+            url: 流地址
+            fingerprint: 本次可达性检查得到的HLS主播放列表指纹，未知时为None
+            probe: 探测函数，失败时返回空字典
+        """
+        url_key = normalize_url(url)
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(url_key)
+        if inflight is not None and inflight.get_loop() is loop:
+            self.shared += 1
+            return await asyncio.shield(inflight)
+
+        future = loop.create_future()
+        self._inflight[url_key] = future
+        result = {}
+        try:
+            entry = await async_db.read(_load_entry, url_key)
+            if entry is not None and self._is_fresh(entry, fingerprint):
+                self.hits += 1
+                logger.debug(f"[探测缓存] 复用探测结果: {url}")
+                result = entry['probe_result']
+            else:
+                self.misses += 1
+                result = await probe()
+                if result:
+                    await async_db.write(_store_entry, url_key, url, fingerprint, result)
+            return result
+        finally:
+            future.set_result(result)
+            if self._inflight.get(url_key) is future:
+                del self._inflight[url_key]
+
+    def stats(self) -> dict:
+        return {
+            'ttl_seconds': self.ttl_seconds,
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'shared': self.shared,
+            'expired': self.expired,
+            'fingerprint_changes': self.fingerprint_changes,
+        }
+
+
+# 全局的探测结果缓存
+probe_cache = ProbeCache()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from modules.prober import get_fd_budget
+from modules.stream_tracks.utils.probe_cache import playlist_fingerprint
+from utils.http_client import SharedHttpClient, read_limited
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 可达性检查的并发上限，检查只建立连接并读取少量数据，可以远高于探测并发
+MAX_REACHABILITY_CONCURRENCY = 256
+# 每个目标主机同时进行的检查数
+REACHABILITY_PER_HOST_LIMIT = 8
+# 建立连接的超时（秒）
+REACHABILITY_CONNECT_TIMEOUT = 3
+# 单次检查的总超时（秒）
+REACHABILITY_TOTAL_TIMEOUT = 5
+# 普通HTTP流只读取开头的字节数
+RANGE_PROBE_BYTES = 1024
+# HLS播放列表最多读取的字节数
+MAX_MANIFEST_BYTES = 256 * 1024
+# 只检查TCP连接的协议及其默认端口
+DEFAULT_PORTS = {
+    'rtmp': 1935,
+    'rtmps': 443,
+    'rtsp': 554,
+    'rtsps': 322,
+}
+# 发送HTTP请求检查的协议
+HTTP_SCHEMES = ('http', 'https')
+
+
+@dataclass
+class ReachabilityResult:
+    """可达性检查的结果
+
+    reachable 为 True 时才需要进入ffprobe探测和测速；
+    checked 为 False 表示该协议无法廉价检查（如UDP组播），直接交给后续探测判断；
+    fingerprint 为HLS主播放列表的指纹，用于判断缓存的探测结果是否仍然有效。
+    """
+    reachable: bool
+    reason: str = ''
+    latency_ms: Optional[float] = None
+    status: Optional[int] = None
+    checked: bool = True
+    fingerprint: Optional[str] = None
+
+
+def _compute_concurrency() -> int:
+    """检查并发数，受打开文件数限制约束（每个检查占用一个连接）"""
+    fd_budget = get_fd_budget()
+    if fd_budget is None:
+        return MAX_REACHABILITY_CONCURRENCY
+    return max(1, min(MAX_REACHABILITY_CONCURRENCY, fd_budget // 2))
+
+
+REACHABILITY_CONCURRENCY = _compute_concurrency()
+
+# 可达性检查专用的HTTP客户端，连接数更多、超时更短，不与源数据下载争用连接池
+reachability_client = SharedHttpClient(
+    limit=REACHABILITY_CONCURRENCY,
+    per_host_limit=REACHABILITY_PER_HOST_LIMIT,
+    connect_timeout=REACHABILITY_CONNECT_TIMEOUT,
+    read_timeout=REACHABILITY_TOTAL_TIMEOUT
+)
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(REACHABILITY_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+async def _check_http(url: str, is_hls: bool) -> ReachabilityResult:
+    """HTTP流：HLS读取播放列表并校验格式，其他流用Range请求只读取开头的少量数据"""
+    headers = {} if is_hls else {'Range': f'bytes=0-{RANGE_PROBE_BYTES - 1}'}
+    timeout = aiohttp.ClientTimeout(
+        total=REACHABILITY_TOTAL_TIMEOUT,
+        connect=REACHABILITY_CONNECT_TIMEOUT,
+        sock_read=REACHABILITY_TOTAL_TIMEOUT
+    )
+    started = time.perf_counter()
+    async with reachability_client.request('GET', url, headers=headers, timeout=timeout,
+                                           allow_redirects=True) as response:
+        # 收到响应头即视为连接延迟，替代ICMP ping
+        latency_ms = _elapsed_ms(started)
+        if response.status not in (200, 206):
+            return ReachabilityResult(False, f"HTTP {response.status}", latency_ms, response.status)
+
+        content_type = response.headers.get('Content-Type', '').lower()
+        if is_hls:
+            # 读取完整的播放列表再校验和计算指纹，只取第一块缓冲数据会使指纹随分包方式变化
+            body = await read_limited(response, MAX_MANIFEST_BYTES)
+            if not body.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'#EXTM3U'):
+                return ReachabilityResult(False, "不是有效的HLS播放列表", latency_ms, response.status)
+            return ReachabilityResult(True, '', latency_ms, response.status, fingerprint=playlist_fingerprint(body))
+        else:
+            # 多数失效链接返回错误页面
+            if content_type.startswith('text/html'):
+                return ReachabilityResult(False, "返回HTML页面", latency_ms, response.status)
+            if not await response.content.read(RANGE_PROBE_BYTES):
+                return ReachabilityResult(False, "响应内容为空", latency_ms, response.status)
+        return ReachabilityResult(True, '', latency_ms, response.status)
+
+
+async def _check_tcp(url: str, scheme: str) -> ReachabilityResult:
+    """RTMP/RTSP（含TLS）：只检查能否建立TCP连接"""
+    parsed = urlparse(url)
+    if not parsed.hostname:
+        return ReachabilityResult(False, "无法解析主机名")
+    port = parsed.port or DEFAULT_PORTS[scheme]
+    started = time.perf_counter()
+    _, writer = await asyncio.wait_for(
+        asyncio.open_connection(parsed.hostname, port),
+        timeout=REACHABILITY_CONNECT_TIMEOUT
+    )
+    latency_ms = _elapsed_ms(started)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return ReachabilityResult(True, '', latency_ms)
+
+
+async def check_reachability(url: str, protocol: str) -> ReachabilityResult:
+    """第一层检查：用很短的超时和高并发快速排除失效的流
+
+    Args:
+        url: 流地址
+        protocol: detect_stream_protocol 的检测结果
+
+    按URL的协议选择检查方式：只有http/https发送HTTP请求，RTMP/RTSP及其TLS版本只检查TCP连接，
+    其他协议（如UDP组播）不做检查。detect_stream_protocol 会把未知协议归为http，不能据此判断。
+    """
+    try:
+        scheme = urlparse(url.strip()).scheme.lower()
+    except ValueError:
+        scheme = ''
+    if scheme not in HTTP_SCHEMES and scheme not in DEFAULT_PORTS:
+        return ReachabilityResult(True, "该协议不做可达性检查", checked=False)
+
+    async with _get_semaphore():
+        try:
+            if scheme in DEFAULT_PORTS:
+                return await _check_tcp(url, scheme)
+            return await _check_http(url, protocol == 'hls')
+        except asyncio.TimeoutError:
+            return ReachabilityResult(False, "连接超时")
+        except (aiohttp.ClientError, OSError) as e:
+            return ReachabilityResult(False, f"连接失败: {type(e).__name__} {str(e)}")
+        except Exception as e:
+            logger.debug(f"可达性检查出错: {url}, 错误: {str(e)}")
+            return ReachabilityResult(False, f"检查出错: {str(e)}")
@@ -0,0 +1,366 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+
+from utils.http_client import SharedHttpClient, read_limited
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 同时进行的测速数，测速共享本机带宽，过高会互相干扰导致结果偏低
+MAX_THROUGHPUT_CONCURRENCY = 32
+# 单次测速的时间上限（秒），与ffmpeg测速的时长一致
+MEASURE_SECONDS = 6
+# HLS测速下载的分片数
+SEGMENTS_TO_MEASURE = 3
+# 单个分片最多下载的字节数
+MAX_SEGMENT_BYTES = 32 * 1024 * 1024
+# 播放列表最多读取的字节数
+MAX_PLAYLIST_BYTES = 1024 * 1024
+# 普通HTTP流按此间隔（秒）采样速度，用于计算稳定性
+SAMPLE_INTERVAL = 0.5
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 5
+
+# 测速专用的HTTP客户端，连接复用，不与源数据下载争用连接池
+throughput_client = SharedHttpClient(
+    limit=MAX_THROUGHPUT_CONCURRENCY * 2,
+    per_host_limit=4,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT
+)
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+_ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class NotMeasurable(Exception):
+    """内容无法在进程内测速（如非HLS的播放列表格式），需要退回到ffmpeg"""
+
+
+@dataclass
+class Segment:
+    duration: float
+    uri: str
+    byte_range: Optional[Tuple[int, int]] = None  # (起始偏移, 长度)
+
+
+@dataclass
+class Variant:
+    bandwidth: int
+    uri: str
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(MAX_THROUGHPUT_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+def parse_playlist(text: str, base_url: str) -> Tuple[List[Variant], List[Segment], bool]:
+    """解析HLS播放列表
+
+    Returns:
+        tuple: (多码率列表, 分片列表, 是否为直播)；主播放列表只有多码率，媒体播放列表只有分片
+    """
+    variants, segments = [], []
+    ended = False
+    pending_duration: Optional[float] = None
+    pending_bandwidth: Optional[int] = None
+    pending_range: Optional[Tuple[int, int]] = None
+    next_offset = 0
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXTINF:'):
+            try:
+                pending_duration = float(line[8:].split(',', 1)[0])
+            except ValueError:
+                pending_duration = 0.0
+        elif line.startswith('#EXT-X-STREAM-INF:'):
+            attributes = dict(_ATTRIBUTE_PATTERN.findall(line[18:]))
+            try:
+                pending_bandwidth = int(attributes.get('BANDWIDTH', '0'))
+            except ValueError:
+                pending_bandwidth = 0
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            length, _, offset = line[17:].partition('@')
+            start = int(offset) if offset else next_offset
+            pending_range = (start, int(length))
+            next_offset = start + int(length)
+        elif line.startswith('#EXT-X-ENDLIST'):
+            ended = True
+        elif line.startswith('#'):
+            continue
+        elif pending_bandwidth is not None:
+            variants.append(Variant(pending_bandwidth, urljoin(base_url, line)))
+            pending_bandwidth = None
+        elif pending_duration is not None:
+            segments.append(Segment(pending_duration, urljoin(base_url, line), pending_range))
+            pending_duration, pending_range = None, None
+
+    return variants, segments, not ended
+
+
+def score_speed_test(current_speed: float, buffer_health: float, speed_history: List[float],
+                     bitrate: int) -> Tuple[float, float, bool]:
+    """根据速度、缓冲健康度和速度历史计算稳定性、综合质量评分和测速状态
+
+    Returns:
+        tuple: (稳定性评分, 质量评分, 是否通过)
+    """
+    stability_score = 0.0
+    logger.debug(f"计算稳定性，速度历史记录数: {len(speed_history)}")
+
+    if len(speed_history) > 1:
+        # 计算速度的标准差与平均值的比率，越小越稳定
+        avg_speed = sum(speed_history) / len(speed_history)
+        if avg_speed > 0:
+            variance = sum((s - avg_speed) ** 2 for s in speed_history) / len(speed_history)
+            std_dev = variance ** 0.5
+            # 稳定性评分 = 1 - (标准差/平均值)，限制在0-1范围内
+            # 如果标准差非常大，可能导致负值，所以使用max确保最小为0
+            coefficient = min(std_dev / avg_speed, 1.0)  # 限制系数最大为1
+            stability_score = max(0, 1 - coefficient)
+            logger.debug(f"稳定性计算: 平均速度={avg_speed:.2f}, 标准差={std_dev:.2f}, 系数={coefficient:.2f}, 稳定性评分={stability_score:.2f}")
+    else:
+        # 如果没有足够的历史记录，给一个默认的中等稳定性评分
+        stability_score = 0.5
+        logger.debug(f"历史记录不足，使用默认稳定性评分: {stability_score}")
+
+    # 计算综合质量评分 (结合速度、缓冲健康度和稳定性)
+    quality_score = 0.0
+    if current_speed > 0:
+        # 权重可以根据实际需求调整
+        speed_weight = 0.4
+        buffer_weight = 0.4
+        stability_weight = 0.2
+
+        # 速度评分 (相对于码率的比率，最高为1.0)
+        speed_score = min(1.0, current_speed * 1e6 / (bitrate * 1.5)) if bitrate > 0 else 0.5
+
+        # 缓冲健康度也需要限制在0-1范围内
+        normalized_buffer_health = min(1.0, buffer_health)
+
+        quality_score = (
+            speed_score * speed_weight +
+            normalized_buffer_health * buffer_weight +
+            stability_score * stability_weight
+        )
+        # 确保最终质量评分不超过1.0
+        quality_score = min(1.0, quality_score)
+
+    # 设置最终状态 - 改进判断标准
+    # 不仅考虑速度，还考虑缓冲健康度和稳定性
+    status = (current_speed > 0 and
+              buffer_health > 0.6 and  # 缓冲至少要达到60%
+              stability_score > 0.3)   # 稳定性至少要达到30%
+    return stability_score, quality_score, status
+
+
+def _timeout(deadline: float) -> aiohttp.ClientTimeout:
+    """连接超时不超过测速的截止时间
+
+    不设置总超时：直播流的内容没有结尾，总超时会在等待数据时抛出异常，丢弃已下载的数据；
+    截止时间由 _read_chunk 在每次读取时控制。
+    """
+    remaining = max(0.5, deadline - time.perf_counter())
+    return aiohttp.ClientTimeout(total=None, connect=min(CONNECT_TIMEOUT, remaining), sock_read=READ_TIMEOUT)
+
+
+async def _read_chunk(response: aiohttp.ClientResponse, deadline: float) -> Optional[bytes]:
+    """读取下一块数据，内容结束时返回空字节串，到达截止时间时返回None"""
+    remaining = deadline - time.perf_counter()
+    if remaining <= 0:
+        return None
+    try:
+        return await asyncio.wait_for(response.content.read(DOWNLOAD_CHUNK_SIZE), remaining)
+    except asyncio.TimeoutError:
+        if time.perf_counter() >= deadline:
+            return None
+        # 截止时间之前的读取超时（源站长时间不发送数据）按失败处理
+        raise
+
+
+async def _read_playlist(response: aiohttp.ClientResponse, deadline: float, prefix: bytes = b'') -> str:
+    """读取完整的播放列表（不超过 MAX_PLAYLIST_BYTES），截断的播放列表无法正确选择最新的分片"""
+    remaining = max(0.0, deadline - time.perf_counter())
+    body = prefix + await asyncio.wait_for(read_limited(response, MAX_PLAYLIST_BYTES - len(prefix)), remaining)
+    return body.decode('utf-8', errors='replace')
+
+
+async def _fetch_playlist(url: str, deadline: float) -> Tuple[str, str]:
+    """获取播放列表文本，返回 (文本, 重定向后的地址)"""
+    async with throughput_client.request('GET', url, timeout=_timeout(deadline)) as response:
+        if response.status != 200:
+            raise Exception(f"HTTP {response.status}")
+        return await _read_playlist(response, deadline), str(response.url)
+
+
+async def _download(url: str, deadline: float, byte_range: Optional[Tuple[int, int]] = None,
+                    on_chunk=None) -> Tuple[int, float, bool]:
+    """下载到截止时间或内容结束，返回 (字节数, 耗时, 是否完整)"""
+    headers = {}
+    if byte_range:
+        headers['Range'] = f'bytes={byte_range[0]}-{byte_range[0] + byte_range[1] - 1}'
+    started = time.perf_counter()
+    size = 0
+    async with throughput_client.request('GET', url, headers=headers, timeout=_timeout(deadline)) as response:
+        if response.status not in (200, 206):
+            raise Exception(f"HTTP {response.status}")
+        while True:
+            chunk = await _read_chunk(response, deadline)
+            if chunk is None:
+                return size, time.perf_counter() - started, False
+            if not chunk:
+                break
+            size += len(chunk)
+            if on_chunk:
+                on_chunk(len(chunk))
+            if size >= MAX_SEGMENT_BYTES:
+                return size, time.perf_counter() - started, False
+    return size, time.perf_counter() - started, True
+
+
+async def _measure_hls(url: str, text: str, base_url: str, bitrate: int, deadline: float) -> dict:
+    """HLS测速：下载最新的几个分片，缓冲健康度为分片时长与下载耗时之比"""
+    variants, segments, is_live = parse_playlist(text, base_url)
+    if variants:
+        # 多码率时测最高码率，播放器在带宽允许时会切换到该码率
+        variant = max(variants, key=lambda v: v.bandwidth)
+        if variant.bandwidth and not bitrate:
+            bitrate = variant.bandwidth
+        text, base_url = await _fetch_playlist(variant.uri, deadline)
+        _, segments, is_live = parse_playlist(text, base_url)
+    if not segments:
+        raise Exception("播放列表中没有分片")
+
+    # 直播从最新的分片开始，点播从头开始
+    selected = segments[-SEGMENTS_TO_MEASURE:] if is_live else segments[:SEGMENTS_TO_MEASURE]
+    downloaded, download_time, media_time = 0, 0.0, 0.0
+    speed_history = []
+    for segment in selected:
+        if time.perf_counter() >= deadline:
+            break
+        size, elapsed, complete = await _download(segment.uri, deadline, segment.byte_range)
+        downloaded += size
+        download_time += elapsed
+        if elapsed > 0 and size > 0:
+            speed_history.append(size * 8 / (elapsed * 1e6))
+        if not complete:
+            # 到达截止时间，未下载完的分片只计入速度，不计入媒体时长
+            break
+        media_time += segment.duration
+
+    speed = downloaded * 8 / (download_time * 1e6) if download_time > 0 else 0.0
+    if media_time > 0 and download_time > 0:
+        buffer_health = media_time / download_time
+        if not bitrate:
+            bitrate = int(downloaded * 8 / media_time)
+    else:
+        buffer_health = (speed * 1e6) / bitrate if bitrate > 0 else 0.0
+    return {'speed': speed, 'downloaded': downloaded, 'buffer_health': buffer_health,
+            'speed_history': speed_history, 'bitrate': bitrate}
+
+
+async def _measure_progressive(url: str, bitrate: int, deadline: float) -> dict:
+    """普通HTTP流：持续下载到截止时间，按固定间隔采样速度"""
+    speed_history = []
+    window = {'started': time.perf_counter(), 'bytes': 0}
+
+    def on_chunk(size: int):
+        window['bytes'] += size
+        now = time.perf_counter()
+        elapsed = now - window['started']
+        if elapsed >= SAMPLE_INTERVAL:
+            speed_history.append(window['bytes'] * 8 / (elapsed * 1e6))
+            window['started'], window['bytes'] = now, 0
+
+    async with throughput_client.request('GET', url, timeout=_timeout(deadline)) as response:
+        if response.status not in (200, 206):
+            raise Exception(f"HTTP {response.status}")
+        content_type = response.headers.get('Content-Type', '').lower()
+        if 'mpegurl' in content_type:
+            # 地址中没有.m3u8的HLS播放列表
+            text = await _read_playlist(response, deadline)
+            return await _measure_hls(url, text, str(response.url), bitrate, deadline)
+
+        started = time.perf_counter()
+        downloaded = 0
+        while True:
+            # 直播流没有结尾，读到截止时间为止，已下载的数据计入结果
+            chunk = await _read_chunk(response, deadline)
+            if not chunk:
+                break
+            if downloaded == 0 and chunk.lstrip().startswith(b'#EXTM3U'):
+                text = await _read_playlist(response, deadline, chunk)
+                return await _measure_hls(url, text, str(response.url), bitrate, deadline)
+            if downloaded == 0 and chunk.lstrip().startswith(b'#'):
+                raise NotMeasurable("未知的播放列表格式")
+            downloaded += len(chunk)
+            on_chunk(len(chunk))
+        elapsed = time.perf_counter() - started
+
+    speed = downloaded * 8 / (elapsed * 1e6) if elapsed > 0 else 0.0
+    buffer_health = (speed * 1e6) / bitrate if bitrate > 0 else 0.0
+    return {'speed': speed, 'downloaded': downloaded, 'buffer_health': buffer_health,
+            'speed_history': speed_history, 'bitrate': bitrate}
+
+
+async def measure_throughput(url: str, bitrate: int, is_hls: bool) -> dict:
+    """进程内测速，不启动ffmpeg
+
+    HLS获取播放列表（多码率时选择最高码率）并下载最新的几个分片；普通HTTP流持续下载到截止时间。
+    返回值与ffmpeg测速的结果字段一致。
+
+    Raises:
+        NotMeasurable: 内容无法在进程内测速，调用方应退回到ffmpeg测速
+    """
+    start_time = time.time()
+    async with _get_semaphore():
+        deadline = time.perf_counter() + MEASURE_SECONDS
+        try:
+            if is_hls:
+                text, base_url = await _fetch_playlist(url, deadline)
+                result = await _measure_hls(url, text, base_url, bitrate, deadline)
+            else:
+                result = await _measure_progressive(url, bitrate, deadline)
+        except NotMeasurable:
+            raise
+        except Exception as e:
+            logger.debug(f"测速失败: {url}, {type(e).__name__} {str(e)}")
+            result = None
+
+    if result is None or result['downloaded'] == 0:
+        speed, stability_score, quality_score, status = 0.0, 0.0, 0.0, False
+        result = {'downloaded': 0, 'buffer_health': 0.0}
+    else:
+        speed = result['speed']
+        stability_score, quality_score, status = score_speed_test(
+            speed, result['buffer_health'], result['speed_history'], result['bitrate']
+        )
+    logger.debug(f"测速完成: {url}, 速度: {speed:.2f}Mbps, 缓冲健康度: {result['buffer_health']:.2f}, "
+                 f"稳定性: {stability_score:.2f}, 质量评分: {quality_score:.2f}")
+    return {
+        'download_speed': round(speed, 2),  # 单位: Mbps
+        'speed_test_status': status,
+        'speed_test_time': datetime.now().isoformat(),
+        'downloaded_bytes': result['downloaded'],
+        'duration_seconds': round(time.time() - start_time, 2),
+        'buffer_health': round(result['buffer_health'], 2),
+        'stability_score': round(stability_score, 2),
+        'quality_score': round(quality_score, 2)
+    }
@@ -0,0 +1,470 @@
+import gzip
+import io
+import os
+import sqlite3
+import zipfile
+from contextlib import ExitStack
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+from xml.sax.saxutils import escape
+
+import logging
+logger = logging.getLogger(__name__)
+
+# gzip / zip 文件头魔数
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+# XMLTV时间串中时区偏移的范围，按开始时间范围查询时据此放宽索引扫描的边界
+MIN_UTC_OFFSET = timedelta(hours=-12)
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+# 暂存库批量写入的记录数
+STAGING_BATCH_SIZE = 5000
+
+# 解析结果暂存库结构，由写入阶段ATTACH后批量导入；
+# programs 按节目唯一键建主键，写入阶段据此做集合比对
+STAGING_SCHEMA = """
+    CREATE TABLE channels (
+        channel_id   TEXT,
+        display_name TEXT,
+        language     TEXT,
+        category     TEXT,
+        logo_url     TEXT
+    );
+    CREATE TABLE programs (
+        channel_id  TEXT,
+        title       TEXT,
+        start_time  TEXT,
+        end_time    TEXT,
+        description TEXT,
+        language    TEXT,
+        category    TEXT,
+        PRIMARY KEY (channel_id, start_time, title)
+    ) WITHOUT ROWID;
+"""
+
+
+def _text(elem: Optional[ET.Element]) -> Optional[str]:
+    """获取元素去除首尾空白后的文本"""
+    if elem is None or not elem.text:
+        return None
+    return elem.text.strip()
+
+
+def open_xmltv_file(path: str, content_type: str = '', url: str = '') -> BinaryIO:
+    """以流的方式打开EPG文件，按需透明解压gz/zip
+
+    Args:
+        path: 已下载到本地的EPG文件路径
+        content_type: 响应的Content-Type
+        url: EPG源地址，用于根据扩展名判断压缩格式
+
+    Returns:
+        BinaryIO: 可逐块读取的XML字节流
+    """
+    content_type = (content_type or '').lower()
+    url = (url or '').lower()
+
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+    # 处理gz格式（以文件头为准，服务端可能已自动解压）
+    if magic.startswith(GZIP_MAGIC):
+        logger.info("[XMLTV] 检测到GZ压缩格式，使用流式解压")
+        return gzip.open(path, 'rb')
+    if 'gzip' in content_type or url.endswith('.gz'):
+        logger.info("[XMLTV] 声明为GZ格式但内容未压缩，按XML直接解析")
+
+    # 处理zip格式
+    if magic.startswith(ZIP_MAGIC) or 'application/zip' in content_type or url.endswith('.zip'):
+        zip_file = zipfile.ZipFile(path)
+        # 查找zip文件中的xml文件
+        xml_files = [f for f in zip_file.namelist() if f.lower().endswith('.xml')]
+        if not xml_files:
+            zip_file.close()
+            raise Exception("ZIP文件中未找到XML文件")
+        logger.info(f"[XMLTV] 在ZIP中找到XML文件: {xml_files[0]}，使用流式解压")
+        return _ZipMemberStream(zip_file, xml_files[0])
+
+    return open(path, 'rb')
+
+
+class _ZipMemberStream(io.RawIOBase):
+    """包装zip成员的读取流，关闭时同时关闭zip文件"""
+
+    def __init__(self, zip_file: zipfile.ZipFile, name: str):
+        self._zip_file = zip_file
+        self._member = zip_file.open(name)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._member.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        try:
+            self._member.close()
+            self._zip_file.close()
+        finally:
+            super().close()
+
+
+def iter_xmltv(source: BinaryIO, default_language: str) -> Iterator[Tuple[str, tuple]]:
+    """增量解析XMLTV数据，逐个产出频道和节目
+
+    使用iterparse逐元素处理，处理完毕后立即清理元素，
+    内存占用与文件大小无关。
+
+    Yields:
+        ('channel', (channel_id, display_name, language, category, logo_url))
+        ('programme', (channel_id, title, start_time, end_time, desc, language, category))
+    """
+    context = ET.iterparse(source, events=('start', 'end'))
+    root = None
+    for event, elem in context:
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == 'channel':
+            channel_id = elem.get('id', '')
+            display_name_elem = elem.find('.//display-name')
+            display_name = _text(display_name_elem) or ''
+            language = display_name_elem.get('lang', default_language) if display_name_elem is not None else default_language
+
+            icon_elem = elem.find('.//icon')
+            logo_url = icon_elem.get('src', None) if icon_elem is not None else None
+
+            category = _text(elem.find('.//category'))
+            yield 'channel', (channel_id, display_name, language, category, logo_url)
+        elif elem.tag == 'programme':
+            title_elem = elem.find('title')
+            title = _text(title_elem) or ''
+            language = title_elem.get('lang', default_language) if title_elem is not None else default_language
+            yield 'programme', (
+                elem.get('channel', ''),
+                title,
+                elem.get('start', ''),
+                elem.get('stop', ''),
+                _text(elem.find('desc')),
+                language,
+                _text(elem.find('category'))
+            )
+        else:
+            continue
+
+        # 清理已处理的元素，释放内存
+        elem.clear()
+        if root is not None:
+            root.clear()
+
+
+def parse_xmltv_to_staging(payload: Dict) -> Dict:
+    """将下载的EPG文件解析到SQLite暂存库（在解析进程中执行）
+
+    Args:
+        payload: 下载阶段的结果，需包含 path、staging_path、default_language，
+                 可选 content_type 和 url
+
+    Returns:
+        dict: 在payload基础上增加 channel_count 和 program_count
+    """
+    staging = sqlite3.connect(payload['staging_path'])
+    try:
+        staging.execute("PRAGMA journal_mode = OFF")
+        staging.execute("PRAGMA synchronous = OFF")
+        staging.executescript(STAGING_SCHEMA)
+
+        channels_batch = []
+        programs_batch = []
+        channel_count = 0
+        program_count = 0
+        with open_xmltv_file(payload['path'], payload.get('content_type', ''), payload.get('url', '')) as xml_stream:
+            for kind, item in iter_xmltv(xml_stream, payload['default_language']):
+                if kind == 'channel':
+                    channel_count += 1
+                    channels_batch.append(item)
+                    if len(channels_batch) >= STAGING_BATCH_SIZE:
+                        staging.executemany("INSERT INTO channels VALUES (?, ?, ?, ?, ?)", channels_batch)
+                        channels_batch = []
+                else:
+                    program_count += 1
+                    programs_batch.append(item)
+                    if len(programs_batch) >= STAGING_BATCH_SIZE:
+                        staging.executemany("INSERT OR REPLACE INTO programs VALUES (?, ?, ?, ?, ?, ?, ?)", programs_batch)
+                        programs_batch = []
+
+        if channels_batch:
+            staging.executemany("INSERT INTO channels VALUES (?, ?, ?, ?, ?)", channels_batch)
+        if programs_batch:
+            staging.executemany("INSERT OR REPLACE INTO programs VALUES (?, ?, ?, ?, ?, ?, ?)", programs_batch)
+        staging.commit()
+    finally:
+        staging.close()
+
+    logger.info(f"[XMLTV] 解析完成: {channel_count} 个频道, {program_count} 个节目")
+    return {**payload, 'channel_count': channel_count, 'program_count': program_count}
+
+
+# 导出时写入文件使用的缓冲区大小
+EXPORT_BUFFER_SIZE = 256 * 1024
+# 导出文件的生成器信息
+GENERATOR_INFO_NAME = "M3U Filter EPG Generator"
+GENERATOR_INFO_URL = "https://github.com/lunnlew/m3u-filter"
+
+
+def _escape_attr(value: str) -> str:
+    return escape(value, {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+
+class XMLTVWriter:
+    """逐元素写出XMLTV文档，不在内存中构建元素树
+
+    可同时写入多个文本流（例如原始文件和gzip文件），内容完全相同。
+    """
+
+    def __init__(self, streams: List[TextIO]):
+        self._streams = streams
+        self._write(
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            f'<tv generator-info-name="{_escape_attr(GENERATOR_INFO_NAME)}" '
+            f'generator-info-url="{_escape_attr(GENERATOR_INFO_URL)}">\n'
+        )
+
+    def _write(self, text: str):
+        for stream in self._streams:
+            stream.write(text)
+
+    def write_channel(self, channel_id: str, display_name: str, language: Optional[str],
+                      logo_url: Optional[str] = None, category: Optional[str] = None):
+        lang = _escape_attr(language or "en")
+        parts = [
+            f'<channel id="{_escape_attr(channel_id)}">',
+            f'<display-name lang="{lang}">{escape(display_name or "")}</display-name>'
+        ]
+        if logo_url:
+            parts.append(f'<icon src="{_escape_attr(logo_url)}" />')
+        if category:
+            parts.append(f'<category lang="{lang}">{escape(category)}</category>')
+        parts.append('</channel>\n')
+        self._write(''.join(parts))
+
+    def write_programme(self, channel_id: str, start: str, stop: str, title: str,
+                        description: Optional[str] = None):
+        parts = [
+            f'<programme start="{_escape_attr(start)}" stop="{_escape_attr(stop)}" channel="{_escape_attr(channel_id)}">',
+            f'<title lang="en">{escape(title or "")}</title>'
+        ]
+        if description:
+            parts.append(f'<desc lang="en">{escape(description)}</desc>')
+        parts.append('</programme>\n')
+        self._write(''.join(parts))
+
+    def close(self):
+        self._write('</tv>\n')
+
+
+def format_xmltv_time(value: datetime) -> str:
+    """将时间格式化为带时区的XMLTV时间串，未指定时区时按本地时间处理"""
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.strftime('%Y%m%d%H%M%S %z')
+
+
+def parse_xmltv_time(value: str) -> Optional[datetime]:
+    """解析XMLTV时间串，未带时区时按本地时间处理，格式无效时返回None"""
+    value = (value or '').strip()
+    try:
+        if len(value) > 14:
+            return datetime.strptime(f"{value[:14]} {value[14:].strip()}", '%Y%m%d%H%M%S %z')
+        return datetime.strptime(value, '%Y%m%d%H%M%S').astimezone()
+    except ValueError:
+        return None
+
+
+def _start_time_bound(value: datetime, offset: timedelta) -> str:
+    """开始时间索引扫描的边界：换算到UTC后按时区偏移放宽，只取时间串的日期时间部分
+
+    节目时间按各EPG源的时区保存，时间串直接比较会相差时区偏移，
+    按可能的偏移范围放宽后再逐条按实际时间精确过滤。
+    """
+    return format_xmltv_time(value.astimezone(timezone.utc) + offset)[:14]
+
+
+def _resolve_channel_names(conn, channel_keys: Iterable[Tuple[str, int]]) -> Set[str]:
+    """将 (channel_id, source_id) 转换为EPG频道名称，导出按名称合并同名频道"""
+    channel_keys = set(channel_keys)
+    return {
+        display_name
+        for channel_id, source_id, display_name in conn.execute(
+            "SELECT channel_id, source_id, display_name FROM epg_channels"
+        )
+        if (channel_id, source_id) in channel_keys
+    }
+
+
+def _write_epg_document(conn, writer: XMLTVWriter, logo_base_url: str, start_from: Optional[datetime] = None,
+                        start_before: Optional[datetime] = None, channel_names: Optional[Set[str]] = None) -> Tuple[int, int]:
+    """从数据库逐行读取频道和节目写入XMLTV文档
+
+    同名频道只输出第一个，其节目统一归到该频道下；
+    同一频道同一开始时间的同名节目（多个EPG源重复的节目）只输出一次。
+    节目按开始时间顺序读取，去重集合在开始时间变化时清空，内存占用与节目总数无关。
+
+    Args:
+        start_from / start_before: 节目开始时间范围，按时区偏移放宽后
+            走 idx_epg_programs_time 索引做范围扫描，再按节目的实际时间精确过滤，耗时与时间窗口内的节目数成正比
+        channel_names: 只导出这些名称的频道及其节目，None表示全部
+    """
+    # 同名频道输出的频道ID
+    name_to_output_id = {}
+    channel_count = 0
+    cursor = conn.execute("""
+        SELECT
+            epg_channels.id,
+            epg_channels.channel_id,
+            epg_channels.display_name,
+            epg_channels.language,
+            epg_channels.category,
+            COALESCE(
+                epg_channels.local_logo_path,
+                epg_channels.logo_url,
+                default_channel_logos.logo_url
+            ) as logo_url
+        FROM epg_channels
+        LEFT JOIN default_channel_logos ON default_channel_logos.channel_name = epg_channels.display_name
+        ORDER BY epg_channels.id
+    """)
+    for row_id, channel_id, display_name, language, category, logo_url in cursor:
+        if display_name in name_to_output_id:
+            continue
+        if channel_names is not None and display_name not in channel_names:
+            continue
+        output_id = str(channel_id or row_id)
+        name_to_output_id[display_name] = output_id
+        writer.write_channel(output_id, display_name, language,
+                             logo_base_url + logo_url if logo_url else None, category)
+        channel_count += 1
+
+    program_count = 0
+    current_start = None
+    seen = set()
+    conditions = []
+    params = []
+    if start_from:
+        conditions.append("epg_programs.start_time >= ?")
+        params.append(_start_time_bound(start_from, MIN_UTC_OFFSET))
+    if start_before:
+        conditions.append("epg_programs.start_time < ?")
+        params.append(_start_time_bound(start_before, MAX_UTC_OFFSET))
+    in_range = True
+    cursor = conn.execute(f"""
+        SELECT
+            epg_channels.display_name,
+            epg_programs.title,
+            epg_programs.start_time,
+            epg_programs.end_time,
+            epg_programs.description
+        FROM epg_programs
+        JOIN epg_channels ON epg_channels.channel_id = epg_programs.channel_id
+                         AND epg_channels.source_id = epg_programs.source_id
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY epg_programs.start_time
+    """, params)
+    for display_name, title, start_time, end_time, description in cursor:
+        if start_time != current_start:
+            current_start = start_time
+            seen.clear()
+            if start_from or start_before:
+                start = parse_xmltv_time(start_time)
+                in_range = (start is not None and (start_from is None or start >= start_from)
+                            and (start_before is None or start < start_before))
+        if not in_range:
+            continue
+        output_id = name_to_output_id.get(display_name)
+        if output_id is None:
+            continue
+        key = (output_id, title)
+        if key in seen:
+            continue
+        seen.add(key)
+        writer.write_programme(output_id, start_time, end_time, title, description)
+        program_count += 1
+
+    return channel_count, program_count
+
+
+def export_xmltv(conn, output_path: Union[str, Path], logo_base_url: str = '', compress: bool = True,
+                 start_from: Optional[datetime] = None, start_before: Optional[datetime] = None,
+                 channel_keys: Optional[Iterable[Tuple[str, int]]] = None) -> Dict:
+    """将数据库中的EPG流式导出为XMLTV文件
+
+    通过OutputPublisher原子发布，读取方不会看到写了一半的文件，内容未变化时不改写文件。
+    compress为True时同时写出内容相同的 .gz 文件，并将其修改时间设为与XML文件一致，
+    可直接作为预压缩文件提供。
+
+    Args:
+        conn: 数据库连接
+        output_path: 输出的XML文件路径
+        logo_base_url: 台标路径的前缀
+        compress: 是否同时输出gzip文件
+        start_from / start_before: 只导出开始时间在此范围内的节目
+        channel_keys: 只导出这些 (channel_id, source_id) 对应的频道，None表示全部
+
+    Returns:
+        dict: 频道数、节目数、XML内容是否变化和输出的文件路径
+    """
+    # 解析进程也会导入本模块，发布器只在导出时导入，避免在解析进程中加载utils包
+    from utils.output_publisher import OutputPublisher
+
+    output_path = Path(output_path)
+    publishers = [OutputPublisher(output_path)]
+    if compress:
+        # gz文件作为预压缩文件，不保留上一版本
+        publishers.append(OutputPublisher(output_path.with_name(output_path.name + '.gz'), keep_previous=False))
+
+    try:
+        with ExitStack() as stack:
+            streams = []
+            for publisher in publishers:
+                raw = stack.enter_context(os.fdopen(publisher.open_temp(), 'wb', buffering=EXPORT_BUFFER_SIZE))
+                if publisher.path.suffix == '.gz':
+                    raw = stack.enter_context(gzip.GzipFile(filename=output_path.name, mode='wb', fileobj=raw, mtime=0))
+                streams.append(stack.enter_context(io.TextIOWrapper(raw, encoding='utf-8', newline='\n')))
+
+            # 频道和节目在同一读事务中读取，保证节目引用的频道都已输出
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            channel_names = _resolve_channel_names(conn, channel_keys) if channel_keys is not None else None
+            writer = XMLTVWriter(streams)
+            channel_count, program_count = _write_epg_document(
+                conn, writer, logo_base_url,
+                start_from.astimezone() if start_from else None,
+                start_before.astimezone() if start_before else None,
+                channel_names
+            )
+            writer.close()
+
+        # 先发布XML文件，再发布修改时间与之一致的gz文件；内容未变化的文件保持不变
+        changed = publishers[0].commit().changed
+        if compress:
+            publishers[1].commit(mtime_ns=output_path.stat().st_mtime_ns)
+    except BaseException:
+        for publisher in publishers:
+            publisher.abort()
+        raise
+
+    logger.info(f"[XMLTV] 导出完成: {channel_count} 个频道, {program_count} 个节目 -> {output_path}")
+    return {
+        'channel_count': channel_count,
+        'program_count': program_count,
+        'changed': changed,
+        'paths': [str(publisher.path) for publisher in publishers]
+    }
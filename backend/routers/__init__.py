@@ -16,6 +16,7 @@ from .health import router as health_router
 from .sort_templates import router as sort_templates_router
 from .blocked_domains import router as blocked_domains_router
 from .group_mappings import router as group_mappings_router
+from .epg_export_profiles import router as epg_export_profiles_router
 
 api_router = APIRouter()
 
@@ -33,4 +34,5 @@ api_router.include_router(health_router, prefix="/api", tags=["health"])
 api_router.include_router(sort_templates_router, prefix="/api", tags=["sort-templates"])
 api_router.include_router(blocked_domains_router, prefix="/api", tags=["blocked-domains"])
 api_router.include_router(group_mappings_router, prefix="/api", tags=["group-mappings"])
+api_router.include_router(epg_export_profiles_router, prefix="/api", tags=["epg-export-profiles"])
 api_router.include_router(static_files_router, tags=["static-files"])  # 移到最后
\ No newline at end of file
@@ -2,7 +2,7 @@ from fastapi import APIRouter
 from datetime import datetime
 from typing import Dict, List, Tuple
 from urllib.parse import urlparse
-from database import get_db_connection
+from database import async_db, db_metrics
 from models import BaseResponse
 import logging
 import asyncio
@@ -94,26 +94,23 @@ async def should_skip_domain(url: str) -> bool:
     
     # 如果缓存中没有，则查询数据库
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            # Add total_failures to the database count
-            c.execute("""
-                SELECT failure_count FROM blocked_domains 
-                WHERE domain = ? 
-                AND datetime(last_failure_time) > datetime('now', ?)
-            """, (domain_key, f'-{FAILURE_DECAY_TIME} seconds'))
-            result = c.fetchone()
-            db_failures = result[0] if result else 0
-            
-            should_skip = (db_failures + total_failures) >= FAILURE_THRESHOLD
-            
-            # 更新缓存
-            domain_status_cache[domain_key] = {
-                'should_skip': should_skip,
-                'timestamp': now
-            }
-            
-            return should_skip
+        # Add total_failures to the database count
+        result = await async_db.fetch_one("""
+            SELECT failure_count FROM blocked_domains 
+            WHERE domain = ? 
+            AND datetime(last_failure_time) > datetime('now', ?)
+        """, (domain_key, f'-{FAILURE_DECAY_TIME} seconds'))
+        db_failures = result[0] if result else 0
+        
+        should_skip = (db_failures + total_failures) >= FAILURE_THRESHOLD
+        
+        # 更新缓存
+        domain_status_cache[domain_key] = {
+            'should_skip': should_skip,
+            'timestamp': now
+        }
+        
+        return should_skip
             
     except Exception as e:
         logger.debug(f"检查域名黑名单失败: {str(e)}")
@@ -161,26 +158,23 @@ async def record_domain_failure(url: str, error: str) -> bool:
     
     # 更新待处理队列，使用实际的失败次数
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            # 获取数据库中已存在的失败次数
-            c.execute("""
-                SELECT failure_count 
-                FROM blocked_domains 
-                WHERE domain = ? 
-                AND datetime(last_failure_time) > datetime('now', ?)
-            """, (domain_key, f'-{FAILURE_WINDOW} seconds'))
-            result = c.fetchone()
-            existing_failures = result[0] if result else 0
-            
-            # 计算总的有效失败次数
-            total_failures = existing_failures + recent_failures
-            
-            pending_updates[domain_key] = {
-                'count': total_failures,
-                'last_failure': now,
-                'errors': [e for _, e in valid_failures[-3:]]  # 保存最近3次错误信息
-            }
+        # 获取数据库中已存在的失败次数
+        result = await async_db.fetch_one("""
+            SELECT failure_count 
+            FROM blocked_domains 
+            WHERE domain = ? 
+            AND datetime(last_failure_time) > datetime('now', ?)
+        """, (domain_key, f'-{FAILURE_WINDOW} seconds'))
+        existing_failures = result[0] if result else 0
+        
+        # 计算总的有效失败次数
+        total_failures = existing_failures + recent_failures
+        
+        pending_updates[domain_key] = {
+            'count': total_failures,
+            'last_failure': now,
+            'errors': [e for _, e in valid_failures[-3:]]  # 保存最近3次错误信息
+        }
     except Exception as e:
         logger.debug(f"获取已存在的失败次数时出错: {str(e)}")
         # 如果查询失败，仅使用内存中的计数
@@ -210,6 +204,27 @@ async def batch_update_blocked_domains():
         
     max_retries = 5
     retry_delay = 2
+
+    def upsert_batch(conn, batch):
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # 使用单条SQL语句批量更新
+            c.executemany("""
+                INSERT INTO blocked_domains 
+                    (domain, failure_count, last_failure_time, updated_at, last_errors)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(domain) DO UPDATE SET
+                    failure_count = ?,
+                    last_failure_time = excluded.last_failure_time,
+                    updated_at = excluded.updated_at,
+                    last_errors = excluded.last_errors
+            """, [(d[0], d[1], d[2], d[3], d[4], d[1]) for d in batch])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.debug(f"执行批量更新时出错: {str(e)}")
+            raise
     
     try:
         # 记录待更新的数据
@@ -234,35 +249,14 @@ async def batch_update_blocked_domains():
             
             for attempt in range(max_retries):
                 try:
-                    with get_db_connection() as conn:
-                        c = conn.cursor()
-                        c.execute("BEGIN IMMEDIATE")
-                        
-                        try:
-                            # 使用单条SQL语句批量更新
-                            c.executemany("""
-                                INSERT INTO blocked_domains 
-                                    (domain, failure_count, last_failure_time, updated_at, last_errors)
-                                VALUES (?, ?, ?, ?, ?)
-                                ON CONFLICT(domain) DO UPDATE SET
-                                    failure_count = ?,
-                                    last_failure_time = excluded.last_failure_time,
-                                    updated_at = excluded.updated_at,
-                                    last_errors = excluded.last_errors
-                            """, [(d[0], d[1], d[2], d[3], d[4], d[1]) for d in batch])
-                            
-                            conn.commit()
-                            success_count += len(batch)
-                            logger.info(f"成功更新了第 {i//batch_size + 1} 批数据，共 {len(batch)} 条记录")
-                            break  # 成功后跳出重试循环
-                            
-                        except Exception as e:
-                            conn.rollback()
-                            logger.debug(f"执行批量更新时出错: {str(e)}")
-                            raise
-                            
+                    await async_db.write(upsert_batch, batch)
+                    success_count += len(batch)
+                    logger.info(f"成功更新了第 {i//batch_size + 1} 批数据，共 {len(batch)} 条记录")
+                    break  # 成功后跳出重试循环
+
                 except sqlite3.OperationalError as e:
                     if "locked" in str(e) and attempt < max_retries - 1:
+                        db_metrics.record_lock_retry()
                         logger.debug(f"数据库锁定，第{attempt+1}次重试批量更新")
                         await asyncio.sleep(retry_delay * (attempt + 1))
                     else:
@@ -286,44 +280,46 @@ async def batch_update_blocked_domains():
 @router.get("")
 async def get_blocked_domains(page: int = 1, page_size: int = 10, keyword: str = None):
     """获取被阻止的域名列表（分页）"""
+    def query(conn):
+        c = conn.cursor()
+        
+        # 构建查询条件
+        where_clause = "datetime(last_failure_time) > datetime('now', ?)"
+        params = [f'-{FAILURE_DECAY_TIME} seconds']
+        
+        if keyword:
+            where_clause += " AND domain LIKE ?"
+            params.append(f"%{keyword}%")
+        
+        # 获取总记录数
+        c.execute(f"""
+            SELECT COUNT(*) FROM blocked_domains
+            WHERE {where_clause}
+        """, params)
+        total = c.fetchone()[0]
+        
+        # 获取分页数据
+        params.extend([page_size, (page - 1) * page_size])
+        c.execute(f"""
+            SELECT domain, failure_count, last_failure_time, created_at, updated_at
+            FROM blocked_domains
+            WHERE {where_clause}
+            ORDER BY failure_count DESC
+            LIMIT ? OFFSET ?
+        """, params)
+        
+        columns = [description[0] for description in c.description]
+        domains = [dict(zip(columns, row)) for row in c.fetchall()]
+        
+        return BaseResponse.success(data={
+            'items': domains,
+            'total': total,
+            'page': page,
+            'page_size': page_size
+        })
+
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            
-            # 构建查询条件
-            where_clause = "datetime(last_failure_time) > datetime('now', ?)"
-            params = [f'-{FAILURE_DECAY_TIME} seconds']
-            
-            if keyword:
-                where_clause += " AND domain LIKE ?"
-                params.append(f"%{keyword}%")
-            
-            # 获取总记录数
-            c.execute(f"""
-                SELECT COUNT(*) FROM blocked_domains
-                WHERE {where_clause}
-            """, params)
-            total = c.fetchone()[0]
-            
-            # 获取分页数据
-            params.extend([page_size, (page - 1) * page_size])
-            c.execute(f"""
-                SELECT domain, failure_count, last_failure_time, created_at, updated_at
-                FROM blocked_domains
-                WHERE {where_clause}
-                ORDER BY failure_count DESC
-                LIMIT ? OFFSET ?
-            """, params)
-            
-            columns = [description[0] for description in c.description]
-            domains = [dict(zip(columns, row)) for row in c.fetchall()]
-            
-            return BaseResponse.success(data={
-                'items': domains,
-                'total': total,
-                'page': page,
-                'page_size': page_size
-            })
+        return await async_db.read(query)
     except Exception as e:
         logger.debug(f"获取域名黑名单失败: {str(e)}")
         return BaseResponse.error(message="获取域名黑名单失败", code=500)
@@ -332,17 +328,14 @@ async def get_blocked_domains(page: int = 1, page_size: int = 10, keyword: str =
 async def remove_blocked_domain(domain: str):
     """从黑名单中移除指定域名"""
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM blocked_domains WHERE domain = ?", (domain,))
-            if c.rowcount == 0:
-                return BaseResponse.error(message="域名不在黑名单中", code=404)
-            conn.commit()
-            
-            if domain in domain_failures:
-                del domain_failures[domain]
-                
-            return BaseResponse.success(message="域名已从黑名单中移除")
+        c = await async_db.execute("DELETE FROM blocked_domains WHERE domain = ?", (domain,))
+        if c.rowcount == 0:
+            return BaseResponse.error(message="域名不在黑名单中", code=404)
+
+        if domain in domain_failures:
+            del domain_failures[domain]
+
+        return BaseResponse.success(message="域名已从黑名单中移除")
     except Exception as e:
         logger.debug(f"移除域名黑名单失败: {str(e)}")
         return BaseResponse.error(message="移除域名黑名单失败", code=500)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, HttpUrl
-from database import get_db_connection
+from database import async_db
 import sqlite3
 from utils import is_url_in_whitelist, download_and_save_logo
 from models import BaseResponse
@@ -19,7 +19,7 @@ class ChannelLogo(ChannelLogoBase):
 @router.get("/default-channel-logos")
 async def get_channel_logos(channel_name: str = None, priority: int = None):
     """获取所有默认频道台标配置，支持按频道名称和优先级筛选"""
-    with get_db_connection() as conn:
+    def query(conn):
         cursor = conn.cursor()
         query = "SELECT id, channel_name, logo_url, priority FROM default_channel_logos"
         params = []
@@ -49,18 +49,20 @@ async def get_channel_logos(channel_name: str = None, priority: int = None):
             ) for row in logos
         ])
 
+    return await async_db.read(query)
+
 @router.post("/default-channel-logos")
 async def create_channel_logo(logo: ChannelLogoBase):
     """添加新的频道台标配置"""
-    with get_db_connection() as conn:
+    # 检查logo URL是否在白名单中
+    logo_url = str(logo.logo_url)
+    if not is_url_in_whitelist(logo_url):
+        # 下载并保存logo（在持有写连接之前完成）
+        logo_url = await download_and_save_logo(logo_url, logo.channel_name)
+
+    def insert(conn):
         cursor = conn.cursor()
         try:
-            # 检查logo URL是否在白名单中
-            logo_url = str(logo.logo_url)
-            if not is_url_in_whitelist(logo_url):
-                # 下载并保存logo
-                logo_url = await download_and_save_logo(logo_url, logo.channel_name)
-            
             cursor.execute(
                 "INSERT INTO default_channel_logos (channel_name, logo_url, priority) VALUES (?, ?, ?)",
                 (logo.channel_name, logo_url, logo.priority)
@@ -76,18 +78,20 @@ async def create_channel_logo(logo: ChannelLogoBase):
         except sqlite3.IntegrityError:
             return BaseResponse.error(message="频道名称已存在", code=400)
 
+    return await async_db.write(insert)
+
 @router.put("/default-channel-logos/{logo_id}")
 async def update_channel_logo(logo_id: int, logo: ChannelLogoBase):
     """更新频道台标配置"""
-    with get_db_connection() as conn:
+    # 检查logo URL是否在白名单中
+    logo_url = str(logo.logo_url)
+    if not is_url_in_whitelist(logo_url):
+        # 下载并保存logo（在持有写连接之前完成）
+        logo_url = await download_and_save_logo(logo_url, logo.channel_name)
+
+    def update(conn):
         cursor = conn.cursor()
         try:
-            # 检查logo URL是否在白名单中
-            logo_url = str(logo.logo_url)
-            if not is_url_in_whitelist(logo_url):
-                # 下载并保存logo
-                logo_url = await download_and_save_logo(logo_url, logo.channel_name)
-            
             cursor.execute(
                 "UPDATE default_channel_logos SET channel_name = ?, logo_url = ?, priority = ? WHERE id = ?",
                 (logo.channel_name, logo_url, logo.priority, logo_id)
@@ -104,13 +108,17 @@ async def update_channel_logo(logo_id: int, logo: ChannelLogoBase):
         except sqlite3.IntegrityError:
             return BaseResponse.error(message="频道名称已存在", code=400)
 
+    return await async_db.write(update)
+
 @router.delete("/default-channel-logos/{logo_id}")
 async def delete_channel_logo(logo_id: int):
     """删除频道台标配置"""
-    with get_db_connection() as conn:
+    def delete(conn):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM default_channel_logos WHERE id = ?", (logo_id,))
         if cursor.rowcount == 0:
             return BaseResponse.error(message="未找到指定的台标配置", code=404)
         conn.commit()
-        return BaseResponse.success(message="台标配置已删除")
\ No newline at end of file
+        return BaseResponse.success(message="台标配置已删除")
+
+    return await async_db.write(delete)
\ No newline at end of file
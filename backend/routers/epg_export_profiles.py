@@ -0,0 +1,92 @@
+import asyncio
+from fastapi import APIRouter
+
+from database import get_write_connection, get_read_connection, async_db
+from models import BaseResponse, EPGExportProfile
+from modules.epg_export import PROFILE_COLUMNS, row_to_profile, profile_filename, find_conflicting_profile
+from scheduler.epg_export import export_epg_profile, export_enabled_profiles
+
+import logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get("/epg-export-profiles")
+def get_epg_export_profiles():
+    """获取所有EPG导出配置"""
+    with get_read_connection() as conn:
+        cursor = conn.execute(f"SELECT {PROFILE_COLUMNS} FROM epg_export_profiles ORDER BY id")
+        profiles = [row_to_profile(cursor, row) for row in cursor.fetchall()]
+        for profile in profiles:
+            profile['url_path'] = f"/m3u/{profile_filename(profile['name'])}"
+        return BaseResponse.success(data=profiles)
+
+@router.post("/epg-export-profiles")
+async def create_epg_export_profile(profile: EPGExportProfile):
+    """创建EPG导出配置，启用时立即在后台导出"""
+    def create(conn):
+        if conn.execute("SELECT id FROM epg_export_profiles WHERE name = ?", (profile.name,)).fetchone():
+            return None, "导出配置名称已存在"
+        conflict = find_conflicting_profile(conn, profile.name)
+        if conflict is not None:
+            return None, f"导出文件名与配置 {conflict} 相同，请修改名称"
+        cursor = conn.execute(
+            "INSERT INTO epg_export_profiles (name, rule_set_id, past_hours, future_hours, compress, enabled) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (profile.name, profile.rule_set_id, profile.past_hours, profile.future_hours,
+             profile.compress, profile.enabled)
+        )
+        return cursor.lastrowid, None
+
+    profile_id, error = await async_db.write(create)
+    if error:
+        return BaseResponse.error(message=error, code=400)
+    if profile.enabled:
+        asyncio.create_task(export_enabled_profiles('配置创建', [profile_id]))
+    return BaseResponse.success(data={"id": profile_id})
+
+@router.put("/epg-export-profiles/{profile_id}")
+async def update_epg_export_profile(profile_id: int, profile: EPGExportProfile):
+    """更新EPG导出配置，启用时立即在后台重新导出
+
+    名称变化时导出文件随之变化，在重新导出前清除导出时间，播放列表暂时指向epg.xml。
+    """
+    def update(conn):
+        conflict = find_conflicting_profile(conn, profile.name, exclude_id=profile_id)
+        if conflict is not None:
+            return f"导出文件名与配置 {conflict} 相同，请修改名称", 400
+        cursor = conn.execute(
+            "UPDATE epg_export_profiles SET name = ?, rule_set_id = ?, past_hours = ?, future_hours = ?, "
+            "compress = ?, enabled = ?, last_export = CASE WHEN name = ? THEN last_export END WHERE id = ?",
+            (profile.name, profile.rule_set_id, profile.past_hours, profile.future_hours,
+             profile.compress, profile.enabled, profile.name, profile_id)
+        )
+        if cursor.rowcount == 0:
+            return "导出配置不存在", 404
+        return None, None
+
+    error, code = await async_db.write(update)
+    if error:
+        return BaseResponse.error(message=error, code=code)
+    if profile.enabled:
+        asyncio.create_task(export_enabled_profiles('配置更新', [profile_id]))
+    return BaseResponse.success()
+
+@router.delete("/epg-export-profiles/{profile_id}")
+def delete_epg_export_profile(profile_id: int):
+    """删除EPG导出配置"""
+    with get_write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM epg_export_profiles WHERE id = ?", (profile_id,))
+        if cursor.rowcount == 0:
+            return BaseResponse.error(message="导出配置不存在", code=404)
+        conn.commit()
+        return BaseResponse.success()
+
+@router.post("/epg-export-profiles/{profile_id}/export")
+async def export_epg_profile_now(profile_id: int):
+    """按导出配置导出EPG文件"""
+    result = await export_epg_profile(profile_id)
+    if result is None:
+        return BaseResponse.error(message="导出配置不存在", code=404)
+    return BaseResponse.success(result)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from typing import List, Optional
-from database import get_db_connection
+from database import async_db
 from models import BaseResponse
 import logging
 logger = logging.getLogger(__name__)
@@ -15,7 +15,7 @@ async def get_epg_programs(
     page: int = 1,
     page_size: int = 10
 ):
-    with get_db_connection() as conn:
+    def query(conn):
         c = conn.cursor()
         
         # 计算分页偏移量
@@ -61,4 +61,6 @@ async def get_epg_programs(
             "page": page,
             "page_size": page_size,
             "data": programs
-        })
\ No newline at end of file
+        })
+
+    return await async_db.read(query)
\ No newline at end of file
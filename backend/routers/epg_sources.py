@@ -4,14 +4,14 @@ from models import EPGSource
 from models import BaseResponse
 from sync import sync_epg_source, sync_all_active_sources
 from scheduler import update_source_schedule, get_source_next_run
-from database import get_db_connection
+from database import async_db
 import logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.get("/epg-sources")
 async def get_epg_sources(name: str = None, url: str = None, active: bool = None):
-    with get_db_connection() as conn:
+    def query(conn):
         c = conn.cursor()
         query = "SELECT * FROM epg_sources WHERE 1=1"
         params = []
@@ -33,55 +33,50 @@ async def get_epg_sources(name: str = None, url: str = None, active: bool = None
         sources = [dict(zip(columns, row)) for row in c.fetchall()]
         return BaseResponse.success(data=sources)
 
+    return await async_db.read(query)
+
 @router.post("/epg-sources")
 async def create_epg_source(source: EPGSource):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            c.execute(
-                "INSERT INTO epg_sources (name, url, active, sync_interval, default_language) VALUES (?, ?, ?, ?, ?)",
-                (source.name, source.url, source.active, source.sync_interval, source.default_language)
-            )
-            source_id = c.lastrowid
-            conn.commit()
-            source.id = source_id
-            
-            # 添加同步计划
-            assert source_id is not None, "Failed to get source_id after insert"
-            update_source_schedule(source_id)
-            return BaseResponse.success(data=source)
-        except sqlite3.IntegrityError:
-            return BaseResponse.error(message="URL已存在", code=400)
+    try:
+        c = await async_db.execute(
+            "INSERT INTO epg_sources (name, url, active, sync_interval, default_language) VALUES (?, ?, ?, ?, ?)",
+            (source.name, source.url, source.active, source.sync_interval, source.default_language)
+        )
+    except sqlite3.IntegrityError:
+        return BaseResponse.error(message="URL已存在", code=400)
+    source_id = c.lastrowid
+    source.id = source_id
+
+    # 添加同步计划
+    assert source_id is not None, "Failed to get source_id after insert"
+    update_source_schedule(source_id)
+    return BaseResponse.success(data=source)
 
 @router.put("/epg-sources/{source_id}")
 async def update_epg_source(source_id: int, source: EPGSource):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            c.execute(
-                "UPDATE epg_sources SET name = ?, url = ?, active = ?, sync_interval = ?, default_language = ? WHERE id = ?",
-                (source.name, source.url, source.active, source.sync_interval, source.default_language, source_id)
-            )
-            if c.rowcount == 0:
-                return BaseResponse.error(message="EPG源不存在", code=404)
-            conn.commit()
-            source.id = source_id
-            
-            # 更新同步计划
-            update_source_schedule(source_id)
-            return BaseResponse.success(data=source)
-        except sqlite3.IntegrityError:
-            return BaseResponse.error(message="URL已存在", code=400)
+    try:
+        # 源配置变化后清除拉取状态，下次同步时重新解析
+        c = await async_db.execute(
+            "UPDATE epg_sources SET name = ?, url = ?, active = ?, sync_interval = ?, default_language = ?, "
+            "etag = NULL, last_modified = NULL, content_hash = NULL, content_size = NULL WHERE id = ?",
+            (source.name, source.url, source.active, source.sync_interval, source.default_language, source_id)
+        )
+    except sqlite3.IntegrityError:
+        return BaseResponse.error(message="URL已存在", code=400)
+    if c.rowcount == 0:
+        return BaseResponse.error(message="EPG源不存在", code=404)
+    source.id = source_id
+
+    # 更新同步计划
+    update_source_schedule(source_id)
+    return BaseResponse.success(data=source)
 
 @router.delete("/epg-sources/{source_id}")
 async def delete_epg_source(source_id: int):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM epg_sources WHERE id = ?", (source_id,))
-        if c.rowcount == 0:
-            return BaseResponse.error(message="EPG源不存在", code=404)
-        conn.commit()
-        return BaseResponse.success(message="EPG源已删除")
+    c = await async_db.execute("DELETE FROM epg_sources WHERE id = ?", (source_id,))
+    if c.rowcount == 0:
+        return BaseResponse.error(message="EPG源不存在", code=404)
+    return BaseResponse.success(message="EPG源已删除")
 
 @router.post("/epg-sources/{source_id}/sync")
 async def sync_single_epg_source(source_id: int):
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
 from pathlib import Path
 from typing import List, Optional, Tuple
-from database import get_db_connection
+from database import get_write_connection, async_db, get_read_connection
 from models import FilterRuleSet, FilterRuleSetMapping, RuleTree
 import os
-from m3u_generator import M3UGenerator
+from m3u_generator import M3UGenerator, OUTPUT_FORMATS, build_filename
 from models import BaseResponse
 from datetime import datetime
 from config import RESOURCE_ROOT
+from modules.channel_cache import channel_cache
+from modules.epg_export import get_rule_set_profile, profile_url
+from utils.compression import negotiate_encoding, compress_chunks, precompress_files
 import json
+import hashlib
 import logging
 import asyncio
 
@@ -40,7 +45,7 @@ def get_filter_rule_sets(
     logic_type: Optional[str] = None
 ):
     """获取所有规则集合，支持筛选"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # 构建查询条件
@@ -124,7 +129,7 @@ def _get_rules_for_set(cursor, set_id: int) -> List[dict]:
 @router.post("/filter-rule-sets")
 def create_filter_rule_set(rule_set: FilterRuleSet):
     """创建新的规则集合"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         # 检查名称是否重复
         cursor.execute("SELECT id FROM filter_rule_sets WHERE name = ?", (rule_set.name,))
@@ -151,7 +156,7 @@ def create_filter_rule_set(rule_set: FilterRuleSet):
 @router.put("/filter-rule-sets/{set_id}")
 def update_filter_rule_set(set_id: int, rule_set: FilterRuleSet):
     """更新规则集合"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         # 检查规则集合是否存在
         cursor.execute("SELECT id FROM filter_rule_sets WHERE id = ?", (set_id,))
@@ -195,7 +200,7 @@ def update_filter_rule_set(set_id: int, rule_set: FilterRuleSet):
 @router.patch("/filter-rule-sets/{set_id}/toggle")
 def toggle_filter_rule_set(set_id: int):
     """切换规则集合的启用状态"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT enabled FROM filter_rule_sets WHERE id = ?", (set_id,))
         result = cursor.fetchone()
@@ -213,12 +218,16 @@ def toggle_filter_rule_set(set_id: int):
 @router.delete("/filter-rule-sets/{set_id}")
 def delete_filter_rule_set(set_id: int):
     """删除规则集合"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         # 首先删除规则集合与规则的关联关系
         cursor.execute("DELETE FROM filter_rule_set_mappings WHERE rule_set_id=?", (set_id,))
         # 删除子规则集合关系
         cursor.execute("DELETE FROM filter_rule_set_children WHERE parent_set_id=? OR child_set_id=?", (set_id, set_id))
+        # 删除规则集合的EPG导出配置
+        cursor.execute("DELETE FROM epg_export_profiles WHERE rule_set_id=?", (set_id,))
+        # 删除规则集合的构建记录
+        cursor.execute("DELETE FROM rule_set_builds WHERE rule_set_id=?", (set_id,))
         # 然后删除规则集合
         cursor.execute("DELETE FROM filter_rule_sets WHERE id=?", (set_id,))
         if cursor.rowcount == 0:
@@ -229,7 +238,7 @@ def delete_filter_rule_set(set_id: int):
 @router.post("/filter-rule-sets/{parent_set_id}/rule-sets/{child_set_id}")
 def add_child_set(parent_set_id: int, child_set_id: int):
     """向规则集合中添加子规则集合"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         # 检查父子集合是否存在
@@ -273,7 +282,7 @@ def add_child_set(parent_set_id: int, child_set_id: int):
 @router.post("/filter-rule-sets/{set_id}/rules/{rule_id}")
 def add_rule_to_set(set_id: int, rule_id: int):
     """向规则集合中添加规则"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         # 检查规则集合和规则是否存在
         cursor.execute("SELECT id FROM filter_rule_sets WHERE id=?", (set_id,))
@@ -303,7 +312,7 @@ def add_rule_to_set(set_id: int, rule_id: int):
 @router.delete("/filter-rule-sets/{set_id}/rules/{rule_id}")
 def remove_rule_from_set(set_id: int, rule_id: int):
     """从规则集合中移除规则"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "DELETE FROM filter_rule_set_mappings WHERE rule_set_id=? AND rule_id=?",
@@ -317,7 +326,7 @@ def remove_rule_from_set(set_id: int, rule_id: int):
 @router.delete("/filter-rule-sets/{parent_set_id}/rule-sets/{child_set_id}")
 def remove_child_set(parent_set_id: int, child_set_id: int):
     """从规则集合中移除子规则集合"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -331,6 +340,18 @@ def remove_child_set(parent_set_id: int, child_set_id: int):
         conn.commit()
         return BaseResponse.success()
 
+# 频道字段与 _get_filtered_channels 查询中列表达式的对应关系，用于规则下推
+# 新增读取的 stream_tracks 列时需同步更新 channels 数据版本的更新触发器（迁移010）
+CHANNEL_FIELD_COLUMNS = {
+    'display_name': 'stream_tracks.name',
+    'group_title': 'stream_tracks.group_title',
+    'source_name': 'resolved_channels.source_name',
+    'stream_url': 'stream_tracks.url',
+    'resolution': 'stream_tracks.resolution',
+    'bitrate': 'stream_tracks.bitrate',
+    'test_status': 'stream_tracks.test_status',
+}
+
 def _get_filtered_channels(set_id: int, conn) -> Tuple[List[dict], List[dict[str, str]], Dict[str, List[str]]]:
     ""
     """
@@ -346,9 +367,15 @@ def _get_filtered_channels(set_id: int, conn) -> Tuple[List[dict], List[dict[str
     
     if not rule_set[2]:  # enabled
         raise HTTPException(status_code=400, detail="Rule set is disabled")
-    
-    # 获取所有频道
-    cursor.execute("""
+
+    # 获取规则树，可用SQL表达的规则下推到查询条件中，其余规则在Python中执行
+    rule_tree = RuleTree()
+    rule_tree.build_from_rule_set(set_id, conn)
+    where, params, residual = rule_tree.compile().push_down(CHANNEL_FIELD_COLUMNS)
+    logger.debug(f"规则集合 {set_id} 下推条件: {where}，剩余规则: {residual.plan}")
+
+    # 获取满足下推条件的频道
+    cursor.execute(f"""
         SELECT
             stream_tracks.id,
             stream_tracks.name as display_name,
@@ -364,34 +391,22 @@ def _get_filtered_channels(set_id: int, conn) -> Tuple[List[dict], List[dict[str
             stream_tracks.resolution,
             stream_tracks.bitrate,
             stream_tracks.quality_score,
-            epg_channels.channel_id,
-            epg_channels.language,
-            epg_channels.category,
-            COALESCE(
-                epg_channels.local_logo_path,
-                epg_channels.logo_url,
-                (SELECT local_logo_path FROM default_channel_logos 
-                WHERE channel_name = stream_tracks.name 
-                ORDER BY priority DESC LIMIT 1),
-                (SELECT logo_url FROM default_channel_logos 
-                WHERE channel_name = stream_tracks.name 
-                ORDER BY priority DESC LIMIT 1)
-            ) as logo_url,
-            epg_sources.name AS source_name,
-            epg_sources.id AS source_id
+            resolved_channels.channel_id,
+            resolved_channels.language,
+            resolved_channels.category,
+            resolved_channels.logo_url,
+            resolved_channels.source_name,
+            resolved_channels.source_id
         FROM stream_tracks
-        LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
-        LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
-    """)
+        JOIN resolved_channels ON resolved_channels.track_id = stream_tracks.id
+        {f"WHERE {where}" if where else ""}
+        ORDER BY stream_tracks.id, resolved_channels.epg_channel_id
+    """, params)
     columns = [description[0] for description in cursor.description]
-    channels = [dict(zip(columns, row)) for row in cursor.fetchall()]
-
-    # 获取规则树
-    rule_tree = RuleTree()
-    rule_tree.build_from_rule_set(set_id, conn)
+    rows = cursor.fetchall()
 
-    # 使用规则树过滤频道
-    filtered_channels = rule_tree.filter_channels(channels)
+    # 剩余规则按列过滤，只为匹配的行构造字典
+    filtered_channels = residual.filter_rows(columns, rows)
     
     # 获取分组映射和模板
     cursor.execute("""
@@ -471,48 +486,220 @@ def _get_filtered_channels(set_id: int, conn) -> Tuple[List[dict], List[dict[str
     
     return rule_set, final_channels, sort_templates
 
-@router.post("/filter-rule-sets/{set_id}/generate-m3u")
-async def generate_m3u_file(
+def _get_cached_filtered_channels(set_id: int, conn) -> Tuple[List[dict], List[dict[str, str]], Dict[str, List[str]]]:
+    """
+    获取过滤后的频道列表，同一数据版本下各输出格式共享一次过滤结果
+    返回结果的副本，调用方可以自由修改
+    """
+    rule_set, channels, sort_templates = channel_cache.get_or_compute(
+        set_id, conn, lambda: _get_filtered_channels(set_id, conn)
+    )
+    return (
+        rule_set,
+        [dict(channel) for channel in channels],
+        {group: list(names) for group, names in sort_templates.items()}
+    )
+
+def _get_header_info(set_id: int, conn) -> Dict[str, str]:
+    """
+    播放列表的头部信息，规则集合有EPG导出配置时x-tvg-url指向其导出文件
+    生成时间取过滤结果的计算时间，数据未变化时输出内容保持一致，发布时可跳过未变化的文件
+    """
+    generated_at = channel_cache.get_computed_at(set_id) or datetime.now()
+    header_info = {
+        "generated_at": generated_at.isoformat(),
+        "provider": "M3U Filter"
+    }
+    profile = get_rule_set_profile(conn, set_id)
+    if profile:
+        header_info["x_tvg_url"] = profile_url(profile['name'])
+    return header_info
+
+def _generate_playlist_files(set_id: int, conn, formats: List[str], sort_by: str,
+                             group_order: List[str]) -> Dict[str, str]:
+    """
+    根据规则集合单次遍历生成多种格式的播放列表文件
+    返回格式名称到文件名的映射
+    """
+    rule_set, final_channels, sort_templates = _get_cached_filtered_channels(set_id, conn)
+
+    # 使用规则集合名称作为文件名
+    filename = _get_output_basename(rule_set[1])
+
+    header_info = _get_header_info(set_id, conn)
+
+    # 直接写入m3u文件夹，不在内存中拼接文件内容
+    generator = M3UGenerator()
+    filenames = generator.generate_files(
+        final_channels,
+        Path(RESOURCE_ROOT) / 'm3u',
+        formats,
+        [filename],
+        header_info,
+        sort_by=sort_by,
+        group_order=group_order,
+        sort_templates=sort_templates  # 使用合并后的排序模板
+    )
+    return filenames
+
+def _get_output_basename(rule_set_name: str) -> str:
+    """规则集合输出文件的基础名称"""
+    return ''.join(c for c in rule_set_name if c.isalnum() or c in ('_', '-', '.'))
+
+def _playlist_files_exist(set_id: int, conn, formats: List[str]) -> bool:
+    """规则集合的各格式输出文件是否都已存在"""
+    row = conn.execute("SELECT name FROM filter_rule_sets WHERE id = ?", (set_id,)).fetchone()
+    if not row:
+        return False
+    m3u_dir = Path(RESOURCE_ROOT) / 'm3u'
+    basename = _get_output_basename(row[0])
+    return all((m3u_dir / build_filename([basename], OUTPUT_FORMATS[fmt].extension)).exists() for fmt in formats)
+
+def _digest_rows(cursor, queries: List[Tuple[str, tuple]]) -> str:
+    """依次执行查询并计算全部结果行的摘要"""
+    digest = hashlib.sha1()
+    for sql, params in queries:
+        for row in cursor.execute(sql, params):
+            digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+# 规则集合及其全部子集合
+_RULE_SET_CLOSURE = """
+    WITH RECURSIVE rule_set_closure(id) AS (
+        SELECT ?
+        UNION
+        SELECT c.child_set_id FROM filter_rule_set_children c
+        JOIN rule_set_closure ON c.parent_set_id = rule_set_closure.id
+    )
+"""
+
+def _get_dependency_fingerprint(set_id: int, conn) -> Dict[str, str]:
+    """
+    规则集合输出所依赖数据的指纹，按依赖分项计算，用于判断是否需要重新生成：
+    rules 规则集合、子集合及其规则，group_mappings 分组映射，sort_templates 排序模板，
+    channels 匹配的频道（按输出顺序，只计算输出字段），epg_profile 播放列表指向的EPG文件
+    各分项在同一读事务中计算，对应同一数据快照
+    """
+    rule_set, channels, sort_templates = _get_cached_filtered_channels(set_id, conn)
+    cursor = conn.cursor()
+    profile = get_rule_set_profile(conn, set_id)
+    return {
+        'rules': _digest_rows(cursor, [
+            (_RULE_SET_CLOSURE + """
+                SELECT id, name, enabled, logic_type FROM filter_rule_sets
+                WHERE id IN (SELECT id FROM rule_set_closure) ORDER BY id
+            """, (set_id,)),
+            (_RULE_SET_CLOSURE + """
+                SELECT parent_set_id, child_set_id FROM filter_rule_set_children
+                WHERE parent_set_id IN (SELECT id FROM rule_set_closure) ORDER BY parent_set_id, child_set_id
+            """, (set_id,)),
+            (_RULE_SET_CLOSURE + """
+                SELECT m.rule_set_id, r.* FROM filter_rule_set_mappings m
+                JOIN filter_rules r ON r.id = m.rule_id
+                WHERE m.rule_set_id IN (SELECT id FROM rule_set_closure) ORDER BY m.rule_set_id, r.id
+            """, (set_id,)),
+        ]),
+        'group_mappings': _digest_rows(cursor, [
+            ("""
+                SELECT rule_set_id, channel_name, custom_group, display_name FROM group_mappings
+                WHERE rule_set_id = ? OR rule_set_id IS NULL ORDER BY rule_set_id, channel_name
+            """, (set_id,)),
+            ("""
+                SELECT t.id, i.channel_name, i.custom_group, i.display_name
+                FROM group_mapping_template_items i
+                INNER JOIN group_mapping_templates t ON i.template_id = t.id
+                WHERE t.rule_set_id = ? ORDER BY t.id, i.channel_name
+            """, (set_id,)),
+        ]),
+        'sort_templates': _digest_rows(cursor, [
+            ("SELECT id, name, group_orders FROM sort_templates ORDER BY id", ()),
+        ]),
+        'channels': M3UGenerator().fingerprint(channels, sort_templates=sort_templates),
+        'epg_profile': hashlib.sha1(profile_url(profile['name']).encode('utf-8')).hexdigest() if profile else '',
+    }
+
+async def _publish_playlist_files(set_id: int, formats: List[str], sort_by: str,
+                                  group_order: List[str]) -> Dict[str, str]:
+    """
+    生成播放列表文件并写入预压缩文件
+    返回格式名称到文件访问路径的映射
+    """
+    filenames = await async_db.read(
+        lambda conn: _generate_playlist_files(set_id, conn, formats, sort_by, group_order)
+    )
+    m3u_dir = Path(RESOURCE_ROOT) / 'm3u'
+    await precompress_files(m3u_dir / name for name in filenames.values())
+    return {fmt: f"/m3u/{name}" for fmt, name in filenames.items()}
+
+@router.post("/filter-rule-sets/{set_id}/generate")
+async def generate_playlist_files(
     set_id: int,
     sort_by: str = 'display_name',
     group_order: List[str] = []
 ):
-    """根据规则集合生成M3U文件"""
-    with get_db_connection() as conn:
-        rule_set, final_channels, sort_templates = _get_filtered_channels(set_id, conn)
-        
-        # 使用规则集合名称作为文件名
-        filename = f"{rule_set[1]}"
-        filename = ''.join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-        
-        # 使用M3UGenerator生成m3u文件
-        header_info = {
-            "generated_at": datetime.now().isoformat(),
-            "provider": "M3U Filter"
-        }
+    """根据规则集合同时生成M3U和TXT文件"""
+    url_paths = await _publish_playlist_files(set_id, list(OUTPUT_FORMATS), sort_by, group_order)
+    return BaseResponse.success({"url_paths": url_paths})
+
+@router.get("/filter-rule-sets/{set_id}/builds")
+async def get_rule_set_builds(set_id: int, limit: int = Query(20, ge=1, le=100)):
+    """获取规则集合最近的输出构建记录"""
+    builds = await async_db.fetch_dicts("""
+        SELECT id, rule_set_id, cause, changed, status, error, files, started_at, duration_ms
+        FROM rule_set_builds
+        WHERE rule_set_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (set_id, limit))
+    for build in builds:
+        build['changed'] = json.loads(build['changed']) if build['changed'] else []
+        build['files'] = json.loads(build['files']) if build['files'] else {}
+    return BaseResponse.success(data=builds)
+
+@router.get("/filter-rule-sets/{set_id}/playlist.{fmt}")
+async def stream_playlist(
+    set_id: int,
+    fmt: str,
+    sort_by: str = 'display_name',
+    group_order: List[str] = Query([]),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """按需流式输出规则集合的播放列表，不落盘，支持gzip/brotli压缩"""
+    if fmt not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=404, detail="不支持的播放列表格式")
+
+    # 过滤结果取自共享缓存，读完即释放数据库连接，之后的输出不再占用连接
+    def load(conn):
+        return _get_cached_filtered_channels(set_id, conn), _get_header_info(set_id, conn)
+
+    (rule_set, final_channels, sort_templates), header_info = await async_db.read(load)
 
+    def iter_content():
         generator = M3UGenerator()
-        m3u_content, filename = generator.generate_m3u(
-            final_channels,
-            [filename], 
-            header_info,
-            sort_by=sort_by,
-            group_order=group_order,
-            sort_templates=sort_templates  # 使用合并后的排序模板
-        )
-        
-        # 保存到m3u文件夹
-        m3u_dir = Path(RESOURCE_ROOT) / 'm3u'
-        # 确保静态文件目录存在
-        if not m3u_dir.exists():
-            m3u_dir.mkdir(parents=True)
+        for chunk in generator.iter_chunks(final_channels, fmt, header_info, sort_by, group_order, sort_templates):
+            yield chunk.encode('utf-8')
 
-        file_path = m3u_dir / filename
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(m3u_content)
-        
-        return BaseResponse.success({"url_path": f"/m3u/{filename}"})
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    logger.debug(f"流式输出规则集合 {rule_set[1]} 的 {fmt} 播放列表，压缩编码: {encoding or 'identity'}")
+    return StreamingResponse(
+        compress_chunks(iter_content(), encoding),
+        media_type='text/plain; charset=utf-8',  # 与静态资源一致，浏览器直接显示
+        headers=headers
+    )
+
+@router.post("/filter-rule-sets/{set_id}/generate-m3u")
+async def generate_m3u_file(
+    set_id: int,
+    sort_by: str = 'display_name',
+    group_order: List[str] = []
+):
+    """根据规则集合生成M3U文件"""
+    url_paths = await _publish_playlist_files(set_id, ['m3u'], sort_by, group_order)
+    return BaseResponse.success({"url_path": url_paths['m3u']})
 
 # 添加辅助函数用于计算分辨率评分
 def _get_resolution_score(resolution: str) -> int:
@@ -563,28 +750,8 @@ async def generate_txt_file(
     group_order: List[str] = []
 ):
     """根据规则集合生成TXT风格文件"""
-    with get_db_connection() as conn:
-        rule_set, final_channels, sort_templates = _get_filtered_channels(set_id, conn)
-        
-        # 使用规则集合名称作为文件名
-        filename = f"{rule_set[1]}"
-        filename = ''.join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-
-        # 使用M3UGenerator生成TXT文件
-        generator = M3UGenerator()
-        txt_content, filename = generator.generate_txt(final_channels, [filename], sort_by, group_order, sort_templates)
-        
-        # 保存到m3u文件夹
-        m3u_dir = Path(RESOURCE_ROOT) / 'm3u'
-        if not m3u_dir.exists():
-            m3u_dir.mkdir(parents=True)
-
-        file_path = m3u_dir / filename
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(txt_content)
-        
-        return BaseResponse.success({"url_path": f"/m3u/{filename}"})
+    url_paths = await _publish_playlist_files(set_id, ['txt'], sort_by, group_order)
+    return BaseResponse.success({"url_path": url_paths['txt']})
 
 @router.post("/filter-rule-sets/{set_id}/test-rules")
 async def test_rules_in_set(
@@ -594,74 +761,78 @@ async def test_rules_in_set(
     min_failure_count: Optional[int] = None,
     max_failure_count: Optional[int] = 5,
 ):
+    def select_channels(conn):
+        cursor = conn.cursor()
+
+        # 首先验证规则集合是否存在且启用
+        cursor.execute(
+            "SELECT enabled FROM filter_rule_sets WHERE id = ?",
+            (set_id,)
+        )
+        result = cursor.fetchone()
+        if not result:
+            return BaseResponse.error(message="规则集合不存在", code=404), None
+        if not result[0]:
+            return BaseResponse.error(message="规则集合未启用", code=400), None
+
+        # 获取所有频道，跳过1小时内测试过的
+        cursor.execute("""
+            SELECT id, name, url, group_title, test_status, 
+                   last_test_time, probe_failure_count
+            FROM stream_tracks
+            WHERE last_test_time IS NULL 
+               OR datetime(last_test_time) <= datetime('now', '-1 hour')
+        """)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+
+        # 使用规则树过滤频道，但排除测试相关规则
+        rule_tree = RuleTree()
+        rule_tree.build_from_rule_set_without_test(set_id, conn)  # 使用新方法
+        filtered_channels = rule_tree.filter_rows(columns, rows)
+
+        # 应用测试相关的过滤条件
+        test_channels = []
+        for channel in filtered_channels:
+            if (test_status is None or channel.get('test_status') == test_status) and \
+               (last_test_before is None or 
+                channel.get('last_test_time') is None or 
+                channel.get('last_test_time') < last_test_before) and \
+               (min_failure_count is None or 
+                (channel.get('probe_failure_count') or 0) >= min_failure_count) and \
+               (max_failure_count is None or 
+                (channel.get('probe_failure_count') or 0) < max_failure_count):
+                test_channels.append(channel)
+        return None, test_channels
+
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 首先验证规则集合是否存在且启用
-            cursor.execute(
-                "SELECT enabled FROM filter_rule_sets WHERE id = ?",
-                (set_id,)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return BaseResponse.error(message="规则集合不存在", code=404)
-            if not result[0]:
-                return BaseResponse.error(message="规则集合未启用", code=400)
+        error, test_channels = await async_db.read(select_channels)
+        if error:
+            return error
+
+        if not test_channels:
+            return BaseResponse.error(message="没有找到符合条件的频道", code=404)
+
+        # 创建测试任务
+        cursor = await async_db.execute("""
+            INSERT INTO stream_tasks (
+                task_type, status, total_items
+            ) VALUES (?, ?, ?)
+        """, ('rule_test', 'pending', len(test_channels)))
+        task_id = cursor.lastrowid
+
+        # 启动后台处理任务
+        from .stream_tracks import process_batch_tasks
+        asyncio.create_task(process_batch_tasks(task_id, [c['id'] for c in test_channels]))
+
+        return BaseResponse.success(
+            data={
+                "task_id": task_id,
+                "total_tracks": len(test_channels)
+            },
+            message=f"规则测试任务已创建，任务ID: {task_id}"
+        )
 
-            # 获取所有频道，跳过1小时内测试过的
-            cursor.execute("""
-                SELECT id, name, url, group_title, test_status, 
-                       last_test_time, probe_failure_count
-                FROM stream_tracks
-                WHERE last_test_time IS NULL 
-                   OR datetime(last_test_time) <= datetime('now', '-1 hour')
-            """)
-            columns = [column[0] for column in cursor.description]
-            channels = [dict(zip(columns, row)) for row in cursor.fetchall()]
-
-            # 使用规则树过滤频道，但排除测试相关规则
-            rule_tree = RuleTree()
-            rule_tree.build_from_rule_set_without_test(set_id, conn)  # 使用新方法
-            filtered_channels = rule_tree.filter_channels(channels)
-
-            # 应用测试相关的过滤条件
-            test_channels = []
-            for channel in filtered_channels:
-                if (test_status is None or channel.get('test_status') == test_status) and \
-                   (last_test_before is None or 
-                    channel.get('last_test_time') is None or 
-                    channel.get('last_test_time') < last_test_before) and \
-                   (min_failure_count is None or 
-                    (channel.get('probe_failure_count') or 0) >= min_failure_count) and \
-                   (max_failure_count is None or 
-                    (channel.get('probe_failure_count') or 0) < max_failure_count):
-                    test_channels.append(channel)
-
-            if not test_channels:
-                return BaseResponse.error(message="没有找到符合条件的频道", code=404)
-            
-            # 创建测试任务
-            cursor.execute("""
-                INSERT INTO stream_tasks (
-                    task_type, status, total_items
-                ) VALUES (?, ?, ?)
-            """, ('rule_test', 'pending', len(test_channels)))
-            task_id = cursor.lastrowid
-            conn.commit()
-            
-            # 启动后台处理任务
-            from .stream_tracks import process_batch_tasks
-            asyncio.create_task(process_batch_tasks(task_id, [c['id'] for c in test_channels]))
-            
-            return BaseResponse.success(
-                data={
-                    "task_id": task_id,
-                    "total_tracks": len(test_channels)
-                },
-                message=f"规则测试任务已创建，任务ID: {task_id}"
-            )
-            
     except Exception as e:
         logger.debug(f"创建规则测试任务失败: {str(e)}")
         return BaseResponse.error(message=f"创建测试任务失败: {str(e)}", code=500)
\ No newline at end of file
@@ -1,12 +1,13 @@
 from fastapi import APIRouter
 from pathlib import Path
-from database import get_db_connection
+from database import get_read_connection, get_write_connection
 from models import BaseResponse
 from m3u_generator import M3UGenerator
 from models import FilterRule
 import logging
 logger = logging.getLogger(__name__)
 from config import RESOURCE_ROOT
+from utils.compression import write_compressed_variants
 
 router = APIRouter()
 
@@ -30,7 +31,7 @@ def _row_to_filter_rule(row) -> FilterRule:
 @router.get("/filter-rules")
 def get_filter_rules(keyword: str = None, rule_type: str = None):
     """获取过滤规则，支持关键词搜索和类型筛选"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         query = "SELECT * FROM filter_rules"
         params = []
@@ -59,7 +60,7 @@ def get_filter_rules(keyword: str = None, rule_type: str = None):
 @router.post("/filter-rules")
 def create_filter_rule(rule: FilterRule):
     """创建新的过滤规则"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO filter_rules (name, type, pattern, action, priority, enabled, case_sensitive, regex_mode, min_value, max_value) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
@@ -74,7 +75,7 @@ def create_filter_rule(rule: FilterRule):
 @router.put("/filter-rules/{rule_id}")
 def update_filter_rule(rule_id: int, rule: FilterRule):
     """更新过滤规则"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE filter_rules SET name=?, type=?, pattern=?, action=?, priority=?, enabled=?, case_sensitive=?, regex_mode=?, min_value=?, max_value=? WHERE id=?",
@@ -90,7 +91,7 @@ def update_filter_rule(rule_id: int, rule: FilterRule):
 @router.delete("/filter-rules/{rule_id}")
 def delete_filter_rule(rule_id: int):
     """删除过滤规则"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM filter_rules WHERE id=?", (rule_id,))
         if cursor.rowcount == 0:
@@ -101,7 +102,7 @@ def delete_filter_rule(rule_id: int):
 @router.post("/filter-rules/apply")
 def apply_filter_rules():
     """应用过滤规则到频道列表"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
 
         # 获取所有启用的规则
@@ -114,25 +115,16 @@ def apply_filter_rules():
                 stream_tracks.name as display_name,
                 stream_tracks.url as stream_url,
                 stream_tracks.group_title,
-                epg_channels.channel_id,
-                epg_channels.language,
-                epg_channels.category,
-                COALESCE(
-                    epg_channels.local_logo_path,
-                    epg_channels.logo_url,
-                    (SELECT local_logo_path FROM default_channel_logos 
-                    WHERE channel_name = stream_tracks.name 
-                    ORDER BY priority DESC LIMIT 1),
-                    (SELECT logo_url FROM default_channel_logos 
-                    WHERE channel_name = stream_tracks.name 
-                    ORDER BY priority DESC LIMIT 1)
-                ) as logo_url,
-                epg_sources.name AS source_name,
-                epg_sources.id AS source_id
+                resolved_channels.channel_id,
+                resolved_channels.language,
+                resolved_channels.category,
+                resolved_channels.logo_url,
+                resolved_channels.source_name,
+                resolved_channels.source_id
             FROM stream_tracks
-            LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
-            LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+            JOIN resolved_channels ON resolved_channels.track_id = stream_tracks.id
             WHERE stream_tracks.test_status = 1
+            ORDER BY stream_tracks.id, resolved_channels.epg_channel_id
         """)
         columns = [description[0] for description in cursor.description]
         channels = [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -184,7 +176,7 @@ def _match_rule(rule: FilterRule, channel: dict) -> bool:
 @router.post("/filter-rules/generate-m3u")
 def generate_m3u_file():
     """生成过滤后的M3U文件"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # 获取所有启用的规则
@@ -199,25 +191,16 @@ def generate_m3u_file():
                 stream_tracks.group_title,
                 stream_tracks.catchup,
                 stream_tracks.catchup_source,
-                epg_channels.channel_id,
-                epg_channels.language,
-                epg_channels.category,
-                COALESCE(
-                    epg_channels.local_logo_path,
-                    epg_channels.logo_url,
-                    (SELECT local_logo_path FROM default_channel_logos 
-                    WHERE channel_name = stream_tracks.name 
-                    ORDER BY priority DESC LIMIT 1),
-                    (SELECT logo_url FROM default_channel_logos 
-                    WHERE channel_name = stream_tracks.name 
-                    ORDER BY priority DESC LIMIT 1)
-                ) as logo_url,
-                epg_sources.name AS source_name,
-                epg_sources.id AS source_id
+                resolved_channels.channel_id,
+                resolved_channels.language,
+                resolved_channels.category,
+                resolved_channels.logo_url,
+                resolved_channels.source_name,
+                resolved_channels.source_id
             FROM stream_tracks
-            LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
-            LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+            JOIN resolved_channels ON resolved_channels.track_id = stream_tracks.id
             WHERE stream_tracks.test_status = 1
+            ORDER BY stream_tracks.id, resolved_channels.epg_channel_id
         """)
         columns = [description[0] for description in cursor.description]
         channels = [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -230,19 +213,11 @@ def generate_m3u_file():
             elif rule.action == "exclude":
                 filtered_channels = [ch for ch in filtered_channels if not _match_rule(rule, ch)]
     
-    # 使用M3UGenerator生成M3U文件
+    # 使用M3UGenerator直接写入m3u文件夹
     generator = M3UGenerator()
-    m3u_content, filename = generator.generate_m3u(filtered_channels, rule_names=[rule.name for rule in rules])
-    
-    # 保存到m3u文件夹
-    m3u_dir = Path(RESOURCE_ROOT) / 'm3u'
-    # 确保静态文件目录存在
-    if not m3u_dir.exists():
-        m3u_dir.mkdir(parents=True)
-
-    file_path = m3u_dir / filename
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(m3u_content)
+    filenames = generator.generate_files(filtered_channels, Path(RESOURCE_ROOT) / 'm3u', ['m3u'],
+                                         rule_names=[rule.name for rule in rules])
+    filename = filenames['m3u']
+    write_compressed_variants(Path(RESOURCE_ROOT) / 'm3u' / filename)
     
     return BaseResponse.success({"url_path": f"/m3u/{filename}"})
\ No newline at end of file
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from typing import List, Optional, Union, Dict
-from database import get_db_connection
+from database import get_write_connection, get_read_connection
 from models import BaseResponse
 from pydantic import BaseModel
 import time
@@ -23,7 +23,7 @@ class GroupMappingTemplate(BaseModel):
 @router.get("/group-mappings")
 def get_group_mappings(rule_set_id: Optional[int] = None):
     """获取分组名称映射"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         if rule_set_id:
             cursor.execute(
@@ -45,7 +45,7 @@ def get_group_mappings(rule_set_id: Optional[int] = None):
 @router.post("/group-mappings/batch")
 def batch_update_group_mappings(mappings: List[GroupMapping]):
     """批量更新分组映射"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         for mapping in mappings:
             cursor.execute(
@@ -58,7 +58,7 @@ def batch_update_group_mappings(mappings: List[GroupMapping]):
 @router.delete("/group-mappings/batch")
 def batch_delete_group_mappings(mappings: List[GroupMapping]):
     """批量删除分组映射"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         for mapping in mappings:
             cursor.execute(
@@ -71,7 +71,7 @@ def batch_delete_group_mappings(mappings: List[GroupMapping]):
 @router.put("/group-mappings/{channel_name}")
 def update_group_mapping(channel_name: str, mapping: GroupMapping):
     """更新分组映射"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute(
@@ -92,7 +92,7 @@ def delete_group_mapping(channel_name: str, rule_set_id: Optional[int] = None):
     
     for attempt in range(max_retries):
         try:
-            with get_db_connection() as conn:
+            with get_write_connection() as conn:
                 # 设置超时时间为5秒
                 conn.execute("PRAGMA busy_timeout = 5000")
                 cursor = conn.cursor()
@@ -123,7 +123,7 @@ def delete_group_mapping(channel_name: str, rule_set_id: Optional[int] = None):
 @router.post("/group-mappings/batch")
 def batch_create_group_mappings(mappings: List[GroupMapping]):
     """批量创建分组映射"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         for mapping in mappings:
@@ -138,7 +138,7 @@ def batch_create_group_mappings(mappings: List[GroupMapping]):
 @router.delete("/group-mappings/batch")
 def batch_delete_group_mappings(mappings: List[GroupMapping]):
     """批量删除分组映射"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         for mapping in mappings:
             cursor.execute(
@@ -151,7 +151,7 @@ def batch_delete_group_mappings(mappings: List[GroupMapping]):
 @router.post("/group-mapping-templates")
 def create_group_mapping_template(template: GroupMappingTemplate):
     """创建分组映射模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute(
@@ -182,7 +182,7 @@ def create_group_mapping_template(template: GroupMappingTemplate):
 @router.get("/group-mapping-templates")
 def get_group_mapping_templates():
     """获取分组映射模板列表"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         query = "SELECT id, name, description FROM group_mapping_templates"
@@ -217,7 +217,7 @@ def get_group_mapping_templates():
 @router.delete("/group-mapping-templates/{template_id}")
 def delete_group_mapping_template(template_id: int):
     """删除分组映射模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute("DELETE FROM group_mapping_template_items WHERE template_id = ?", (template_id,))
@@ -232,7 +232,7 @@ def delete_group_mapping_template(template_id: int):
 @router.post("/group-mapping-templates/{template_id}/apply/{rule_set_id}")
 def apply_group_mapping_template(template_id: int, rule_set_id: int):
     """应用分组映射模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         # 获取模板信息
@@ -263,7 +263,7 @@ def apply_group_mapping_template(template_id: int, rule_set_id: int):
 @router.put("/group-mapping-templates/{template_id}")
 def update_group_mapping_template(template_id: int, template: GroupMappingTemplate):
     """更新分组映射模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         # 检查模板是否存在
@@ -308,7 +308,7 @@ class BatchApplyTemplatesRequest(BaseModel):
 @router.post("/group-mapping-templates/batch-apply/{rule_set_id}")
 def batch_apply_group_mapping_templates(rule_set_id: int, request: BatchApplyTemplatesRequest):
     """批量应用多个分组映射模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         
         # 验证所有模板是否存在
@@ -1,7 +1,32 @@
 from fastapi import APIRouter
+from database import get_db_metrics
+from modules.prober import stream_prober
+from modules.stream_tracks.utils.probe_cache import probe_cache
+from modules.stream_tracks.utils.host_dispatcher import host_dispatcher
+from scheduler.stream_testing import stream_test_scheduler
 
 router = APIRouter()
 
 @router.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@router.get("/health/db")
+def database_health():
+    """数据库连接池等待时间与锁重试统计"""
+    return {"status": "ok", "database": get_db_metrics()}
+
+@router.get("/health/prober")
+async def prober_health():
+    """流探测子进程的并发数、排队与超时统计，以及探测结果缓存的命中情况"""
+    return {"status": "ok", "prober": stream_prober.pressure(), "probe_cache": probe_cache.stats()}
+
+@router.get("/health/stream-tests")
+async def stream_test_health():
+    """持续测试调度器的队列、并发数与每小时预算使用情况"""
+    return {"status": "ok", "scheduler": stream_test_scheduler.snapshot()}
+
+@router.get("/health/hosts")
+async def host_dispatcher_health(limit: int = 50):
+    """各主机的并发限制、令牌与排队情况，按排队数降序"""
+    return {"status": "ok", "dispatcher": host_dispatcher.snapshot(limit=limit)}
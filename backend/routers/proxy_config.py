@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from models import ProxyConfig
-from database import get_db_connection
+from database import async_db
 from models import BaseResponse
 import logging
 logger = logging.getLogger(__name__)
@@ -8,20 +8,16 @@ router = APIRouter()
 
 @router.get("/proxy-config")
 async def get_proxy_config():
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM proxy_config LIMIT 1")
-        columns = [description[0] for description in c.description]
-        proxy_config_row = c.fetchone()
+    rows = await async_db.fetch_dicts("SELECT * FROM proxy_config LIMIT 1")
     
-    if not proxy_config_row:
+    if not rows:
         return BaseResponse.success(data=ProxyConfig())
     
-    return BaseResponse.success(data=ProxyConfig(**dict(zip(columns, proxy_config_row))))
+    return BaseResponse.success(data=ProxyConfig(**rows[0]))
 
 @router.put("/proxy-config")
 async def update_proxy_config(config: ProxyConfig):
-    with get_db_connection() as conn:
+    def update(conn):
         c = conn.cursor()
         
         try:
@@ -40,4 +36,6 @@ async def update_proxy_config(config: ProxyConfig):
             return BaseResponse.success(data=config)
         except Exception as e:
             conn.rollback()
-            return BaseResponse.error(message=f"更新代理配置时发生错误: {str(e)}", code=500)
\ No newline at end of file
+            return BaseResponse.error(message=f"更新代理配置时发生错误: {str(e)}", code=500)
+
+    return await async_db.write(update)
\ No newline at end of file
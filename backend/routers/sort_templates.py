@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 import json
 
-from database import get_db_connection
+from database import get_write_connection, get_read_connection
 from models.sort_templates import SortTemplate
 from models.common import BaseResponse
 
@@ -11,7 +11,7 @@ router = APIRouter(prefix="/sort-templates", tags=["sort_templates"])
 @router.get("")
 def get_sort_templates():
     """获取所有排序模板"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, name, description, group_orders FROM sort_templates")
         columns = [column[0] for column in cursor.description]
@@ -25,7 +25,7 @@ def get_sort_templates():
 @router.get("/{template_id}")
 def get_sort_template(template_id: int):
     """获取指定排序模板"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, name, description, group_orders FROM sort_templates WHERE id = ?", (template_id,))
         template = cursor.fetchone()
@@ -39,7 +39,7 @@ def get_sort_template(template_id: int):
 @router.post("")
 def create_sort_template(template: SortTemplate):
     """创建排序模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO sort_templates (name, description, group_orders) VALUES (?, ?, ?)",
@@ -52,7 +52,7 @@ def create_sort_template(template: SortTemplate):
 @router.put("/{template_id}")
 def update_sort_template(template_id: int, template: SortTemplate):
     """更新排序模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM sort_templates WHERE id = ?", (template_id,))
         if not cursor.fetchone():
@@ -68,7 +68,7 @@ def update_sort_template(template_id: int, template: SortTemplate):
 @router.delete("/{template_id}")
 def delete_sort_template(template_id: int):
     """删除排序模板"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM sort_templates WHERE id = ?", (template_id,))
         if cursor.rowcount == 0:
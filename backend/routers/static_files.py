@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, Response
 import mimetypes
 import logging
+from email.utils import formatdate, parsedate_to_datetime
 from urllib.parse import unquote
 from config import PATH_RESOURCE_ROOT, PATH_WEB_ROOT
+from utils.compression import negotiate_encoding, find_variant
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,12 +20,41 @@ DISPLAY_EXTENSIONS = {
     '.html': 'text/html',
 }
 
+
+def _make_etag(stat_result, encoding=None) -> str:
+    """根据文件大小和纳秒级修改时间生成强校验值，不同压缩编码的表示使用不同的值"""
+    etag = f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+    if encoding:
+        etag += f"-{encoding}"
+    return f'"{etag}"'
+
+
+def _is_not_modified(request: Request, etag: str, stat_result) -> bool:
+    """判断条件请求是否可返回304，If-None-Match优先于If-Modified-Since"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # If-None-Match使用弱比较
+        return any(tag.removeprefix('W/') == etag for tag in tags)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since.timestamp()
+    return False
+
+
 @router.get("/")
 async def serve_web():
     return await get_web_file("index.html")
 
 @router.get("/resource/{file_path:path}")
-async def get_resource_file(file_path: str):
+async def get_resource_file(file_path: str, request: Request):
     """获取其他静态文件"""
     decoded_path = unquote(file_path)
     file_location = PATH_RESOURCE_ROOT / decoded_path
@@ -42,6 +73,7 @@ async def get_resource_file(file_path: str):
     
     # 获取文件扩展名
     file_extension = file_location.suffix.lower()
+    stat_result = file_location.stat()
     
     # 设置响应参数
     kwargs = {}
@@ -58,8 +90,28 @@ async def get_resource_file(file_path: str):
             kwargs['media_type'] = mime_type
         # Set filename parameter to trigger download
         kwargs['filename'] = file_location.name
+
+    # 文本类文件优先使用生成时写入的预压缩文件
+    headers = {'Cache-Control': 'no-cache'}
+    send_location, send_stat, encoding = file_location, stat_result, None
+    if file_extension in DISPLAY_EXTENSIONS:
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+        variant = find_variant(file_location, stat_result, encoding) if encoding else None
+        if variant:
+            send_location, send_stat = variant, variant.stat()
+            headers['Content-Encoding'] = encoding
+        else:
+            encoding = None
+
+    headers['ETag'] = _make_etag(stat_result, encoding)
+    headers['Last-Modified'] = formatdate(stat_result.st_mtime, usegmt=True)
+
+    if _is_not_modified(request, headers['ETag'], stat_result):
+        headers.pop('Content-Encoding', None)
+        return Response(status_code=304, headers=headers)
     
-    return FileResponse(file_location, **kwargs)
+    return FileResponse(send_location, headers=headers, stat_result=send_stat, **kwargs)
 
 @router.get("/{file_path:path}")
 async def get_web_file(file_path: str):
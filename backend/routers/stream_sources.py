@@ -1,8 +1,8 @@
 from fastapi import APIRouter, HTTPException
 import sqlite3
 from models import StreamSource
-from sync import sync_stream_source
-from database import get_db_connection
+from sync import sync_stream_source, sync_all_active_stream_sources
+from database import async_db
 from scheduler import update_stream_schedule
 from models import BaseResponse
 import logging
@@ -11,7 +11,7 @@ router = APIRouter()
 
 @router.get("/stream-sources")
 async def get_stream_sources(keyword: str = None, type: str = None, active: bool = None):
-    with get_db_connection() as conn:
+    def query(conn):
         c = conn.cursor()
         query = "SELECT * FROM stream_sources"
         params = []
@@ -37,52 +37,47 @@ async def get_stream_sources(keyword: str = None, type: str = None, active: bool
         sources = [dict(zip(columns, row)) for row in c.fetchall()]
         return BaseResponse.success(data=sources)
 
+    return await async_db.read(query)
+
 @router.post("/stream-sources")
 async def create_stream_source(source: StreamSource):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            c.execute(
-                "INSERT INTO stream_sources (name, url, type, active, sync_interval, x_tvg_url, catchup, catchup_source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (source.name, source.url, source.type, source.active, source.sync_interval, source.x_tvg_url, source.catchup, source.catchup_source)
-            )
-            source_id = c.lastrowid
-            conn.commit()
-            source.id = source_id
-            # 更新同步计划
-            update_stream_schedule(source_id)
-            return BaseResponse.success(data=source)
-        except sqlite3.IntegrityError:
-            return BaseResponse.error(message="URL已存在", code=400)
+    try:
+        c = await async_db.execute(
+            "INSERT INTO stream_sources (name, url, type, active, sync_interval, x_tvg_url, catchup, catchup_source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (source.name, source.url, source.type, source.active, source.sync_interval, source.x_tvg_url, source.catchup, source.catchup_source)
+        )
+    except sqlite3.IntegrityError:
+        return BaseResponse.error(message="URL已存在", code=400)
+    source_id = c.lastrowid
+    source.id = source_id
+    # 更新同步计划
+    update_stream_schedule(source_id)
+    return BaseResponse.success(data=source)
 
 @router.put("/stream-sources/{source_id}")
 async def update_stream_source(source_id: int, source: StreamSource):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            c.execute(
-                "UPDATE stream_sources SET name = ?, url = ?, type = ?, active = ?, sync_interval = ?, x_tvg_url = ?, catchup = ?, catchup_source = ? WHERE id = ?",
-                (source.name, source.url, source.type, source.active, source.sync_interval, source.x_tvg_url, source.catchup, source.catchup_source, source_id)
-            )
-            if c.rowcount == 0:
-                return BaseResponse.error(message="直播源不存在", code=404)
-            conn.commit()
-            source.id = source_id
-            # 更新同步计划
-            update_stream_schedule(source_id)
-            return BaseResponse.success(data=source)
-        except sqlite3.IntegrityError:
-            return BaseResponse.error(message="URL已存在", code=400)
+    try:
+        # 源配置变化后清除拉取状态，下次同步时重新解析
+        c = await async_db.execute(
+            "UPDATE stream_sources SET name = ?, url = ?, type = ?, active = ?, sync_interval = ?, x_tvg_url = ?, catchup = ?, catchup_source = ?, "
+            "etag = NULL, last_modified = NULL, content_hash = NULL, content_size = NULL WHERE id = ?",
+            (source.name, source.url, source.type, source.active, source.sync_interval, source.x_tvg_url, source.catchup, source.catchup_source, source_id)
+        )
+    except sqlite3.IntegrityError:
+        return BaseResponse.error(message="URL已存在", code=400)
+    if c.rowcount == 0:
+        return BaseResponse.error(message="直播源不存在", code=404)
+    source.id = source_id
+    # 更新同步计划
+    update_stream_schedule(source_id)
+    return BaseResponse.success(data=source)
 
 @router.delete("/stream-sources/{source_id}")
 async def delete_stream_source(source_id: int):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM stream_sources WHERE id = ?", (source_id,))
-        if c.rowcount == 0:
-            return BaseResponse.error(message="直播源不存在", code=404)
-        conn.commit()
-        return BaseResponse.success(message="直播源已删除")
+    c = await async_db.execute("DELETE FROM stream_sources WHERE id = ?", (source_id,))
+    if c.rowcount == 0:
+        return BaseResponse.error(message="直播源不存在", code=404)
+    return BaseResponse.success(message="直播源已删除")
 
 @router.post("/stream-sources/{source_id}/sync")
 async def sync_single_stream_source(source_id: int):
@@ -97,15 +92,11 @@ async def sync_single_stream_source(source_id: int):
 @router.post("/stream-sources/sync-all")
 async def sync_all_stream_sources():
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute("SELECT id FROM stream_sources WHERE active = 1")
-            source_ids = [row[0] for row in c.fetchall()]
+        source_ids = [row[0] for row in await async_db.fetch_all("SELECT id FROM stream_sources WHERE active = 1")]
 
-        # 异步执行所有同步任务
+        # 通过同步流水线异步执行所有同步任务
         import asyncio
-        for source_id in source_ids:
-            asyncio.create_task(sync_stream_source(source_id))
+        asyncio.create_task(sync_all_active_stream_sources())
         
         return BaseResponse.success(message=f"已启动{len(source_ids)}个同步任务")
     except Exception as e:
@@ -4,11 +4,14 @@ import sqlite3
 from datetime import datetime
 import asyncio
 from models import StreamTrack
-from database import get_db_connection
+from database import async_db
 from typing import Dict
 from models import BaseResponse
 from utils import *
 from modules.stream_tracks.utils.util import *
+from modules.prober import stream_prober
+from modules.stream_tracks.utils.reachability import REACHABILITY_CONCURRENCY
+from modules.stream_tracks.utils.host_dispatcher import host_dispatcher, interleave_by_key
 
 import logging
 logger = logging.getLogger(__name__)
@@ -24,7 +27,7 @@ async def get_stream_tracks(
     page: int = 1,
     page_size: int = 10,
 ):
-    with get_db_connection() as conn:
+    def query(conn):
         c = conn.cursor()
         # 构建基础查询条件
         where_clause = "WHERE 1=1"
@@ -73,34 +76,29 @@ async def get_stream_tracks(
             "page_size": page_size
         })
 
+    return await async_db.read(query)
+
 @router.get("/stream-tracks/{track_id}")
 async def get_stream_track(track_id: int):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM stream_tracks WHERE id = ?", (track_id,))
-        track = c.fetchone()
-        if not track:
-            return BaseResponse.error(message="直播源不存在", code=404)
-        columns = [description[0] for description in c.description]
-        return BaseResponse.success(data=dict(zip(columns, track)))
+    tracks = await async_db.fetch_dicts("SELECT * FROM stream_tracks WHERE id = ?", (track_id,))
+    if not tracks:
+        return BaseResponse.error(message="直播源不存在", code=404)
+    return BaseResponse.success(data=tracks[0])
 
 @router.put("/stream-tracks/{track_id}")
 async def update_stream_track(track_id: int, track: StreamTrack):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        try:
-            c.execute(
-                "UPDATE stream_tracks SET name = ?, url = ?, group_title = ? WHERE id = ?",
-                (track.name, track.url, track.group_title, track_id)
-            )
-            if c.rowcount == 0:
-                return BaseResponse.error(message="直播源不存在", code=404)
-            conn.commit()
-            logger.info(f"频道已更新: {track_id}, 名称: {track.name}")
-            track.id = track_id
-            return BaseResponse.success(data=track)
-        except sqlite3.IntegrityError:
-            return BaseResponse.error(message="直播源URL已存在", code=400)
+    try:
+        c = await async_db.execute(
+            "UPDATE stream_tracks SET name = ?, url = ?, group_title = ? WHERE id = ?",
+            (track.name, track.url, track.group_title, track_id)
+        )
+        if c.rowcount == 0:
+            return BaseResponse.error(message="直播源不存在", code=404)
+        logger.info(f"频道已更新: {track_id}, 名称: {track.name}")
+        track.id = track_id
+        return BaseResponse.success(data=track)
+    except sqlite3.IntegrityError:
+        return BaseResponse.error(message="直播源URL已存在", code=400)
 
 @router.post("/stream-tracks/{track_id}/test")
 async def test_single_track(track_id: int, background_tasks: BackgroundTasks):
@@ -109,7 +107,7 @@ async def test_single_track(track_id: int, background_tasks: BackgroundTasks):
 
 @router.post("/stream-tracks/test-all")
 async def test_all_tracks():
-    with get_db_connection() as conn:
+    def create_task(conn):
         c = conn.cursor()
         c.execute("""
             SELECT id FROM stream_tracks 
@@ -127,20 +125,29 @@ async def test_all_tracks():
         """, ('batch_test', 'pending', len(track_ids)))
         task_id = c.lastrowid
         conn.commit()
-        
-        # 启动后台处理任务
-        asyncio.create_task(process_batch_tasks(task_id, track_ids))
-        
-        return BaseResponse.success(
-            data={"task_id": task_id},
-            message=f"批量测试任务已创建，任务ID: {task_id}"
-        )
+        return task_id, track_ids
+
+    task_id, track_ids = await async_db.write(create_task)
+
+    # 启动后台处理任务
+    asyncio.create_task(process_batch_tasks(task_id, track_ids))
+
+    return BaseResponse.success(
+        data={"task_id": task_id},
+        message=f"批量测试任务已创建，任务ID: {task_id}"
+    )
 
 async def process_batch_tasks(task_id: int, track_ids: List[int]):
-    """处理批量测试任务"""
-    BATCH_SIZE = 50
-    MAX_CONCURRENT = 10
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+    """处理批量测试任务
+
+    每批的频道先并发执行可达性检查，失效的频道无需等待探测即可结束；
+    进入探测的频道由主机调度器按主机限制并发和发起速度，频道先按主机轮流排列，每批分散到不同主机；
+    探测器排队饱和时（如多个批量任务同时运行）暂停提交下一批，等待排队回落，等待时间计入任务统计。
+    """
+    # 批次大于可达性检查的并发数，使第一层检查保持满载
+    BATCH_SIZE = max(50, REACHABILITY_CONCURRENCY * 2)
+    urls = dict(await async_db.fetch_all("SELECT id, url FROM stream_tracks"))
+    track_ids = interleave_by_key(track_ids, lambda track_id: get_domain_key(urls.get(track_id, '')))
     
     # 初始化任务状态
     task_state = {
@@ -148,13 +155,15 @@ async def process_batch_tasks(task_id: int, track_ids: List[int]):
         'processed': 0,
         'success': 0,
         'failed': 0,
+        'unreachable': 0,
+        'backpressure_wait': 0.0,
         'results': [],
         'errors': []
     }
 
     async def process_batch(batch_ids: List[int]):
         """处理单个批次"""
-        tasks = [test_single_track(track_id, semaphore) for track_id in batch_ids]
+        tasks = [test_single_track(track_id) for track_id in batch_ids]
         batch_results = await asyncio.gather(*tasks)
         
         for result in batch_results:
@@ -165,6 +174,8 @@ async def process_batch_tasks(task_id: int, track_ids: List[int]):
                 task_state['results'].append(result)
             else:
                 task_state['failed'] += 1
+                if result.get('reachable') is False:
+                    task_state['unreachable'] += 1
                 if result['error'] != '频道不存在':
                     task_state['results'].append(result)
                 task_state['errors'].append({
@@ -173,21 +184,27 @@ async def process_batch_tasks(task_id: int, track_ids: List[int]):
                 })
         
         # 更新任务进度
-        update_task_progress(
+        await update_task_progress(
             task_id, 
             task_state['processed'], 
             task_state['total'], 
             task_state['results']
         )
+        pressure = stream_prober.pressure()
         logger.info(
             f"任务进度: {task_state['processed']}/{task_state['total']} "
-            f"(成功: {task_state['success']}, 失败: {task_state['failed']})"
+            f"(成功: {task_state['success']}, 失败: {task_state['failed']}, 不可达: {task_state['unreachable']}, "
+            f"探测排队: {pressure['probe']['waiting']}, 测速排队: {pressure['speed_test']['waiting']}, "
+            f"主机排队: {host_dispatcher.snapshot(limit=0)['waiting']})"
         )
         await asyncio.sleep(0.5)  # 批次间延迟
 
     try:
         # 分批处理所有ID
         for i in range(0, len(track_ids), BATCH_SIZE):
+            if stream_prober.saturated:
+                logger.info(f"批量测试任务 {task_id}: 探测器排队已满，暂停提交 {stream_prober.pressure()}")
+                task_state['backpressure_wait'] += await stream_prober.wait_until_available()
             batch = track_ids[i:i + BATCH_SIZE]
             await process_batch(batch)
 
@@ -198,68 +215,78 @@ async def process_batch_tasks(task_id: int, track_ids: List[int]):
                 'total': task_state['total'],
                 'processed': task_state['processed'],
                 'success': task_state['success'],
-                'failed': task_state['failed']
+                'failed': task_state['failed'],
+                'unreachable': task_state['unreachable'],
+                'backpressure_wait_seconds': round(task_state['backpressure_wait'], 2),
+                'prober': stream_prober.pressure(),
+                'dispatcher': host_dispatcher.snapshot(limit=10)
             },
             'errors': task_state['errors']
         }
 
         if task_state['failed'] == task_state['total']:
-            mark_task_failed(task_id, "所有频道测试失败")
+            await mark_task_failed(task_id, "所有频道测试失败")
         else:
-            mark_task_completed(task_id, final_results)
+            await mark_task_completed(task_id, final_results)
 
     except Exception as e:
         logger.debug(f"批量测试任务 {task_id} 执行失败: {str(e)}")
-        mark_task_failed(task_id, str(e))
+        await mark_task_failed(task_id, str(e))
         raise
 
-async def test_single_track(track_id: int, semaphore: asyncio.Semaphore):
-    """测试单个频道(提取为模块级函数)"""
-    async with semaphore:
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT url FROM stream_tracks WHERE id = ?", (track_id,))
-                result = cursor.fetchone()
-                if not result:
-                    return {
-                        'track_id': track_id,
-                        'status': False,
-                        'error': '频道不存在'
-                    }
-                url = result[0]
-
-            status, latency, stream_info = await test_stream_url(url, track_id)
-            update_track_result(track_id, status, latency, stream_info)
-            
-            await update_stream_status(
-                track_id=track_id,
-                url=url,
-                success=status == True,
-                test_time=datetime.now()
-            )
+async def test_single_track(track_id: int):
+    """测试单个频道(提取为模块级函数)
 
-            return {
-                'track_id': track_id,
-                'status': status,
-                'latency': latency,
-                'error': None if status else '测试未通过',
-                **stream_info
-            }
-        except Exception as e:
-            error_msg = str(e)
-            logger.debug(f"处理频道 {track_id} 时出错: {error_msg}")
-            await update_stream_status(
-                track_id=track_id,
-                url=url,
-                success=False,
-                test_time=datetime.now()
-            )
+    第一层的可达性检查自带高并发限流，不占用探测并发；只有通过的频道才经主机调度器排队进入ffprobe探测和测速。
+    """
+    url = None
+    try:
+        result = await async_db.fetch_one("SELECT url FROM stream_tracks WHERE id = ?", (track_id,))
+        if not result:
             return {
                 'track_id': track_id,
                 'status': False,
-                'error': error_msg
+                'error': '频道不存在'
             }
+        url = result[0]
+
+        reachability = await prescreen_stream_url(url, track_id)
+        if reachability.reachable:
+            async with host_dispatcher.slot(get_domain_key(url)):
+                status, latency, stream_info = await test_stream_url(url, track_id, reachability)
+        else:
+            status, latency, stream_info = False, 0.0, get_default_stream_info()
+        await update_track_result(track_id, status, latency, stream_info)
+        
+        await update_stream_status(
+            track_id=track_id,
+            url=url,
+            success=status == True,
+            test_time=datetime.now()
+        )
+
+        return {
+            'track_id': track_id,
+            'status': status,
+            'latency': latency,
+            'reachable': reachability.reachable,
+            'error': None if status else (reachability.reason or '测试未通过'),
+            **stream_info
+        }
+    except Exception as e:
+        error_msg = str(e)
+        logger.debug(f"处理频道 {track_id} 时出错: {error_msg}")
+        await update_stream_status(
+            track_id=track_id,
+            url=url,
+            success=False,
+            test_time=datetime.now()
+        )
+        return {
+            'track_id': track_id,
+            'status': False,
+            'error': error_msg
+        }
 
 def sync_test_stream_url(url: str, track_id: int) -> tuple[bool, float, dict]:
     # 将异步的test_stream_url转换为同步版本
@@ -273,31 +300,23 @@ def sync_test_stream_url(url: str, track_id: int) -> tuple[bool, float, dict]:
 
 @router.get("/stream-tasks/{task_id}")
 async def get_stream_task(task_id: int):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT id, task_type, status, progress, total_items, processed_items,
-                   created_at, updated_at, result 
-            FROM stream_tasks 
-            WHERE id = ?
-        """, (task_id,))
-        task = c.fetchone()
-        if not task:
-            return BaseResponse.error(message="任务不存在", code=404)
-        
-        columns = [description[0] for description in c.description]
-        return BaseResponse.success(data=dict(zip(columns, task)))
+    tasks = await async_db.fetch_dicts("""
+        SELECT id, task_type, status, progress, total_items, processed_items,
+               created_at, updated_at, result 
+        FROM stream_tasks 
+        WHERE id = ?
+    """, (task_id,))
+    if not tasks:
+        return BaseResponse.error(message="任务不存在", code=404)
+    return BaseResponse.success(data=tasks[0])
 
 @router.delete("/stream-tracks/{track_id}")
 async def delete_stream_track(track_id: int):
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM stream_tracks WHERE id = ?", (track_id,))
-        if c.rowcount == 0:
-            return BaseResponse.error(message="直播源不存在", code=404)
-        conn.commit()
-        logger.info(f"频道已删除: {track_id}")
-        return BaseResponse.success(message="频道已删除")
+    c = await async_db.execute("DELETE FROM stream_tracks WHERE id = ?", (track_id,))
+    if c.rowcount == 0:
+        return BaseResponse.error(message="直播源不存在", code=404)
+    logger.info(f"频道已删除: {track_id}")
+    return BaseResponse.success(message="频道已删除")
 
 
 # 添加失败计数器相关的常量和缓存
@@ -312,7 +331,7 @@ domain_failures: Dict[str, List[Tuple[datetime, str]]] = {}
 @router.get("/stream-tracks/statistics")
 async def get_stream_statistics():
     """获取流媒体测试统计信息"""
-    with get_db_connection() as conn:
+    def query(conn):
         c = conn.cursor()
         try:
             # 获取总体统计
@@ -342,4 +361,6 @@ async def get_stream_statistics():
             })
         except Exception as e:
             logger.debug(f"获取统计信息失败: {str(e)}")
-            return BaseResponse.error(message="获取统计信息失败")
\ No newline at end of file
+            return BaseResponse.error(message="获取统计信息失败")
+
+    return await async_db.read(query)
\ No newline at end of file
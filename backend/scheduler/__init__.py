@@ -4,9 +4,11 @@ from datetime import datetime
 from typing import Optional
 import asyncio
 from sync import sync_epg_source, sync_stream_source
-from database import get_db_connection
-from routers.stream_tracks import test_all_tracks, cleanup_invalid_tracks, maintain_invalid_urls
-from routers.filter_rule_sets import generate_m3u_file, generate_txt_file
+from database import get_read_connection
+from routers.stream_tracks import cleanup_invalid_tracks, maintain_invalid_urls
+from scheduler.regeneration import playlist_regenerator, DATA_VERSION_POLL_SECONDS
+from scheduler.epg_export import export_enabled_profiles, EPG_PROFILE_EXPORT_INTERVAL_HOURS
+from scheduler.stream_testing import stream_test_scheduler
 
 import logging
 logger = logging.getLogger(__name__)
@@ -22,18 +24,21 @@ except RuntimeError:
 scheduler = AsyncIOScheduler(event_loop=loop)
 
 def schedule_test_stream_tracks():
-    """调度直播源测试任务"""
+    """调度直播源测试任务：启动持续测试调度器，之后每分钟检查一次，循环意外退出时重新启动"""
     scheduler.add_job(
-        test_all_tracks,
-        trigger=IntervalTrigger(hours=3),
+        stream_test_scheduler.start,
+        trigger=IntervalTrigger(minutes=1),
         id='test_stream_tracks',
-        name='Test All Stream Tracks',
-        replace_existing=True
+        name='Stream Test Scheduler',
+        replace_existing=True,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True
     )
 
 def schedule_sync_epg_sources():
     """调度EPG数据源同步任务"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT id, name, sync_interval FROM epg_sources WHERE active = 1")
         sources = c.fetchall()
@@ -51,7 +56,7 @@ def schedule_sync_epg_sources():
 
 def schedule_sync_stream_sources():
     """调度流数据源同步任务"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT id, name, sync_interval FROM stream_sources WHERE active = 1")
         sources = c.fetchall()
@@ -67,41 +72,38 @@ def schedule_sync_stream_sources():
                 replace_existing=True
             )
 
-def schedule_generate_m3u_files():
-    """调度生成M3U Txt文件任务"""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, name, sync_interval FROM filter_rule_sets WHERE enabled = 1")
-        rule_sets = c.fetchall()
-        
-        for set_id, name, interval in rule_sets:
-            hours = interval if interval is not None else 6
-            scheduler.add_job(
-                generate_txt_file,
-                trigger=IntervalTrigger(hours=hours),
-                args=[set_id],
-                id=f'generate_m3u_txt_{set_id}',
-                name=f'Generate M3U Txt for Rule Set: {name}',
-                replace_existing=True
-            )
+def schedule_regenerate_playlist_files():
+    """调度规则集合输出的增量生成：定期检查数据版本，依赖变化时去抖合并后重新生成
 
-def schedule_generate_txt_files():
-    """调度生成M3U文件任务"""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, name, sync_interval FROM filter_rule_sets WHERE enabled = 1")
-        rule_sets = c.fetchall()
-        
-        for set_id, name, interval in rule_sets:
-            hours = interval if interval is not None else 6
-            scheduler.add_job(
-                generate_m3u_file,
-                trigger=IntervalTrigger(hours=hours),
-                args=[set_id],
-                id=f'generate_m3u_{set_id}',
-                name=f'Generate M3U for Rule Set: {name}',
-                replace_existing=True
-            )
+    启动后立即执行一次检查，补齐缺失或过期的输出。
+    """
+    scheduler.add_job(
+        playlist_regenerator.poll_data_version,
+        trigger=IntervalTrigger(seconds=DATA_VERSION_POLL_SECONDS),
+        id='watch_playlist_dependencies',
+        name='Watch Rule Set Dependencies',
+        replace_existing=True,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True
+    )
+
+def schedule_export_epg_profiles():
+    """调度EPG导出配置的定期导出，导出文件的时间窗口随当前时间滑动
+
+    启动后立即执行一次，补齐缺失的导出文件。
+    """
+    scheduler.add_job(
+        export_enabled_profiles,
+        trigger=IntervalTrigger(hours=EPG_PROFILE_EXPORT_INTERVAL_HOURS),
+        args=['定期导出'],
+        id='export_epg_profiles',
+        name='Export EPG Profiles',
+        replace_existing=True,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True
+    )
 
 
 def init_scheduler():
@@ -110,8 +112,8 @@ def init_scheduler():
     schedule_test_stream_tracks()
     schedule_sync_epg_sources()
     schedule_sync_stream_sources()
-    schedule_generate_m3u_files()
-    schedule_generate_txt_files()
+    schedule_regenerate_playlist_files()
+    schedule_export_epg_profiles()
     
     # 添加清理任务
     scheduler.add_job(
@@ -154,7 +156,7 @@ def start_scheduler():
 
 def update_source_schedule(source_id: int):
     """更新指定数据源的同步计划"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT name, sync_interval, active FROM epg_sources WHERE id = ?", (source_id,))
         result = c.fetchone()
@@ -181,7 +183,7 @@ def update_source_schedule(source_id: int):
 
 def update_stream_schedule(source_id: int):
     """更新指定数据源的同步计划"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT name, sync_interval, active FROM stream_sources WHERE id = ?", (source_id,))
         result = c.fetchone()
@@ -0,0 +1,76 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import RESOURCE_ROOT
+from database import async_db
+from modules.epg_export import get_profile, export_profile, profile_filename
+from routers.filter_rule_sets import _get_cached_filtered_channels
+from utils.compression import precompress_files
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 定期导出的间隔（小时），导出文件的时间窗口随当前时间滑动
+EPG_PROFILE_EXPORT_INTERVAL_HOURS = 1
+
+
+def _export(conn, profile_id: int):
+    """在同一读事务中解析规则集合的频道并导出，配置不存在时返回 (None, None)"""
+    profile = get_profile(conn, profile_id)
+    if not profile:
+        return None, None
+    channel_keys = None
+    if profile['rule_set_id'] is not None:
+        # 只导出规则集合播放列表中的频道
+        _, channels, _ = _get_cached_filtered_channels(profile['rule_set_id'], conn)
+        channel_keys = {(channel['channel_id'], channel['source_id']) for channel in channels
+                        if channel['channel_id'] is not None}
+    return profile, export_profile(conn, profile, channel_keys)
+
+
+async def export_epg_profile(profile_id: int) -> Optional[Dict]:
+    """按导出配置导出EPG文件并记录导出时间
+
+    Returns:
+        dict: 文件访问路径、频道数和节目数，配置不存在时返回None
+    """
+    profile, result = await async_db.read(_export, profile_id)
+    if profile is None:
+        return None
+
+    file_path = Path(RESOURCE_ROOT) / 'm3u' / profile_filename(profile['name'])
+    await precompress_files([file_path], encodings=['br'] if profile['compress'] else None)
+
+    def record(conn):
+        conn.execute("UPDATE epg_export_profiles SET last_export = ? WHERE id = ?",
+                     (datetime.now().isoformat(), profile_id))
+
+    await async_db.write(record)
+    return {
+        "url_path": f"/m3u/{file_path.name}",
+        "channel_count": result['channel_count'],
+        "program_count": result['program_count']
+    }
+
+
+async def export_enabled_profiles(cause: str, profile_ids: Optional[List[int]] = None):
+    """导出启用的导出配置，单个配置失败不影响其他配置
+
+    Args:
+        cause: 导出原因，写入日志
+        profile_ids: 只导出这些配置，默认导出全部启用的配置
+    """
+    enabled = [row[0] for row in await async_db.fetch_all(
+        "SELECT id FROM epg_export_profiles WHERE enabled = 1 ORDER BY id"
+    )]
+    targets = [profile_id for profile_id in enabled if profile_ids is None or profile_id in profile_ids]
+    exported = 0
+    for profile_id in targets:
+        try:
+            if await export_epg_profile(profile_id):
+                exported += 1
+        except Exception as e:
+            logger.error(f"[EPG导出] 配置 {profile_id} 导出失败: {str(e)}", exc_info=True)
+    if targets:
+        logger.info(f"[EPG导出] 导出 {exported}/{len(targets)} 个配置，原因: {cause}")
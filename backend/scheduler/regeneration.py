@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from config import RESOURCE_ROOT
+from database import async_db
+from m3u_generator import OUTPUT_FORMATS
+from modules.channel_cache import get_data_version
+from routers.filter_rule_sets import (
+    _generate_playlist_files, _get_dependency_fingerprint, _playlist_files_exist
+)
+from utils.compression import precompress_files
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 最后一次变化后等待的秒数，期间的连续变化合并为一次重新生成
+DEBOUNCE_SECONDS = 30
+# 持续有变化时（如批量测速）最多推迟的秒数，保证输出不会一直得不到更新
+MAX_DELAY_SECONDS = 300
+# 检查数据版本的间隔秒数
+DATA_VERSION_POLL_SECONDS = 15
+# 每个规则集合保留的构建记录数
+BUILD_HISTORY_LIMIT = 100
+
+
+def _get_last_fingerprint(conn, set_id: int) -> Optional[Dict[str, str]]:
+    """最近一次成功构建的依赖指纹"""
+    row = conn.execute("""
+        SELECT fingerprint FROM rule_set_builds
+        WHERE rule_set_id = ? AND status = 'success'
+        ORDER BY id DESC LIMIT 1
+    """, (set_id,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def _record_build(conn, set_id: int, cause: str, changed: List[str], fingerprint: Optional[Dict[str, str]],
+                  status: str, error: Optional[str], files: Dict[str, str], started_at: str, duration_ms: int):
+    """写入构建记录并清理超出保留数量的旧记录"""
+    conn.execute("""
+        INSERT INTO rule_set_builds
+            (rule_set_id, cause, changed, fingerprint, status, error, files, started_at, duration_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        set_id, cause, json.dumps(changed), json.dumps(fingerprint) if fingerprint else None,
+        status, error, json.dumps(files), started_at, duration_ms
+    ))
+    conn.execute("""
+        DELETE FROM rule_set_builds
+        WHERE rule_set_id = ? AND id NOT IN (
+            SELECT id FROM rule_set_builds WHERE rule_set_id = ? ORDER BY id DESC LIMIT ?
+        )
+    """, (set_id, set_id, BUILD_HISTORY_LIMIT))
+
+
+def _check_and_generate(conn, set_id: int):
+    """比较依赖指纹，有变化或输出文件缺失时在同一读事务中重新生成
+
+    Returns:
+        tuple: (指纹, 发生变化的依赖, 生成的文件名)，无需重新生成时返回None
+    """
+    formats = list(OUTPUT_FORMATS)
+    fingerprint = _get_dependency_fingerprint(set_id, conn)
+    previous = _get_last_fingerprint(conn, set_id)
+    if previous is None:
+        changed = ['initial']
+    else:
+        changed = [name for name, value in fingerprint.items() if previous.get(name) != value]
+    if not changed:
+        if _playlist_files_exist(set_id, conn, formats):
+            return None
+        changed = ['missing_outputs']
+
+    filenames = _generate_playlist_files(set_id, conn, formats, 'display_name', [])
+    return fingerprint, changed, filenames
+
+
+async def rebuild_rule_set(set_id: int, cause: str) -> Optional[dict]:
+    """依赖发生变化时重新生成规则集合的输出并记录本次构建
+
+    Returns:
+        dict: 构建记录，依赖未变化时返回None
+    """
+    started_at = datetime.now().isoformat()
+    started = time.perf_counter()
+    fingerprint, changed, files, error = None, [], {}, None
+    try:
+        result = await async_db.read(_check_and_generate, set_id)
+        if result is None:
+            logger.debug(f"[增量生成] 规则集合 {set_id} 的依赖未变化，跳过")
+            return None
+        fingerprint, changed, files = result
+        await precompress_files(Path(RESOURCE_ROOT) / 'm3u' / name for name in files.values())
+    except Exception as e:
+        error = str(e)
+        logger.error(f"[增量生成] 规则集合 {set_id} 生成失败: {error}", exc_info=True)
+
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    status = 'failed' if error else 'success'
+    await async_db.write(
+        _record_build, set_id, cause, changed, fingerprint, status, error, files, started_at, duration_ms
+    )
+    if not error:
+        logger.info(f"[增量生成] 规则集合 {set_id} 已重新生成，原因: {cause}，变化: {changed}，耗时 {duration_ms}ms")
+    return {'rule_set_id': set_id, 'cause': cause, 'changed': changed, 'status': status,
+            'error': error, 'files': files, 'started_at': started_at, 'duration_ms': duration_ms}
+
+
+class PlaylistRegenerator:
+    """由数据变化驱动的规则集合输出重新生成
+
+    变化事件先去抖：最后一次事件后等待 DEBOUNCE_SECONDS，持续有事件时最多推迟 MAX_DELAY_SECONDS；
+    等待期间的事件合并为一次生成，原因一并记录。同一时间只有一个生成任务，
+    生成期间到达的事件在本轮结束后再合并处理。每个规则集合按依赖指纹判断是否真正需要重新生成。
+    """
+
+    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS, max_delay_seconds: float = MAX_DELAY_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._causes: List[str] = []
+        # None表示检查全部启用的规则集合
+        self._set_ids: Optional[Set[int]] = set()
+        self._first_event_at: Optional[float] = None
+        self._deadline = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._last_data_version: Optional[int] = None
+
+    def request(self, cause: str, set_ids: Optional[List[int]] = None):
+        """登记一次变化事件，需在事件循环中调用
+
+        Args:
+            cause: 变化原因，写入构建记录
+            set_ids: 受影响的规则集合，默认检查全部启用的规则集合
+        """
+        if cause not in self._causes:
+            self._causes.append(cause)
+        if set_ids is None or self._set_ids is None:
+            self._set_ids = None
+        else:
+            self._set_ids.update(set_ids)
+
+        now = time.monotonic()
+        if self._first_event_at is None:
+            self._first_event_at = now
+        self._deadline = min(now + self.debounce_seconds, self._first_event_at + self.max_delay_seconds)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._causes:
+            # 去抖：截止时间随新事件后移，到期后再开始生成
+            while (delay := self._deadline - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+
+            causes, set_ids = self._causes, self._set_ids
+            self._causes, self._set_ids, self._first_event_at = [], set(), None
+            try:
+                await self._rebuild(', '.join(causes), set_ids)
+            except Exception as e:
+                logger.error(f"[增量生成] 重新生成失败: {str(e)}", exc_info=True)
+
+    async def _rebuild(self, cause: str, set_ids: Optional[Set[int]]):
+        enabled = [row[0] for row in await async_db.fetch_all(
+            "SELECT id FROM filter_rule_sets WHERE enabled = 1 ORDER BY id"
+        )]
+        targets = [set_id for set_id in enabled if set_ids is None or set_id in set_ids]
+        rebuilt = 0
+        for set_id in targets:
+            if await rebuild_rule_set(set_id, cause):
+                rebuilt += 1
+        logger.info(f"[增量生成] 检查 {len(targets)} 个规则集合，重新生成 {rebuilt} 个，原因: {cause}")
+
+    async def poll_data_version(self):
+        """检查数据版本，变化时登记事件；首次检查登记启动事件，补齐缺失或过期的输出"""
+        version = await async_db.read(get_data_version)
+        if self._last_data_version is None:
+            self.request('startup')
+        elif version != self._last_data_version:
+            self.request(f'data_version {self._last_data_version}->{version}')
+        self._last_data_version = version
+
+
+# 全局的输出重新生成器
+playlist_regenerator = PlaylistRegenerator()
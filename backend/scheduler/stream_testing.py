@@ -0,0 +1,305 @@
+import asyncio
+import heapq
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Set, Tuple
+
+from database import async_db
+from modules.prober import stream_prober
+from modules.stream_tracks.utils.host_dispatcher import host_dispatcher
+from routers.blocked_domains import get_domain_key
+from routers.filter_rule_sets import _get_cached_filtered_channels
+from routers.stream_tracks import test_single_track
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 普通频道的复测间隔（秒），与原定时全量测试的周期一致
+TEST_INTERVAL_SECONDS = 3 * 3600
+# 出现在启用的规则集合输出中的频道的复测间隔（秒）
+ACTIVE_TEST_INTERVAL_SECONDS = 3600
+# 该时间窗口（秒）内既有成功又有失败的频道视为状态波动
+FLAP_WINDOW_SECONDS = 24 * 3600
+# 长期失效频道退避后的最大复测间隔（秒）
+MAX_BACKOFF_SECONDS = 7 * 24 * 3600
+# 每小时最多发起的测试数
+HOURLY_TEST_BUDGET = 3000
+# 从数据库重新挑选待测频道的间隔（秒）
+REFILL_INTERVAL_SECONDS = 60
+# 重新计算规则集合输出中频道的间隔（秒）
+ACTIVE_REFRESH_SECONDS = 600
+# 优先级权重：输出中的频道 > 状态波动的频道 > 其他频道
+ACTIVE_WEIGHT = 4.0
+FLAPPING_WEIGHT = 2.0
+# 从未测试过的频道按逾期两个周期计算
+NEVER_TESTED_OVERDUE = 2.0
+# 并发数下限；上限为主机调度器的全局并发数
+MIN_CONCURRENCY = 2
+# 每完成多少个测试调整一次并发数
+ADJUST_WINDOW = 20
+# 通过可达性检查后仍失败的比例超过该值时减小并发
+ERROR_RATE_THRESHOLD = 0.3
+# 平均耗时超过基线的倍数时减小并发
+LATENCY_INCREASE_FACTOR = 2.0
+# 减小并发时的乘数
+DECREASE_FACTOR = 0.7
+# 派发时最多跳过的主机已饱和的频道数
+MAX_SKIPPED_PER_DISPATCH = 200
+# 待测频道所在主机均饱和时等待的秒数
+SATURATED_WAIT_SECONDS = 0.5
+
+
+def _parse_time(value) -> Optional[float]:
+    """将数据库中的ISO时间转换为时间戳，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def get_test_interval(active: bool, flapping: bool, failure_count: int) -> float:
+    """频道的复测间隔：输出中的频道更频繁；长期失效的频道按失败次数指数退避，状态波动的频道不退避"""
+    interval = ACTIVE_TEST_INTERVAL_SECONDS if active else TEST_INTERVAL_SECONDS
+    if failure_count > 0 and not flapping:
+        interval = min(interval * 2 ** min(failure_count, 16), MAX_BACKOFF_SECONDS)
+    return interval
+
+
+def get_test_priority(row: tuple, active: bool, now: float) -> Optional[float]:
+    """计算频道的测试优先级，尚未到复测时间时返回None
+
+    Args:
+        row: (id, last_test_time, last_success_time, last_failure_time, probe_failure_count)
+        active: 是否出现在启用的规则集合输出中
+    """
+    _, last_test, last_success, last_failure, failure_count = row
+    last_test, last_success, last_failure = _parse_time(last_test), _parse_time(last_success), _parse_time(last_failure)
+    flapping = (
+        last_success is not None and last_failure is not None
+        and now - min(last_success, last_failure) <= FLAP_WINDOW_SECONDS
+    )
+    interval = get_test_interval(active, flapping, failure_count or 0)
+    if last_test is None:
+        overdue = NEVER_TESTED_OVERDUE
+    else:
+        overdue = (now - last_test) / interval
+        if overdue < 1:
+            return None
+    weight = ACTIVE_WEIGHT if active else FLAPPING_WEIGHT if flapping else 1.0
+    return overdue * weight
+
+
+def _get_active_track_ids(conn) -> Set[int]:
+    """启用的规则集合输出中的频道ID，复用过滤结果缓存"""
+    track_ids = set()
+    set_ids = [row[0] for row in conn.execute("SELECT id FROM filter_rule_sets WHERE enabled = 1").fetchall()]
+    for set_id in set_ids:
+        try:
+            _, channels, _ = _get_cached_filtered_channels(set_id, conn)
+        except Exception as e:
+            logger.debug(f"[持续测试] 获取规则集合 {set_id} 的频道失败: {str(e)}")
+            continue
+        track_ids.update(channel['id'] for channel in channels)
+    return track_ids
+
+
+def _load_candidates(conn) -> List[tuple]:
+    return conn.execute("""
+        SELECT id, last_test_time, last_success_time, last_failure_time, probe_failure_count, url
+        FROM stream_tracks
+    """).fetchall()
+
+
+class StreamTestScheduler:
+    """持续运行的频道测试调度器，取代定时全量测试
+
+    定期从数据库挑选到期的频道放入优先队列：输出中的频道、状态波动的频道和逾期较久的频道优先，
+    长期失效的频道按失败次数指数退避；所在主机已饱和的频道暂时跳过，先派发其他主机的频道。
+    并发数按加性增、乘性减调整：
+    通过可达性检查后仍失败的比例或平均耗时明显上升时减小，否则逐步增大；
+    每小时发起的测试数不超过预算，探测器排队饱和（如手动批量测试运行中）时暂停派发。
+    """
+
+    def __init__(self, hourly_budget: int = HOURLY_TEST_BUDGET):
+        self.hourly_budget = hourly_budget
+        self.max_concurrency = host_dispatcher.global_concurrency
+        self.concurrency = max(MIN_CONCURRENCY, min(stream_prober.capacity, self.max_concurrency))
+        self._queue: List[Tuple[float, int, str]] = []
+        self._inflight: Set[int] = set()
+        self._dispatched_at: Deque[float] = deque()
+        self._window: List[Tuple[float, bool]] = []
+        self._latency_baseline: Optional[float] = None
+        self._active_ids: Set[int] = set()
+        self._active_refreshed_at = 0.0
+        self._refilled_at = 0.0
+        self._slot_released: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """启动调度循环，已在运行时忽略；定期调用可在循环意外退出后重新启动"""
+        if self.running:
+            return
+        self._slot_released = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"[持续测试] 调度器已启动，初始并发: {self.concurrency}，每小时预算: {self.hourly_budget}")
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _refill(self):
+        """重新挑选到期的频道，按优先级重建队列"""
+        now = time.time()
+        if now - self._active_refreshed_at >= ACTIVE_REFRESH_SECONDS:
+            self._active_ids = await async_db.read(_get_active_track_ids)
+            self._active_refreshed_at = now
+
+        queue = []
+        for row in await async_db.read(_load_candidates):
+            if row[0] in self._inflight:
+                continue
+            priority = get_test_priority(row[:5], row[0] in self._active_ids, now)
+            if priority is not None:
+                queue.append((-priority, row[0], get_domain_key(row[5])))
+        heapq.heapify(queue)
+        self._queue = queue
+        self._refilled_at = time.monotonic()
+        logger.debug(f"[持续测试] 待测频道: {len(queue)}，输出中的频道: {len(self._active_ids)}")
+
+    async def _wait_for_budget(self):
+        """最近一小时发起的测试数达到预算时等待最早的一次移出窗口"""
+        while True:
+            now = time.monotonic()
+            while self._dispatched_at and now - self._dispatched_at[0] >= 3600:
+                self._dispatched_at.popleft()
+            if len(self._dispatched_at) < self.hourly_budget:
+                return
+            await asyncio.sleep(self._dispatched_at[0] + 3600 - now)
+
+    async def _wait_for_slot(self):
+        while len(self._inflight) >= self.concurrency:
+            self._slot_released.clear()
+            await self._slot_released.wait()
+
+    def _pop_next(self) -> Optional[int]:
+        """取出优先级最高且所在主机未饱和的频道，跳过的频道放回队列"""
+        skipped, track_id = [], None
+        while self._queue and len(skipped) < MAX_SKIPPED_PER_DISPATCH:
+            entry = heapq.heappop(self._queue)
+            if not host_dispatcher.is_saturated(entry[2]):
+                track_id = entry[1]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return track_id
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._queue or time.monotonic() - self._refilled_at >= REFILL_INTERVAL_SECONDS:
+                    await self._refill()
+                if not self._queue:
+                    await asyncio.sleep(REFILL_INTERVAL_SECONDS)
+                    continue
+
+                await self._wait_for_budget()
+                await self._wait_for_slot()
+                await stream_prober.wait_until_available()
+                track_id = self._pop_next()
+                if track_id is None:
+                    await asyncio.sleep(SATURATED_WAIT_SECONDS)
+                    continue
+                self._inflight.add(track_id)
+                self._dispatched_at.append(time.monotonic())
+                self.dispatched += 1
+                asyncio.get_running_loop().create_task(self._test(track_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[持续测试] 调度出错: {str(e)}", exc_info=True)
+                await asyncio.sleep(REFILL_INTERVAL_SECONDS)
+
+    async def _test(self, track_id: int):
+        started = time.perf_counter()
+        result = {}
+        try:
+            result = await test_single_track(track_id)
+        except Exception as e:
+            logger.debug(f"[持续测试] 测试频道 {track_id} 出错: {str(e)}")
+        finally:
+            self._inflight.discard(track_id)
+            self._record(time.perf_counter() - started, result)
+            self._slot_released.set()
+
+    def _record(self, elapsed: float, result: dict):
+        """记录测试结果，每满一个窗口调整一次并发数
+
+        不可达的频道多为失效链接，不代表负载过高，只统计通过可达性检查后的失败。
+        """
+        if result.get('status'):
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        if not result.get('reachable'):
+            return
+        self._window.append((elapsed, bool(result.get('status'))))
+        if len(self._window) < ADJUST_WINDOW:
+            return
+
+        latencies = [latency for latency, _ in self._window]
+        avg_latency = sum(latencies) / len(latencies)
+        error_rate = sum(1 for _, status in self._window if not status) / len(self._window)
+        self._window = []
+        if self._latency_baseline is None:
+            self._latency_baseline = avg_latency
+        # 基线取较低的平均耗时，并缓慢上移以适应网络整体变化
+        self._latency_baseline = min(avg_latency, self._latency_baseline * 1.1)
+
+        previous = self.concurrency
+        if error_rate > ERROR_RATE_THRESHOLD or avg_latency > self._latency_baseline * LATENCY_INCREASE_FACTOR:
+            self.concurrency = max(MIN_CONCURRENCY, int(self.concurrency * DECREASE_FACTOR))
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        if self.concurrency != previous:
+            logger.info(
+                f"[持续测试] 并发 {previous} -> {self.concurrency}，失败率: {error_rate:.2f}，"
+                f"平均耗时: {avg_latency:.2f}s，基线: {self._latency_baseline:.2f}s"
+            )
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            'running': self.running,
+            'queued': len(self._queue),
+            'in_flight': len(self._inflight),
+            'concurrency': self.concurrency,
+            'min_concurrency': MIN_CONCURRENCY,
+            'max_concurrency': self.max_concurrency,
+            'hourly_budget': self.hourly_budget,
+            'dispatched_last_hour': sum(1 for t in self._dispatched_at if now - t < 3600),
+            'active_tracks': len(self._active_ids),
+            'latency_baseline_seconds': round(self._latency_baseline, 2) if self._latency_baseline else None,
+            'dispatched': self.dispatched,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+        }
+
+
+# 全局的持续测试调度器
+stream_test_scheduler = StreamTestScheduler()
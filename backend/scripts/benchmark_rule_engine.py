@@ -0,0 +1,166 @@
+import sys
+import time
+import random
+import argparse
+import sqlite3
+from pathlib import Path
+# python scripts/benchmark_rule_engine.py --channels 60000
+# python scripts/benchmark_rule_engine.py --rule-set-id 1 --database data/epg.db
+# 添加父目录到系统路径以导入models模块
+sys.path.append(str(Path(__file__).parent.parent))
+from models.rule_tree import RuleNode, RuleTree
+from models.rules import FilterRule
+
+NAMES = ['CCTV-1', 'CCTV-5+', 'CCTV-13', '湖南卫视', '浙江卫视', '东方卫视', 'CGTN', 'HBO', 'Discovery', '凤凰中文']
+GROUPS = ['央视', '卫视', '地方', '体育', '电影', '少儿', 'News', 'Sports']
+SOURCES = ['iptv-org', 'fanmingming', 'local', 'backup']
+RESOLUTIONS = ['4k', '1080p', '720p', '576p', 'unknown', None]
+
+
+def make_channels(count: int, seed: int = 1):
+    """生成模拟的频道数据"""
+    rnd = random.Random(seed)
+    channels = []
+    for i in range(count):
+        name = f"{rnd.choice(NAMES)} {rnd.choice(['', 'HD', '高清', 'FHD', '备用'])}".strip()
+        channels.append({
+            'id': i,
+            'display_name': name,
+            'group_title': rnd.choice(GROUPS),
+            'source_name': rnd.choice(SOURCES + [None]),
+            'stream_url': f"http://{rnd.choice(['a', 'b', 'cdn'])}.example.com/live/{i}.m3u8",
+            'resolution': rnd.choice(RESOLUTIONS),
+            'bitrate': rnd.choice([None, 800, 1500, 3000, 6000, 'n/a']),
+            'test_status': rnd.choice([None, 0, 1, 1]),
+        })
+    return channels
+
+
+def _rule(type_, pattern, action='include', **kwargs):
+    return FilterRule(name=f"{type_}:{pattern}", type=type_, pattern=pattern, action=action, **kwargs)
+
+
+def make_sample_tree(extra_patterns: int = 0) -> RuleNode:
+    """构造一个包含多层嵌套规则集合的示例规则树
+
+    Args:
+        extra_patterns: 额外添加的正则名称规则数量，用于模拟包含大量模式的规则集合
+    """
+    root = RuleNode('AND')
+    root.add_rule(_rule('status', '1'))
+    root.add_rule(_rule('keyword', '备用', 'exclude'))
+    root.add_rule(_rule('keyword', 'test', 'exclude'))
+    root.add_rule(_rule('bitrate', '', min_value=1000, max_value=None))
+
+    names = RuleNode('OR')
+    for pattern in ['cctv', '卫视', 'cgtn', 'hbo', 'discovery']:
+        names.add_rule(_rule('name', pattern))
+    names.add_rule(_rule('name', r'^凤凰.*', regex_mode=True))
+    for i in range(extra_patterns):
+        names.add_rule(_rule('name', rf'^频道{i}(\s|$)', regex_mode=True))
+    root.add_child(names)
+
+    quality = RuleNode('OR')
+    quality.add_rule(_rule('resolution', '4k'))
+    quality.add_rule(_rule('resolution', '1080p'))
+    quality.add_rule(_rule('resolution', '720p'))
+    root.add_child(quality)
+
+    groups = RuleNode('AND')
+    groups.add_rule(_rule('group', '少儿', 'exclude'))
+    groups.add_rule(_rule('group', 'news', 'exclude'))
+    sources = RuleNode('OR')
+    sources.add_rule(_rule('source_name', 'iptv', case_sensitive=True))
+    sources.add_rule(_rule('source_name', 'fan'))
+    sources.add_rule(_rule('source_name', r'^loc', regex_mode=True))
+    groups.add_child(sources)
+    root.add_child(groups)
+    return root
+
+
+def load_from_database(database: str, rule_set_id: int):
+    """从数据库加载规则集合和频道"""
+    conn = sqlite3.connect(database)
+    try:
+        tree = RuleTree()
+        tree.build_from_rule_set(rule_set_id, conn)
+        cursor = conn.execute("""
+            SELECT stream_tracks.id, stream_tracks.name AS display_name, stream_tracks.group_title,
+                   stream_tracks.url AS stream_url, stream_tracks.resolution, stream_tracks.bitrate,
+                   stream_tracks.test_status, epg_sources.name AS source_name
+            FROM stream_tracks
+            LEFT JOIN epg_channels ON stream_tracks.name = epg_channels.display_name
+            LEFT JOIN epg_sources ON epg_channels.source_id = epg_sources.id
+        """)
+        columns = [d[0] for d in cursor.description]
+        channels = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    return tree.root, channels
+
+
+def measure(fn, channels, repeat: int):
+    """返回最佳一次的耗时和结果"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn(channels)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比规则树逐节点执行、编译执行与按列执行的过滤速度')
+    parser.add_argument('--channels', '-n', type=int, default=60000, help='模拟频道数量（默认60000）')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='重复次数，取最快一次（默认3）')
+    parser.add_argument('--patterns', '-p', type=int, default=0, help='额外的正则名称规则数量（默认0）')
+    parser.add_argument('--database', '-d', help='数据库文件路径，与 --rule-set-id 一起使用')
+    parser.add_argument('--rule-set-id', type=int, help='使用数据库中的规则集合和频道')
+    args = parser.parse_args()
+
+    if args.rule_set_id is not None:
+        if not args.database:
+            from config import DATABASE_FILE
+            args.database = str(DATABASE_FILE)
+        root, channels = load_from_database(args.database, args.rule_set_id)
+    else:
+        root, channels = make_sample_tree(args.patterns), make_channels(args.channels)
+
+    tree = RuleTree()
+    tree.root = root
+    begin = time.perf_counter()
+    compiled = tree.compile()
+    compile_time = time.perf_counter() - begin
+
+    before, expected = measure(lambda items: [c for c in items if root.evaluate(c)], channels, args.repeat)
+    after, actual = measure(compiled.filter_channels, channels, args.repeat)
+
+    # 按列评估的输入为查询返回的原始行，逐行执行时需要先为每行构造字典
+    columns = sorted({key for channel in channels for key in channel})
+    rows = [tuple(channel.get(key) for key in columns) for channel in channels]
+    row_mode, _ = measure(lambda items: compiled.filter_channels([dict(zip(columns, row)) for row in items]),
+                          rows, args.repeat)
+    columnar, selected = measure(lambda items: compiled.filter_rows(columns, items), rows, args.repeat)
+
+    if [id(c) for c in expected] != [id(c) for c in actual]:
+        print('结果不一致：编译执行与逐节点执行的过滤结果不同')
+        sys.exit(1)
+    if [tuple(c.get(key) for key in columns) for c in expected] != [tuple(c[key] for key in columns) for c in selected]:
+        print('结果不一致：按列执行与逐节点执行的过滤结果不同')
+        sys.exit(1)
+
+    total = len(channels)
+    print(f"频道数: {total}，匹配: {len(actual)}")
+    print(f"执行计划: {compiled.plan}")
+    print(f"编译耗时: {compile_time * 1000:.2f} ms")
+    print(f"逐节点执行: {before:.3f}s, {total / before:,.0f} 频道/秒")
+    print(f"编译执行:   {after:.3f}s, {total / after:,.0f} 频道/秒")
+    print(f"编译逐行:   {row_mode:.3f}s, {total / row_mode:,.0f} 频道/秒（含构造全部行的字典）")
+    print(f"按列执行:   {columnar:.3f}s, {total / columnar:,.0f} 频道/秒（含构造匹配行的字典）")
+    print(f"加速比: 编译 {before / after:.2f}x, 按列 {before / columnar:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from sync import extract_table_data
 from utils import download_and_save_logo
+from utils.http_client import http_client
 from config import DATABASE_FILE
 
 # 配置日志
@@ -33,10 +34,14 @@ def main():
 
     args = parser.parse_args()
 
+    # 创建事件循环
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
     try:
         # 提取表格数据
         logging.info(f'开始从 {args.url} 提取表格数据')
-        data = extract_table_data(args.url, args.selector)
+        data = loop.run_until_complete(extract_table_data(args.url, args.selector))
         logging.info(f'成功提取 {len(data)} 行数据')
 
         # 准备输出
@@ -54,10 +59,6 @@ def main():
         # 处理图片下载和台标关系
         logo_mapping = {}
         
-        # 创建事件循环
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         # 收集所有下载任务
         download_tasks = []
         for item in data:
@@ -97,6 +98,7 @@ def main():
         except Exception as e:
             logging.error(f'处理下载任务时出错: {str(e)}')
         finally:
+            loop.run_until_complete(http_client.close())
             loop.close()
         
         # 保存台标映射关系到数据库
@@ -1,255 +1,291 @@
 from datetime import datetime
+import asyncio
 import sqlite3
-import xml.etree.ElementTree as ET
-import requests
 from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
 from utils import download_and_save_logo
+from utils.http_client import http_client, conditional_headers, FetchResult, get_proxy_config, get_proxy_settings, get_proxy_url
 import aiohttp
-from database import get_db_connection
+from database import get_write_connection, async_db
 import sqlite3
 from typing import List, Dict
 import re
-import io
-import zipfile
-import gzip
+import os
+import hashlib
+import tempfile
 from config import DATABASE_FILE
 from routers.blocked_domains import should_skip_domain
+from modules.xmltv import parse_xmltv_to_staging
+from modules.playlist_parser import parse_m3u_content, parse_txt_content, parse_stream_source
+from .pipeline import SyncJob, run_sync_pipeline
 import logging
 logger = logging.getLogger(__name__)
 
-def get_proxy_config():
-    """获取代理配置"""
-    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
-    c = conn.cursor()
+
+# 流式下载的分块大小
+EPG_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 同时下载的台标数
+EPG_LOGO_CONCURRENCY = 8
+
+
+async def download_epg_file(url: str, dest, proxy: Optional[str] = None, etag: Optional[str] = None,
+                            last_modified: Optional[str] = None) -> FetchResult:
+    """以条件请求流式下载EPG文件到本地临时文件
+
+    Returns:
+        FetchResult: 下载结果，内容未变化时 not_modified 为真
+    """
     try:
-        c.execute("SELECT * FROM proxy_config LIMIT 1")
-        columns = [description[0] for description in c.description]
-        proxy_config_row = c.fetchone()
-        return dict(zip(columns, proxy_config_row)) if proxy_config_row else None
-    finally:
-        conn.close()
+        return await http_client.conditional_download(
+            url, dest, etag=etag, last_modified=last_modified, proxy=proxy, chunk_size=EPG_DOWNLOAD_CHUNK_SIZE
+        )
+    except Exception as e:
+        raise Exception(f"获取EPG数据失败: {str(e)}")
 
-def get_proxy_settings():
-    """根据代理配置生成requests使用的代理设置"""
-    proxy_config = get_proxy_config()
-    if not proxy_config or not proxy_config['enabled']:
-        return None
-    
-    proxy_type = proxy_config['proxy_type']
-    host = proxy_config['host']
-    port = proxy_config['port']
-    username = proxy_config['username']
-    password = proxy_config['password']
-    
-    auth = f"{username}:{password}@" if username and password else ""
-    proxy_url = f"{proxy_type}://{auth}{host}:{port}"
-    
+
+def _fetch_state(fetch: FetchResult) -> Dict:
+    """需要在写入成功后保存的拉取状态"""
     return {
-        "http": proxy_url,
-        "https": proxy_url
+        'etag': fetch.etag,
+        'last_modified': fetch.last_modified,
+        'content_hash': fetch.content_hash,
+        'content_size': fetch.size
     }
 
 
-async def sync_epg_source(source_id: int):
-    """同步单个EPG数据源"""
+def _is_unchanged(fetch: FetchResult, content_hash: Optional[str], content_size: Optional[int]) -> bool:
+    """服务端返回304，或内容与上次同步时完全一致"""
+    if fetch.not_modified:
+        return True
+    return bool(content_hash) and fetch.content_hash == content_hash and fetch.size == content_size
+
+
+async def _touch_unchanged_source(table: str, source_id: int, fetch: FetchResult, last_update: Optional[str] = None):
+    """内容未变化时只刷新同步时间和校验信息，跳过解析和比对"""
+    await async_db.execute(
+        f"UPDATE {table} SET last_update = COALESCE(?, CURRENT_TIMESTAMP), "
+        "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE id = ?",
+        (last_update, fetch.etag, fetch.last_modified, source_id)
+    )
+
+
+def _remove_temp_files(payload: Dict):
+    """删除下载和解析阶段产生的临时文件"""
+    for key in ('path', 'staging_path'):
+        path = payload.get(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+async def fetch_epg_source(source_id: int) -> Dict:
+    """下载阶段：将EPG数据流式下载到临时文件"""
     print(f"[同步EPG] 开始同步源ID: {source_id}")
-    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
-    c = conn.cursor()
-    
+    # 检查源是否存在并获取默认语言
+    result = await async_db.fetch_one(
+        "SELECT url, default_language, etag, last_modified, content_hash, content_size FROM epg_sources WHERE id = ?",
+        (source_id,)
+    )
+    if not result:
+        raise ValueError("EPG源不存在")
+
+    url, default_language, etag, last_modified, content_hash, content_size = result
+    print(f"[同步EPG] 获取到源URL: {url}")
+    proxy_url = await get_proxy_url()
+    if proxy_url:
+        print(f"[同步EPG] 使用代理设置: {proxy_url}")
+
+    fd, tmp_path = tempfile.mkstemp(prefix='epg_', suffix='.download')
+    payload = {
+        'source_id': source_id,
+        'url': url,
+        'default_language': default_language,
+        'path': tmp_path,
+        'staging_path': tmp_path + '.staging.db'
+    }
     try:
-        # 检查源是否存在并获取默认语言
-        c.execute("SELECT url, default_language FROM epg_sources WHERE id = ?", (source_id,))
-        result = c.fetchone()
-        if not result:
-            raise ValueError("EPG源不存在")
-        
-        url, default_language = result
-        print(f"[同步EPG] 获取到源URL: {url}")
-        proxies = get_proxy_settings()
-        if proxies:
-            print(f"[同步EPG] 使用代理设置: {proxies}")
-        
-        # 获取EPG XML数据
+        # 流式下载EPG数据到临时文件
         print("[同步EPG] 开始下载EPG数据...")
-        response = requests.get(url, proxies=proxies)
-        if response.status_code != 200:
-            raise Exception(f"获取EPG数据失败: HTTP {response.status_code}")
-        
-        content = response.content
-        content_type = response.headers.get('Content-Type', '').lower()
-        print(f"[同步EPG] 成功获取数据，Content-Type: {content_type}")
-        
-        # 处理gz格式的响应
-        if 'application/gzip' in content_type or 'application/x-gzip' in content_type or url.lower().endswith('.gz'):
-            print("[同步EPG] 检测到GZ压缩格式，开始解压...")
-            content = gzip.decompress(content)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            fetch = await download_epg_file(url, tmp_file, proxy_url, etag, last_modified)
+    except Exception:
+        _remove_temp_files(payload)
+        raise
+
+    if _is_unchanged(fetch, content_hash, content_size):
+        _remove_temp_files(payload)
+        print(f"[同步EPG] 内容未变化，跳过解析，源ID: {source_id}")
+        await _touch_unchanged_source('epg_sources', source_id, fetch, datetime.now().isoformat())
+        return None
+
+    print(f"[同步EPG] 成功获取数据，Content-Type: {fetch.content_type}，大小: {fetch.size} 字节")
+    payload.update({'content_type': fetch.content_type, 'size': fetch.size, 'fetch_state': _fetch_state(fetch)})
+    return payload
+
+
+async def download_epg_logos(parsed: Dict) -> Dict:
+    """写入前准备：并发下载暂存库中频道的台标"""
+    staging = sqlite3.connect(parsed['staging_path'])
+    try:
+        channels = staging.execute(
+            "SELECT DISTINCT display_name, logo_url FROM channels WHERE logo_url IS NOT NULL AND logo_url != ''"
+        ).fetchall()
+    finally:
+        staging.close()
+
+    semaphore = asyncio.Semaphore(EPG_LOGO_CONCURRENCY)
+
+    async def download(display_name: str, logo_url: str):
+        async with semaphore:
             try:
-                content = content.decode('utf-8')
-            except UnicodeDecodeError:
-                content = content.decode('latin1')
-            print("[同步EPG] GZ解压完成")
-        
-        # 处理zip格式的响应
-        elif 'application/zip' in content_type or url.lower().endswith('.zip'):
-            print("[同步EPG] 检测到ZIP压缩格式，开始解压...")
-            with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-                # 查找zip文件中的xml文件
-                xml_files = [f for f in zip_file.namelist() if f.lower().endswith('.xml')]
-                if not xml_files:
-                    raise Exception("ZIP文件中未找到XML文件")
-                print(f"[同步EPG] 在ZIP中找到XML文件: {xml_files[0]}")
-                # 使用第一个找到的xml文件
-                content = zip_file.read(xml_files[0])
-            print("[同步EPG] ZIP解压完成")
-
-        print("[同步EPG] 开始解析XML数据...")
-        root = ET.fromstring(content)
-        
-        # 获取现有频道和节目数据
-        print("[同步EPG] 获取现有数据...")
-        c.execute("SELECT channel_id FROM epg_channels WHERE source_id = ?", (source_id,))
-        existing_channel_ids = {row[0] for row in c.fetchall()}
-        
-        # 解析并收集频道信息
-        print("[同步EPG] 开始解析频道信息...")
-        channels_data = []
-        channel_count = 0
-        for channel in root.findall('.//channel'):
-            channel_count += 1
-            channel_id = channel.get('id', '')
-            display_name_elem = channel.find('.//display-name')
-            display_name = display_name_elem.text.strip() if display_name_elem is not None and display_name_elem.text else ''
-            language = display_name_elem.get('lang', default_language) if display_name_elem is not None else default_language
-            
-            icon_elem = channel.find('.//icon')
-            logo_url = icon_elem.get('src', None) if icon_elem is not None else None
-            
-            category_elem = channel.find('.//category')
-            category = category_elem.text.strip() if category_elem is not None and category_elem.text else None
-            
-            local_logo_path = None
-            if logo_url:
-                try:
-                    print(f"[同步EPG] 下载频道 {display_name} 的台标...")
-                    local_logo_path = await download_and_save_logo(logo_url, display_name)
-                except Exception as e:
-                    print(f"[同步EPG] 下载台标失败: {str(e)}")
-            
-            channels_data.append((
-                channel_id, display_name, language, category, logo_url, source_id, local_logo_path
-            ))
-        
-        print(f"[同步EPG] 解析到 {channel_count} 个频道")
-        
-        # 批量插入频道数据
-        if channels_data:
-            print("[同步EPG] 开始插入频道数据...")
-            c.executemany(
-                "INSERT OR REPLACE INTO epg_channels (channel_id, display_name, language, category, logo_url, source_id, local_logo_path) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                channels_data
-            )
-            
-            # 删除不再存在的频道
-            new_channel_ids = {channel[0] for channel in channels_data}
-            channels_to_delete = existing_channel_ids - new_channel_ids
-            if channels_to_delete:
-                print(f"[同步EPG] 删除 {len(channels_to_delete)} 个不再存在的频道...")
+                print(f"[同步EPG] 下载频道 {display_name} 的台标...")
+                return (display_name, logo_url), await download_and_save_logo(logo_url, display_name)
+            except Exception as e:
+                print(f"[同步EPG] 下载台标失败: {str(e)}")
+                return (display_name, logo_url), None
+
+    logos = await asyncio.gather(*(download(name, logo_url) for name, logo_url in channels))
+    return {**parsed, 'logos': {key: path for key, path in logos if path}}
+
+
+def write_epg_source(parsed: Dict) -> Dict:
+    """写入阶段：将暂存库中的频道和节目导入数据库"""
+    source_id = parsed['source_id']
+    logos = parsed.get('logos', {})
+    fetch_state = parsed['fetch_state']
+    with get_write_connection() as conn:
+        c = conn.cursor()
+        c.execute("ATTACH DATABASE ? AS staging", (parsed['staging_path'],))
+        try:
+            # 获取现有频道和节目数据
+            print("[同步EPG] 获取现有数据...")
+            c.execute("SELECT channel_id FROM epg_channels WHERE source_id = ?", (source_id,))
+            existing_channel_ids = {row[0] for row in c.fetchall()}
+
+            # 批量插入频道数据
+            if parsed['channel_count']:
+                print("[同步EPG] 开始插入频道数据...")
+                c.execute("SELECT channel_id, display_name, language, category, logo_url FROM staging.channels")
+                channels_data = [
+                    (channel_id, display_name, language, category, logo_url, source_id, logos.get((display_name, logo_url)))
+                    for channel_id, display_name, language, category, logo_url in c.fetchall()
+                ]
                 c.executemany(
-                    "DELETE FROM epg_channels WHERE source_id = ? AND channel_id = ?",
-                    [(source_id, channel_id) for channel_id in channels_to_delete]
+                    "INSERT OR REPLACE INTO epg_channels (channel_id, display_name, language, category, logo_url, source_id, local_logo_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    channels_data
                 )
-        
-        # 解析并收集节目信息
-        print("[同步EPG] 开始解析节目信息...")
-        programs_data = []
-        program_count = 0
-        for programme in root.findall('.//programme'):
-            program_count += 1
-            channel_id = programme.get('channel', '')
-            start_time = programme.get('start', '')
-            end_time = programme.get('stop', '')
-            title_elem = programme.find('title')
-            title = title_elem.text.strip() if title_elem is not None and title_elem.text else ''
-            language = title_elem.get('lang', default_language) if title_elem is not None else default_language
-            desc_elem = programme.find('desc')
-            desc = desc_elem.text.strip() if desc_elem is not None and desc_elem.text else None
-            
-            category_elem = programme.find('category')
-            category = category_elem.text.strip() if category_elem is not None and category_elem.text else None
-            
-            programs_data.append((
-                channel_id, title, start_time, end_time, desc, language, category, source_id
-            ))
-        
-        print(f"[同步EPG] 解析到 {program_count} 个节目")
-        
-        # 获取现有节目数据
-        print("[同步EPG] 获取现有节目数据...")
-        c.execute("SELECT channel_id, start_time FROM epg_programs WHERE source_id = ?", (source_id,))
-        existing_programs = {(row[0], row[1]) for row in c.fetchall()}
-        
-        # 更新或插入节目数据
-        if programs_data:
-            print("[同步EPG] 开始更新节目数据...")
-            c.executemany(
-                "INSERT OR REPLACE INTO epg_programs (channel_id, title, start_time, end_time, description, language, category, source_id) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                programs_data
-            )
-            
-            # 删除不再存在的节目
-            new_programs = {(prog[0], prog[2]) for prog in programs_data}  # channel_id, start_time
-            programs_to_delete = existing_programs - new_programs
-            if programs_to_delete:
-                print(f"[同步EPG] 删除 {len(programs_to_delete)} 个不再存在的节目...")
-                for channel_id, start_time in programs_to_delete:
-                    c.execute(
-                        "DELETE FROM epg_programs WHERE source_id = ? AND channel_id = ? AND start_time = ?",
-                        (source_id, channel_id, start_time)
+
+                # 删除不再存在的频道
+                new_channel_ids = {channel[0] for channel in channels_data}
+                channels_to_delete = existing_channel_ids - new_channel_ids
+                if channels_to_delete:
+                    print(f"[同步EPG] 删除 {len(channels_to_delete)} 个不再存在的频道...")
+                    c.executemany(
+                        "DELETE FROM epg_channels WHERE source_id = ? AND channel_id = ?",
+                        [(source_id, channel_id) for channel_id in channels_to_delete]
                     )
-        
-        # 更新同步时间
-        print("[同步EPG] 更新同步时间...")
-        c.execute(
-            "UPDATE epg_sources SET last_update = ? WHERE id = ?",
-            (datetime.now().isoformat(), source_id)
-        )
-        
-        conn.commit()
-        print(f"[同步EPG] 同步完成，源ID: {source_id}")
-        return True
-        
-    except Exception as e:
-        conn.rollback()
-        print(f"[同步EPG] 同步失败: {str(e)}")
-        raise e
-    finally:
-        conn.close()
+
+            # 更新或插入节目数据
+            if parsed['program_count']:
+                print("[同步EPG] 开始更新节目数据...")
+                # 暂存库中的节目与现有节目按唯一键比对，只写入新增和内容变化的行
+                c.execute("""
+                    INSERT INTO epg_programs (channel_id, title, start_time, end_time, description, language, category, source_id)
+                    SELECT channel_id, title, start_time, end_time, description, language, category, ?
+                    FROM staging.programs WHERE 1
+                    ON CONFLICT (title, start_time, channel_id, source_id) DO UPDATE SET
+                        end_time = excluded.end_time,
+                        description = excluded.description,
+                        language = excluded.language,
+                        category = excluded.category
+                    WHERE end_time IS NOT excluded.end_time
+                       OR description IS NOT excluded.description
+                       OR language IS NOT excluded.language
+                       OR category IS NOT excluded.category
+                """, (source_id,))
+                print(f"[同步EPG] 新增或更新 {c.rowcount} 个节目")
+
+                # 删除不再存在的节目
+                c.execute("""
+                    DELETE FROM epg_programs
+                    WHERE source_id = ? AND NOT EXISTS (
+                        SELECT 1 FROM staging.programs s
+                        WHERE s.channel_id = epg_programs.channel_id
+                          AND s.start_time = epg_programs.start_time
+                          AND s.title = epg_programs.title
+                    )
+                """, (source_id,))
+                if c.rowcount:
+                    print(f"[同步EPG] 删除 {c.rowcount} 个不再存在的节目")
+
+            # 更新同步时间
+            print("[同步EPG] 更新同步时间...")
+            c.execute(
+                "UPDATE epg_sources SET last_update = ?, etag = ?, last_modified = ?, content_hash = ?, content_size = ? WHERE id = ?",
+                (datetime.now().isoformat(), fetch_state['etag'], fetch_state['last_modified'],
+                 fetch_state['content_hash'], fetch_state['content_size'], source_id)
+            )
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            c.execute("DETACH DATABASE staging")
+    print(f"[同步EPG] 同步完成，源ID: {source_id}")
+    return {'channels': parsed['channel_count'], 'programs': parsed['program_count']}
+
+
+def create_epg_sync_job(source_id: int) -> SyncJob:
+    """创建EPG源的同步流水线任务"""
+    return SyncJob(
+        key=source_id,
+        fetch=lambda: fetch_epg_source(source_id),
+        parse=parse_xmltv_to_staging,
+        prepare=download_epg_logos,
+        write=write_epg_source,
+        cleanup=_remove_temp_files
+    )
+
+
+async def _export_epg_profiles(cause: str):
+    """EPG数据更新后重新导出启用的导出配置，保持导出文件与节目数据一致"""
+    # 调度器模块导入了本模块，导出函数在调用时导入
+    from scheduler.epg_export import export_enabled_profiles
+    await export_enabled_profiles(cause)
+
+
+async def sync_epg_source(source_id: int):
+    """同步单个EPG数据源
+
+    下载、解压、解析和写入均以流的方式进行，不在内存中构建完整的XML文档；
+    解析在进程池中执行，不占用事件循环。
+    """
+    report = await run_sync_pipeline([create_epg_sync_job(source_id)])
+    result = report['results'][0]
+    if not result['success']:
+        print(f"[同步EPG] 同步失败: {result['error']}")
+        if result['error'] == "EPG源不存在":
+            raise ValueError(result['error'])
+        raise Exception(result['error'])
+    await _export_epg_profiles(f'EPG源 {source_id} 同步完成')
+    return True
 
 async def sync_all_active_sources():
-    """同步所有激活的EPG数据源"""
-    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
-    c = conn.cursor()
-    
-    try:
-        c.execute("SELECT id FROM epg_sources WHERE active = 1")
-        source_ids = [row[0] for row in c.fetchall()]
-        
-        results = []
-        for source_id in source_ids:
-            try:
-                await sync_epg_source(source_id)
-                results.append({"source_id": source_id, "success": True})
-            except Exception as e:
-                results.append({"source_id": source_id, "success": False, "error": str(e)})
-        
-        return results
-    finally:
-        conn.close()
+    """同步所有激活的EPG数据源
 
-def extract_table_data(url: str, selector: str) -> List[Dict[str, str]]:
+    各源的下载并发进行，解析在进程池中并行，写入由单一写线程串行完成，
+    总耗时接近最慢的单个源。
+    """
+    source_ids = [row[0] for row in await async_db.fetch_all("SELECT id FROM epg_sources WHERE active = 1")]
+
+    report = await run_sync_pipeline([create_epg_sync_job(source_id) for source_id in source_ids])
+    logger.info(f"[同步EPG] 全部同步完成，各阶段耗时: {report['timings']}")
+    if any(result['success'] for result in report['results']):
+        await _export_epg_profiles('EPG源全部同步完成')
+    return report
+
+async def extract_table_data(url: str, selector: str) -> List[Dict[str, str]]:
     """从指定网站URL中提取表格数据
     
     Args:
@@ -264,16 +300,14 @@ def extract_table_data(url: str, selector: str) -> List[Dict[str, str]]:
         Exception: 当网络请求失败或解析出错时抛出异常
     """
     try:
-        # 获取代理设置
-        proxies = get_proxy_settings()
-        
         # 发送HTTP请求获取页面内容
-        response = requests.get(url, proxies=proxies)
-        if response.status_code != 200:
-            raise Exception(f"获取页面数据失败: HTTP {response.status_code}")
+        try:
+            content = await http_client.fetch_bytes(url, proxy=await get_proxy_url())
+        except Exception as e:
+            raise Exception(f"获取页面数据失败: {str(e)}")
         
         # 使用BeautifulSoup解析HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = BeautifulSoup(content, 'html.parser')
         
         # 查找目标表格
         table = soup.select_one(selector)
@@ -302,324 +336,228 @@ def extract_table_data(url: str, selector: str) -> List[Dict[str, str]]:
                 data.append(row_data)
         
         return data
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"网络请求错误: {str(e)}")
     except Exception as e:
         raise Exception(f"解析表格数据失败: {str(e)}")
 
-async def sync_stream_source(source_id: int):
-    """同步指定直播源的数据"""
+async def _load_stream_source(source_id: int) -> Dict:
+    """获取直播源信息"""
+    sources = await async_db.fetch_dicts("SELECT * FROM stream_sources WHERE id = ?", (source_id,))
+    if not sources:
+        raise ValueError("直播源不存在")
+    return sources[0]
+
+
+async def fetch_stream_source(source_id: int) -> Dict:
+    """下载阶段：获取直播源内容"""
     logger.info(f"[同步直播源] 开始同步源ID: {source_id}")
-    # 获取直播源信息
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM stream_sources WHERE id = ?", (source_id,))
-        source = c.fetchone()
-        if not source:
-            raise ValueError("直播源不存在")
-        
-        # 将结果转换为字典
-        columns = [description[0] for description in c.description]
-        source = dict(zip(columns, source))
-        logger.info(f"[同步直播源] 获取到源信息: {source['name']} ({source['url']})")
-    
+    source = await _load_stream_source(source_id)
+    logger.info(f"[同步直播源] 获取到源信息: {source['name']} ({source['url']})")
+
+    # 获取直播源内容
+    proxy_url = await get_proxy_url()
+    if proxy_url:
+        logger.info(f"[同步直播源] 通过代理 {proxy_url} 获取内容")
+    else:
+        logger.info("[同步直播源] 直接获取内容")
+    headers = conditional_headers(source.get('etag'), source.get('last_modified'))
     try:
-        # 在获取新内容之前，获取失效URL列表
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT url FROM invalid_urls 
-                WHERE (
-                    failure_count >= 5 OR
-                    (julianday('now') - julianday(last_failure_time)) <= 30
-                ) AND (
-                    last_success_time IS NULL OR
-                    (julianday('now') - julianday(last_success_time)) > 7
+        async with http_client.request('GET', source['url'], proxy=proxy_url, headers=headers) as response:
+            if response.status == 304:
+                fetch = FetchResult(
+                    status=304,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
                 )
-            """)
-            invalid_urls = {row[0] for row in c.fetchall()}
-            logger.info(f"[同步直播源] 已加载 {len(invalid_urls)} 个已知失效URL")
-        
-        # 获取代理设置
-        proxies = get_proxy_settings()
-        if proxies:
-            logger.info("[同步直播源] 使用代理设置获取内容")
-        
-        # 获取直播源内容
-        async with aiohttp.ClientSession() as session:
-            # 设置代理
-            if proxies:
-                proxy_url = proxies.get('http') or proxies.get('https')
-                logger.info(f"[同步直播源] 通过代理 {proxy_url} 获取内容")
-                async with session.get(source['url'], proxy=proxy_url) as response:
-                    if response.status != 200:
-                        raise Exception(f"获取直播源数据失败: HTTP {response.status}")
-                    content = await response.text()
+            elif response.status != 200:
+                raise Exception(f"获取直播源数据失败: HTTP {response.status}")
             else:
-                logger.info("[同步直播源] 直接获取内容")
-                async with session.get(source['url']) as response:
-                    if response.status != 200:
-                        raise Exception(f"获取直播源数据失败: HTTP {response.status}")
-                    content = await response.text()
-
-        logger.info("[同步直播源] 成功获取内容，开始解析")
-        tvg_channel = {
+                body = await response.read()
+                content = await response.text()
+                fetch = FetchResult(
+                    status=200,
+                    size=len(body),
+                    content_hash=hashlib.sha256(body).hexdigest(),
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
+                )
+    except aiohttp.ClientError as e:
+        raise Exception(f"网络请求失败: {str(e)}")
+
+    if _is_unchanged(fetch, source.get('content_hash'), source.get('content_size')):
+        logger.info(f"[同步直播源] 内容未变化，跳过解析，源ID: {source_id}")
+        await _touch_unchanged_source('stream_sources', source_id, fetch)
+        return None
+
+    logger.info("[同步直播源] 成功获取内容，开始解析")
+    return {
+        'source': source,
+        'fetch_state': _fetch_state(fetch),
+        'content': content,
+        'url': source['url'],
+        'type': source['type'],
+        'tvg_channel': {
             'x_tvg_url': source.get('x_tvg_url'),
             'catchup': source.get('catchup'),
             'catchup_source': source.get('catchup_source')
-        }     
-        # 根据文件类型解析内容
-        if source['url'].lower().endswith('.m3u') or source['url'].lower().endswith('.m3u8') or content.strip().startswith('#EXTM3U') or source['type'] == 'm3u':
-            logger.info("[同步直播源] 解析M3U格式内容")
-            channels, tvg_channel = parse_m3u_content(content)
+        }
+    }
+
+
+async def filter_stream_channels(parsed: Dict) -> Dict:
+    """写入前准备：过滤黑名单域名"""
+    channels = parsed['channels']
+    logger.info(f"[同步直播源] 解析完成，获取到 {len(channels)} 个频道")
+
+    filtered_channels = []
+    for channel in channels:
+        if not await should_skip_domain(channel['url']):
+            filtered_channels.append(channel)
         else:
-            # 处理txt格式
-            logger.info("[同步直播源] 解析TXT格式内容")
-            channels = parse_txt_content(content)
-        
-        logger.info(f"[同步直播源] 解析完成，获取到 {len(channels)} 个频道")
-        
-        # 过滤黑名单域名
-        filtered_channels = []
-        for channel in channels:
-            if not await should_skip_domain(channel['url']):
-                filtered_channels.append(channel)
-            else:
-                logger.info(f"[同步直播源] 跳过黑名单域名: {channel['url']}")
-        
-        logger.info(f"[同步直播源] 过滤后剩余 {len(filtered_channels)} 个频道")
-        
-        # 更新数据库
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            try:
-                logger.info("[同步直播源] 开始更新数据库")
-                # 获取现有频道数据
-                c.execute("SELECT url FROM stream_tracks WHERE source_id = ?", (source_id,))
-                existing_urls = {row[0] for row in c.fetchall()}
-                
-                # 更新或插入频道数据
-                for channel in filtered_channels:
-                    c.execute(
-                        "INSERT OR REPLACE INTO stream_tracks (source_id, name, url, group_title, tvg_id, tvg_name, tvg_logo, tvg_language, route_info, catchup, catchup_source) "
-                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (
-                            source_id,
-                            channel.get('name', ''),
-                            channel.get('url', ''),
-                            channel.get('group-title', ''),
-                            channel.get('tvg-id', ''),
-                            channel.get('tvg-name', ''),
-                            channel.get('tvg-logo', ''),
-                            channel.get('tvg-language', ''),
-                            channel.get('route_info', ''),
-                            tvg_channel.get('catchup', ''),
-                            tvg_channel.get('catchup_source', '')
-                        )
+            logger.info(f"[同步直播源] 跳过黑名单域名: {channel['url']}")
+
+    logger.info(f"[同步直播源] 过滤后剩余 {len(filtered_channels)} 个频道")
+    return {**parsed, 'channels': filtered_channels}
+
+
+def write_stream_source(parsed: Dict) -> List[Dict]:
+    """写入阶段：更新直播源的频道数据"""
+    source = parsed['source']
+    source_id = source['id']
+    filtered_channels = parsed['channels']
+    tvg_channel = parsed['tvg_channel']
+    fetch_state = parsed['fetch_state']
+    new_epg_source_ids = []
+
+    with get_write_connection() as conn:
+        c = conn.cursor()
+        try:
+            logger.info("[同步直播源] 开始更新数据库")
+            # 获取现有频道数据
+            c.execute("SELECT url FROM stream_tracks WHERE source_id = ?", (source_id,))
+            existing_urls = {row[0] for row in c.fetchall()}
+
+            # 更新或插入频道数据
+            c.executemany(
+                "INSERT OR REPLACE INTO stream_tracks (source_id, name, url, group_title, tvg_id, tvg_name, tvg_logo, tvg_language, route_info, catchup, catchup_source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        source_id,
+                        channel.get('name', ''),
+                        channel.get('url', ''),
+                        channel.get('group-title', ''),
+                        channel.get('tvg-id', ''),
+                        channel.get('tvg-name', ''),
+                        channel.get('tvg-logo', ''),
+                        channel.get('tvg-language', ''),
+                        channel.get('route_info', ''),
+                        tvg_channel.get('catchup', ''),
+                        tvg_channel.get('catchup_source', '')
                     )
-                
-                # 删除不再存在的频道
-                new_urls = {channel.get('url', '') for channel in filtered_channels}
-                urls_to_delete = existing_urls - new_urls
-                if urls_to_delete:
-                    logger.info(f"[同步直播源] 发现 {len(urls_to_delete)} 个不在新数据中的频道")
-                    # 检查这些URL的最近访问状态
-                    c.execute("""
-                        SELECT url FROM stream_tracks 
-                        WHERE source_id = ? AND url IN ({}) AND (
-                            last_success_time IS NOT NULL AND
-                            julianday('now') - julianday(last_success_time) <= 7
-                        )
-                    """.format(','.join('?' * len(urls_to_delete))), 
-                        [source_id] + list(urls_to_delete)
+                    for channel in filtered_channels
+                ]
+            )
+
+            # 删除不再存在的频道
+            new_urls = {channel.get('url', '') for channel in filtered_channels}
+            urls_to_delete = existing_urls - new_urls
+            if urls_to_delete:
+                logger.info(f"[同步直播源] 发现 {len(urls_to_delete)} 个不在新数据中的频道")
+                # 检查这些URL的最近访问状态
+                c.execute("""
+                    SELECT url FROM stream_tracks 
+                    WHERE source_id = ? AND url IN ({}) AND (
+                        last_success_time IS NOT NULL AND
+                        julianday('now') - julianday(last_success_time) <= 7
                     )
-                    recently_successful_urls = {row[0] for row in c.fetchall()}
-                    
-                    # 只删除最近7天内没有成功访问记录的频道
-                    urls_to_actually_delete = urls_to_delete - recently_successful_urls
-                    if urls_to_actually_delete:
-                        logger.info(f"[同步直播源] 删除 {len(urls_to_actually_delete)} 个频道，保留 {len(recently_successful_urls)} 个最近可用的频道...")
-                        c.executemany(
-                            "DELETE FROM stream_tracks WHERE source_id = ? AND url = ?",
-                            [(source_id, url) for url in urls_to_actually_delete]
+                """.format(','.join('?' * len(urls_to_delete))), 
+                    [source_id] + list(urls_to_delete)
+                )
+                recently_successful_urls = {row[0] for row in c.fetchall()}
+
+                # 只删除最近7天内没有成功访问记录的频道
+                urls_to_actually_delete = urls_to_delete - recently_successful_urls
+                if urls_to_actually_delete:
+                    logger.info(f"[同步直播源] 删除 {len(urls_to_actually_delete)} 个频道，保留 {len(recently_successful_urls)} 个最近可用的频道...")
+                    c.executemany(
+                        "DELETE FROM stream_tracks WHERE source_id = ? AND url = ?",
+                        [(source_id, url) for url in urls_to_actually_delete]
+                    )
+
+            # 更新同步时间
+            c.execute(
+                "UPDATE stream_sources SET last_update = CURRENT_TIMESTAMP, x_tvg_url = ?, catchup = ?, catchup_source = ?, "
+                "etag = ?, last_modified = ?, content_hash = ?, content_size = ? WHERE id = ?",
+                (tvg_channel.get('x_tvg_url', ''), tvg_channel.get('catchup', ''), tvg_channel.get('catchup_source', ''),
+                 fetch_state['etag'], fetch_state['last_modified'], fetch_state['content_hash'], fetch_state['content_size'],
+                 source_id)
+            )
+
+            # 如果有epg地址，则检查是否已存在，不存在才加入epg表
+            if tvg_channel.get('x_tvg_url'):
+                logger.info(f"[同步直播源] 发现EPG地址: {tvg_channel['x_tvg_url']}")
+                # 处理可能存在的多个EPG地址（以逗号分隔）
+                epg_urls = [url.strip() for url in tvg_channel['x_tvg_url'].split(',') if url.strip()]
+
+                for epg_url in epg_urls:
+                    c.execute("SELECT COUNT(*) FROM epg_sources WHERE url = ?", (epg_url,))
+                    if c.fetchone()[0] == 0:
+                        logger.info(f"[同步直播源] 添加新的EPG源: {epg_url}")
+                        c.execute(
+                            "INSERT INTO epg_sources (name, url, active, sync_interval, default_language) VALUES (?, ?, ?, ?, ?)",
+                            (f"来自直播订阅{source['name']}", epg_url, True, 6, 'zh')
                         )
+                        new_epg_source_ids.append(c.lastrowid)
 
-                # 更新同步时间
-                c.execute(
-                    "UPDATE stream_sources SET last_update = CURRENT_TIMESTAMP, x_tvg_url = ?, catchup = ?, catchup_source = ? WHERE id = ?",
-                    (tvg_channel.get('x_tvg_url', ''), tvg_channel.get('catchup', ''), tvg_channel.get('catchup_source', ''), source_id)
-                )
+            conn.commit()
+            logger.info("[同步直播源] 数据库更新完成")
+        except Exception as e:
+            conn.rollback()
+            logger.debug(f"[同步直播源] 数据库更新失败: {str(e)}")
+            raise Exception(f"更新数据库失败: {str(e)}")
 
-                # 如果有epg地址，则检查是否已存在，不存在才加入epg表
-                if tvg_channel.get('x_tvg_url'):
-                    logger.info(f"[同步直播源] 发现EPG地址: {tvg_channel['x_tvg_url']}")
-                    # 处理可能存在的多个EPG地址（以逗号分隔）
-                    epg_urls = [url.strip() for url in tvg_channel['x_tvg_url'].split(',') if url.strip()]
-                    
-                    for epg_url in epg_urls:
-                        c.execute("SELECT COUNT(*) FROM epg_sources WHERE url = ?", (epg_url,))
-                        if c.fetchone()[0] == 0:
-                            logger.info(f"[同步直播源] 添加新的EPG源: {epg_url}")
-                            c.execute(
-                                "INSERT INTO epg_sources (name, url, active, sync_interval, default_language) VALUES (?, ?, ?, ?, ?)",
-                                (f"来自直播订阅{source['name']}", epg_url, True, 6, 'zh')
-                            )
-                            epg_source_id = c.lastrowid
-                            from scheduler import update_source_schedule
-                            update_source_schedule(epg_source_id)
-
-                conn.commit()
-                logger.info("[同步直播源] 数据库更新完成")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[同步直播源] 数据库更新失败: {str(e)}")
-                raise Exception(f"更新数据库失败: {str(e)}")
-        
-        logger.info(f"[同步直播源] 同步完成，源ID: {source_id}")
-        return filtered_channels
-                
-    except aiohttp.ClientError as e:
-        error_msg = f"网络请求失败: {str(e)}"
-        logger.debug(f"[同步直播源] {error_msg}")
-        raise Exception(error_msg)
-    except Exception as e:
-        error_msg = f"同步失败: {str(e)}"
+    # 调度器需在提交后注册新EPG源的同步任务
+    if new_epg_source_ids:
+        from scheduler import update_source_schedule
+        for epg_source_id in new_epg_source_ids:
+            update_source_schedule(epg_source_id)
+
+    logger.info(f"[同步直播源] 同步完成，源ID: {source_id}")
+    return filtered_channels
+
+
+def create_stream_sync_job(source_id: int) -> SyncJob:
+    """创建直播源的同步流水线任务"""
+    return SyncJob(
+        key=source_id,
+        fetch=lambda: fetch_stream_source(source_id),
+        parse=parse_stream_source,
+        prepare=filter_stream_channels,
+        write=write_stream_source
+    )
+
+
+async def sync_stream_source(source_id: int):
+    """同步指定直播源的数据"""
+    report = await run_sync_pipeline([create_stream_sync_job(source_id)])
+    result = report['results'][0]
+    if not result['success']:
+        error_msg = f"同步失败: {result['error']}"
         logger.debug(f"[同步直播源] {error_msg}")
-        raise
+        if result['error'] == "直播源不存在":
+            raise ValueError(result['error'])
+        raise Exception(result['error'])
+    # 内容未变化时没有新的频道数据
+    return result.get('result', [])
 
-def parse_m3u_content(content: str) -> tuple[List[Dict[str, str]], Dict[str, str]]:
-    """解析m3u格式内容"""
-    if not content.strip().startswith('#EXTM3U'):
-        raise ValueError("无效的M3U格式")
-    
-    channels = []
-    current_channel = {}
-    tvg_channel = {}
-    
-    # 解析#EXTM3U行中的全局属性
-    first_line = content.splitlines()[0].strip()
-    for attr in ['x-tvg-url', 'catchup', 'catchup-source']:
-        attr_match = re.search(f'{attr}="([^"]+)"', first_line)
-        if attr_match:
-            tvg_channel[attr.replace('-', '_')] = attr_match.group(1)
-    
-    for line in content.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-            
-        if line.startswith('#EXTINF:'):
-            # 解析频道信息
-            # 先提取扩展属性，避免属性值干扰频道名称的提取
-            for attr in ['group-title', 'tvg-id', 'tvg-name', 'tvg-logo', 'tvg-language']:
-                attr_match = re.search(f'{attr}="([^"]+)"', line)
-                if attr_match:
-                    current_channel[attr] = attr_match.group(1)
-            
-            # 提取频道名称 - 使用更灵活的匹配方式
-            name_match = re.search(r'#EXTINF:-?\d+(?:[^,]*,(.+))?$', line)
-            if name_match and name_match.group(1):
-                # 清理可能存在的属性标签
-                name = name_match.group(1)
-                # 移除任何剩余的属性标签
-                name = re.sub(r'[a-zA-Z0-9-]+="[^"]*"', '', name).strip()
-                current_channel['name'] = name
-                
-        elif not line.startswith('#'):
-            # 处理可能存在的$后缀
-            url_parts = line.split('$', 1)
-            url = url_parts[0]
-            route_info = url_parts[1] if len(url_parts) > 1 else None
-            current_channel['url'] = url
-            current_channel['route_info'] = route_info
-            # 这是频道URL
-            if 'name' in current_channel:
-                channels.append(current_channel.copy())
-                current_channel = {}
-            elif 'tvg-name' in current_channel:
-                current_channel['name'] = current_channel['tvg-name']
-                channels.append(current_channel.copy())
-                current_channel = {}
-            elif 'group-title' in current_channel:
-                current_channel['name'] = current_channel['group-title']
-                channels.append(current_channel.copy())
-                current_channel = {}
-
-    return (channels, tvg_channel)
-
-def parse_txt_content(content: str) -> List[Dict[str, str]]:
-    """解析txt格式内容
-    支持以下格式：
-    1. 频道名,播放地址
-    2. 频道名,分组,播放地址
-    3. 单行播放地址（使用URL最后一段作为频道名）
-    4. 分组名,#genre#
-       频道名,播放地址
-    5. 频道名,播放地址$线路信息
+
+async def sync_all_active_stream_sources():
+    """同步所有激活的直播源
+
+    下载并发进行，解析在进程池中并行，写入由单一写线程串行完成。
     """
-    channels = []
-    current_group = None
-    # 标准化换行符
-    content = content.replace('\r\n', '\n').replace('\r', '\n')
-    # 移除 BOM
-    content = content.strip('\ufeff')
-    
-    # 打印更详细的调试信息
-    lines = content.splitlines()
-    print(f"[解析TXT] 总行数: {len(lines)}")
-    print(f"[解析TXT] 原始内容长度: {len(content)}")
-    print(f"[解析TXT] 非空行数: {len([line for line in lines if line.strip()])}")
-    
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-        
-        parts = line.split(',')
-        
-        # 检查是否是分组标记行
-        if len(parts) == 2 and parts[1].strip() == '#genre#':
-            current_group = parts[0].strip()
-            continue
-        
-        channel = {}
-        
-        if len(parts) == 1:  # 仅包含URL
-            url = parts[0].strip()
-            # 处理可能存在的$后缀
-            url_parts = url.split('$', 1)
-            url = url_parts[0]
-            route_info = url_parts[1] if len(url_parts) > 1 else None
-            # 从URL中提取名称（使用最后一段，去除扩展名）
-            name = url.split('/')[-1].split('?')[0].rsplit('.', 1)[0]
-            channel = {
-                'name': name,
-                'url': url,
-                'route_info': route_info
-            }
-        elif len(parts) >= 2:  # 名称,URL格式 或 名称,分组,URL格式
-            name = parts[0].strip()
-            if len(parts) >= 3:  # 名称,分组,URL格式
-                channel['group-title'] = parts[1].strip()
-                url_part = parts[2].strip()
-            else:  # 名称,URL格式
-                url_part = parts[1].strip()
-            
-            # 处理URL中的$后缀
-            url_parts = url_part.split('$', 1)
-            url = url_parts[0]
-            route_info = url_parts[1] if len(url_parts) > 1 else None
-            
-            channel.update({
-                'name': name,
-                'url': url,
-                'route_info': route_info
-            })
-        
-        if channel and channel.get('url'):
-            # 如果当前有分组，且channel中没有group-title，则添加分组信息
-            if current_group and 'group-title' not in channel:
-                channel['group-title'] = current_group
-            channels.append(channel)
-    
-    return channels
+    source_ids = [row[0] for row in await async_db.fetch_all("SELECT id FROM stream_sources WHERE active = 1")]
+
+    report = await run_sync_pipeline([create_stream_sync_job(source_id) for source_id in source_ids])
+    logger.info(f"[同步直播源] 全部同步完成，各阶段耗时: {report['timings']}")
+    return report
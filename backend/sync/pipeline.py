@@ -0,0 +1,136 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from modules.pool_executor import parse_executor, sync_writer_executor
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 同时进行的下载数，所有流水线共用（定时任务按源各自运行流水线，也受同一上限约束）
+SYNC_MAX_CONCURRENT_DOWNLOADS = 6
+
+_download_semaphore: Optional[asyncio.Semaphore] = None
+_download_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_download_semaphore() -> asyncio.Semaphore:
+    global _download_semaphore, _download_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _download_semaphore is None or _download_semaphore_loop is not loop:
+        _download_semaphore = asyncio.Semaphore(SYNC_MAX_CONCURRENT_DOWNLOADS)
+        _download_semaphore_loop = loop
+    return _download_semaphore
+
+
+@dataclass
+class SyncJob:
+    """同步流水线中的单个任务
+
+    Attributes:
+        key: 任务标识（通常为源ID）
+        fetch: 下载阶段，返回下载结果；返回None表示无需继续处理
+        parse: 解析阶段，在进程池中执行，必须是模块级函数
+        write: 写入阶段，在单写线程中执行
+        prepare: 写入前的异步处理（如下载台标），可选
+        cleanup: 任务结束后清理下载结果（如临时文件），可选
+    """
+    key: Any
+    fetch: Callable[[], Awaitable[Optional[Any]]]
+    parse: Callable[[Any], Any]
+    write: Callable[[Any], Any]
+    prepare: Optional[Callable[[Any], Awaitable[Any]]] = None
+    cleanup: Optional[Callable[[Any], None]] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+async def run_sync_pipeline(jobs: List[SyncJob]) -> Dict:
+    """运行三段式同步流水线
+
+    下载阶段并发执行（受所有流水线共用的并发数限制），解析阶段在进程池中执行，
+    写入阶段由单一写线程依次处理，三个阶段在不同任务之间相互重叠。
+
+    Returns:
+        dict: results 为每个任务的结果，timings 为各阶段累计耗时和总耗时
+    """
+    loop = asyncio.get_running_loop()
+    download_semaphore = _get_download_semaphore()
+    write_queue: asyncio.Queue = asyncio.Queue()
+    stage_totals = {'download': 0.0, 'parse': 0.0, 'prepare': 0.0, 'write': 0.0}
+    results: Dict[Any, Dict] = {}
+    started = time.perf_counter()
+
+    def _record(job: SyncJob, stage: str, begin: float):
+        elapsed = time.perf_counter() - begin
+        job.timings[stage] = round(elapsed, 3)
+        stage_totals[stage] += elapsed
+
+    def _cleanup(job: SyncJob, payload: Any):
+        if job.cleanup and payload is not None:
+            try:
+                job.cleanup(payload)
+            except Exception as e:
+                logger.debug(f"[同步流水线] 清理任务 {job.key} 失败: {str(e)}")
+
+    async def produce(job: SyncJob):
+        payload = None
+        try:
+            async with download_semaphore:
+                begin = time.perf_counter()
+                payload = await job.fetch()
+                _record(job, 'download', begin)
+            if payload is None:
+                results[job.key] = {'success': True, 'skipped': True, 'timings': job.timings}
+                return
+
+            begin = time.perf_counter()
+            parsed = await loop.run_in_executor(parse_executor, job.parse, payload)
+            _record(job, 'parse', begin)
+
+            if job.prepare:
+                begin = time.perf_counter()
+                parsed = await job.prepare(parsed)
+                _record(job, 'prepare', begin)
+
+            await write_queue.put((job, payload, parsed))
+        except Exception as e:
+            logger.info(f"[同步流水线] 任务 {job.key} 失败: {str(e)}")
+            results[job.key] = {'success': False, 'error': str(e), 'timings': job.timings}
+            _cleanup(job, payload)
+
+    async def consume():
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                break
+            job, payload, parsed = item
+            try:
+                begin = time.perf_counter()
+                result = await loop.run_in_executor(sync_writer_executor, job.write, parsed)
+                _record(job, 'write', begin)
+                results[job.key] = {'success': True, 'result': result, 'timings': job.timings}
+            except Exception as e:
+                logger.info(f"[同步流水线] 任务 {job.key} 写入失败: {str(e)}")
+                results[job.key] = {'success': False, 'error': str(e), 'timings': job.timings}
+            finally:
+                _cleanup(job, payload)
+
+    writer = asyncio.create_task(consume())
+    try:
+        await asyncio.gather(*(produce(job) for job in jobs))
+    finally:
+        await write_queue.put(None)
+        await writer
+
+    timings = {stage: round(total, 3) for stage, total in stage_totals.items()}
+    timings['wall'] = round(time.perf_counter() - started, 3)
+    logger.info(
+        f"[同步流水线] 完成 {len(jobs)} 个任务，总耗时 {timings['wall']}s "
+        f"(下载 {timings['download']}s, 解析 {timings['parse']}s, "
+        f"准备 {timings['prepare']}s, 写入 {timings['write']}s)"
+    )
+    return {
+        'results': [{'source_id': job.key, **results.get(job.key, {'success': False})} for job in jobs],
+        'timings': timings
+    }
@@ -0,0 +1,169 @@
+import os
+import zlib
+import asyncio
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Union
+
+from utils.output_publisher import OutputPublisher
+
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# gzip压缩级别，兼顾速度与压缩率
+GZIP_LEVEL = 6
+# brotli压缩质量，流式响应时取较低值以免拖慢首字节
+BROTLI_QUALITY = 5
+# 预压缩文件只在生成时压缩一次，使用更高的压缩率
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 9
+# 预压缩文件的后缀
+PRECOMPRESSED_SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+# 预压缩时每次读取的字节数
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def available_encodings() -> list:
+    """返回服务端支持的压缩编码，按优先级排列"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """根据请求头Accept-Encoding选择压缩编码
+
+    同等权重下优先brotli，其次gzip；客户端不接受任何支持的编码时返回None（不压缩）。
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: Optional[str], gzip_level: int = GZIP_LEVEL,
+                    brotli_quality: int = BROTLI_QUALITY) -> Iterator[bytes]:
+    """流式压缩字节块，encoding为None时原样产出"""
+    if encoding is None:
+        yield from chunks
+        return
+
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+        return
+
+    raise ValueError(f"不支持的压缩编码: {encoding}")
+
+
+def variant_path(path: Union[str, Path], encoding: str) -> Path:
+    """预压缩文件的路径，与原文件同目录"""
+    path = Path(path)
+    return path.with_name(path.name + PRECOMPRESSED_SUFFIXES[encoding])
+
+
+def find_variant(path: Union[str, Path], stat_result: os.stat_result, encoding: str) -> Optional[Path]:
+    """查找与原文件同步的预压缩文件
+
+    预压缩文件的修改时间与原文件保持一致，不一致说明原文件已更新而预压缩文件过期，不可使用。
+    """
+    variant = variant_path(path, encoding)
+    try:
+        variant_stat = variant.stat()
+    except OSError:
+        return None
+    if variant_stat.st_mtime_ns != stat_result.st_mtime_ns:
+        return None
+    return variant
+
+
+def write_compressed_variants(path: Union[str, Path], encodings: Optional[Iterable[str]] = None) -> List[Path]:
+    """为文件生成 .gz/.br 预压缩文件
+
+    预压缩文件通过OutputPublisher原子发布，修改时间设为与原文件一致，作为两者同步的标记；
+    已同步的预压缩文件直接跳过。当前不支持的编码（未安装brotli）会删除残留的旧预压缩文件。
+
+    Args:
+        path: 原文件路径
+        encodings: 只生成指定编码的预压缩文件，默认生成全部
+    """
+
+    path = Path(path)
+    stat_result = path.stat()
+    written = []
+
+    for encoding in (encodings or PRECOMPRESSED_SUFFIXES):
+        variant = variant_path(path, encoding)
+        if encoding not in available_encodings():
+            variant.unlink(missing_ok=True)
+            continue
+        # 原文件未变化时预压缩文件仍然有效，无需重新压缩
+        if find_variant(path, stat_result, encoding):
+            continue
+
+        publisher = OutputPublisher(variant, keep_previous=False)
+        try:
+            with open(path, 'rb') as src, os.fdopen(publisher.open_temp(), 'wb') as dst:
+                chunks = iter(lambda: src.read(READ_CHUNK_SIZE), b'')
+                for data in compress_chunks(chunks, encoding, PRECOMPRESS_GZIP_LEVEL, PRECOMPRESS_BROTLI_QUALITY):
+                    dst.write(data)
+            # 压缩期间原文件被改写时放弃本次结果，由改写方重新生成
+            if path.stat().st_mtime_ns != stat_result.st_mtime_ns:
+                publisher.abort()
+                logger.debug(f"原文件在压缩期间发生变化，放弃预压缩文件: {variant}")
+                break
+            publisher.commit(mtime_ns=stat_result.st_mtime_ns)
+            written.append(variant)
+        except Exception as e:
+            publisher.abort()
+            logger.warning(f"生成预压缩文件失败: {variant}, 错误: {str(e)}")
+
+    return written
+
+
+async def precompress_files(paths: Iterable[Union[str, Path]], encodings: Optional[Iterable[str]] = None):
+    """在压缩线程池中为输出文件生成预压缩文件"""
+    from modules.pool_executor import compress_executor
+
+    loop = asyncio.get_running_loop()
+    for path in paths:
+        await loop.run_in_executor(compress_executor, write_compressed_variants, path, encodings)
@@ -1,13 +1,14 @@
 import os
+import asyncio
+from functools import partial
 from typing import Optional
-import aiohttp
 from pathlib import Path
-import aiofiles
 import uuid
 import re
 from urllib.parse import urlparse
 from config import LOGO_URL_WHITELIST, LOGOS_DIR, LOGOS_ROOT
-from database import get_db_connection
+from utils.http_client import http_client, get_proxy_url
+from utils.output_publisher import publish_bytes
 import logging
 logger = logging.getLogger(__name__)
 
@@ -53,66 +54,38 @@ async def download_and_save_logo(logo_url: str, channel_name: Optional[str] = No
     base_filename = sanitize_filename(channel_name) if channel_name else 'logo'
     filename = f"{base_filename}{ext}"
     
-    # 获取代理配置
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM proxy_config LIMIT 1")
-        columns = [description[0] for description in c.description]
-        proxy_config_row = c.fetchone()
+    # 下载文件，复用共享HTTP客户端的连接池和主机并发限制
+    try:
+        content = await http_client.fetch_bytes(logo_url, proxy=await get_proxy_url())
+    except Exception as e:
+        raise Exception(f"下载logo失败: {str(e)}")
     
-    proxy_config = None
-    if proxy_config_row:
-        proxy_config = dict(zip(columns, proxy_config_row))
+    # 检查是否存在同名文件
+    save_path = os.path.join(PATH_LOGOS_ROOT, filename)
+    relative_path = LOGOS_DIR + f"/{filename}"
     
-    # 设置代理
-    session_kwargs = {}
-    if proxy_config and proxy_config.get('enabled'):
-        proxy_type = proxy_config.get('proxy_type', 'http')
-        host = proxy_config.get('host')
-        port = proxy_config.get('port')
-        username = proxy_config.get('username')
-        password = proxy_config.get('password')
+    # f"/{LOGO_STATIC_DIR}/{filename}"
+    
+    if os.path.exists(save_path):
+        # 比较文件大小
+        existing_size = os.path.getsize(save_path)
+        new_size = len(content)
         
-        if host and port:
-            proxy_url = f"{proxy_type}://"
-            if username and password:
-                proxy_url += f"{username}:{password}@"
-            proxy_url += f"{host}:{port}"
-            session_kwargs['proxy'] = proxy_url
+        if existing_size == new_size:
+            # 文件大小相同，直接返回已存在文件的路径
+            return relative_path
+        else:
+            # 使用logo_url生成固定的子目录名
+            import hashlib
+            # 使用logo_url的MD5哈希值前8位作为子目录名
+            unique_id = hashlib.md5(logo_url.encode()).hexdigest()[:8]
+            sub_dir = os.path.join(LOGOS_ROOT, unique_id)
+            os.makedirs(sub_dir, exist_ok=True)
+            save_path = os.path.join(sub_dir, filename)
+            relative_path = f"{LOGOS_DIR}/{unique_id}/{filename}"
     
-    # 下载文件
-    async with aiohttp.ClientSession(**session_kwargs) as session:
-        async with session.get(logo_url) as response:
-            if response.status == 200:
-                content = await response.read()
-                
-                # 检查是否存在同名文件
-                save_path = os.path.join(PATH_LOGOS_ROOT, filename)
-                relative_path = LOGOS_DIR + f"/{filename}"
-                
-                # f"/{LOGO_STATIC_DIR}/{filename}"
-                
-                if os.path.exists(save_path):
-                    # 比较文件大小
-                    existing_size = os.path.getsize(save_path)
-                    new_size = len(content)
-                    
-                    if existing_size == new_size:
-                        # 文件大小相同，直接返回已存在文件的路径
-                        return relative_path
-                    else:
-                        # 使用logo_url生成固定的子目录名
-                        import hashlib
-                        # 使用logo_url的MD5哈希值前8位作为子目录名
-                        unique_id = hashlib.md5(logo_url.encode()).hexdigest()[:8]
-                        sub_dir = os.path.join(LOGOS_ROOT, unique_id)
-                        os.makedirs(sub_dir, exist_ok=True)
-                        save_path = os.path.join(sub_dir, filename)
-                        relative_path = f"{LOGOS_DIR}/{unique_id}/{filename}"
-                
-                # 保存文件
-                async with aiofiles.open(save_path, 'wb') as f:
-                    await f.write(content)
-                    return relative_path
-            else:
-                raise Exception(f"下载logo失败: {response.status}")
\ No newline at end of file
+    # 原子保存文件，避免客户端读到写了一半的台标
+    await asyncio.get_running_loop().run_in_executor(
+        None, partial(publish_bytes, save_path, content, keep_previous=False)
+    )
+    return relative_path
\ No newline at end of file
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from database import async_db
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 连接池与超时的默认配置
+HTTP_POOL_LIMIT = 100  # 连接池总连接数
+HTTP_PER_HOST_LIMIT = 4  # 每个目标主机的最大并发请求数
+HTTP_CONNECT_TIMEOUT = 15  # 连接超时（秒）
+HTTP_READ_TIMEOUT = 60  # 两次读取之间的最大间隔（秒）
+HTTP_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+HTTP_MAX_HOST_SEMAPHORES = 1024  # 保留并发信号量的最大主机数，超出时淘汰最久未使用的主机
+
+
+async def get_proxy_config():
+    """获取代理配置"""
+    rows = await async_db.fetch_dicts("SELECT * FROM proxy_config LIMIT 1")
+    return rows[0] if rows else None
+
+async def get_proxy_settings():
+    """根据代理配置生成requests使用的代理设置"""
+    proxy_config = await get_proxy_config()
+    if not proxy_config or not proxy_config['enabled']:
+        return None
+    
+    proxy_type = proxy_config['proxy_type']
+    host = proxy_config['host']
+    port = proxy_config['port']
+    username = proxy_config['username']
+    password = proxy_config['password']
+    
+    auth = f"{username}:{password}@" if username and password else ""
+    proxy_url = f"{proxy_type}://{auth}{host}:{port}"
+    
+    return {
+        "http": proxy_url,
+        "https": proxy_url
+    }
+
+async def get_proxy_url() -> Optional[str]:
+    """获取异步HTTP客户端使用的代理地址"""
+    proxies = await get_proxy_settings()
+    if not proxies:
+        return None
+    return proxies.get('http') or proxies.get('https')
+
+
+@dataclass
+class FetchResult:
+    """条件请求的结果
+
+    status 为 304 时表示内容未变化，此时未下载任何内容。
+    """
+    status: int
+    content_type: str = ''
+    size: int = 0
+    content_hash: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+def conditional_headers(etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, str]:
+    """根据上次保存的校验信息构造条件请求头"""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+async def read_limited(response: aiohttp.ClientResponse, limit: int) -> bytes:
+    """读取响应内容直到结束或达到字节上限
+
+    StreamReader.read(n) 只返回当前已缓冲的数据，内容分多次到达时需循环读取。
+    """
+    chunks = []
+    size = 0
+    while size < limit:
+        chunk = await response.content.read(limit - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks)
+
+
+class SharedHttpClient:
+    """共享的异步HTTP客户端
+
+    所有源数据的拉取共用一个连接池，按目标主机限制并发，
+    长时间的下载不会阻塞事件循环。
+    """
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, per_host_limit: int = HTTP_PER_HOST_LIMIT,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_host_semaphores: int = HTTP_MAX_HOST_SEMAPHORES):
+        self.limit = limit
+        self.per_host_limit = per_host_limit
+        self.max_host_semaphores = max_host_semaphores
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = OrderedDict()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环上的会话，不存在或已失效时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._discard_session()
+            connector = aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+            self._host_semaphores = OrderedDict()
+        return self._session
+
+    def _discard_session(self):
+        """关闭绑定在其他事件循环上的旧会话"""
+        session, loop = self._session, self._loop
+        self._session = None
+        self._loop = None
+        if session is None or session.closed:
+            return
+        if loop is not None and not loop.is_closed():
+            # 连接只能在所属的事件循环上关闭，交给原事件循环执行
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            # 原事件循环已关闭，其上的连接无法再关闭，丢弃会话，由垃圾回收释放套接字
+            session.detach()
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """获取目标主机的并发信号量（使用代理时连接池无法区分目标主机）
+
+        按最近使用顺序保留，超过上限时淘汰最久未使用的主机，避免访问过的主机无限累积。
+        """
+        host = urlparse(url).netloc.lower()
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+            while len(self._host_semaphores) > self.max_host_semaphores:
+                self._host_semaphores.popitem(last=False)
+        else:
+            self._host_semaphores.move_to_end(host)
+        return semaphore
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, proxy: Optional[str] = None,
+                      timeout: Optional[aiohttp.ClientTimeout] = None, **kwargs):
+        """发起请求，返回响应的上下文管理器"""
+        session = self._get_session()
+        async with self._get_host_semaphore(url):
+            async with session.request(method, url, proxy=proxy, timeout=timeout or self.timeout, **kwargs) as response:
+                yield response
+
+    async def fetch_bytes(self, url: str, proxy: Optional[str] = None, **kwargs) -> bytes:
+        """获取完整的响应内容"""
+        async with self.request('GET', url, proxy=proxy, **kwargs) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}")
+            return await response.read()
+
+    async def fetch_text(self, url: str, proxy: Optional[str] = None, **kwargs) -> str:
+        """获取响应文本"""
+        async with self.request('GET', url, proxy=proxy, **kwargs) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}")
+            return await response.text(errors='replace')
+
+    async def download_to_file(self, url: str, dest, proxy: Optional[str] = None,
+                               chunk_size: int = HTTP_DOWNLOAD_CHUNK_SIZE, **kwargs) -> Tuple[str, int]:
+        """分块下载到已打开的二进制文件对象
+
+        Returns:
+            tuple: (Content-Type, 下载的字节数)
+        """
+        async with self.request('GET', url, proxy=proxy, **kwargs) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}")
+            content_type = response.headers.get('Content-Type', '').lower()
+            size = 0
+            async for chunk in response.content.iter_chunked(chunk_size):
+                dest.write(chunk)
+                size += len(chunk)
+            dest.flush()
+            return content_type, size
+
+    async def conditional_download(self, url: str, dest, etag: Optional[str] = None,
+                                   last_modified: Optional[str] = None, proxy: Optional[str] = None,
+                                   chunk_size: int = HTTP_DOWNLOAD_CHUNK_SIZE, **kwargs) -> FetchResult:
+        """带 If-None-Match / If-Modified-Since 的分块下载，下载时同步计算内容的SHA-256
+
+        服务端返回304时不写入dest，直接返回 not_modified 的结果。
+        """
+        headers = {**kwargs.pop('headers', {}), **conditional_headers(etag, last_modified)}
+        async with self.request('GET', url, proxy=proxy, headers=headers, **kwargs) as response:
+            if response.status == 304:
+                return FetchResult(
+                    status=304,
+                    etag=response.headers.get('ETag', etag),
+                    last_modified=response.headers.get('Last-Modified', last_modified)
+                )
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}")
+            hasher = hashlib.sha256()
+            size = 0
+            async for chunk in response.content.iter_chunked(chunk_size):
+                dest.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+            dest.flush()
+            return FetchResult(
+                status=200,
+                content_type=response.headers.get('Content-Type', '').lower(),
+                size=size,
+                content_hash=hasher.hexdigest(),
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+
+    async def close(self):
+        """关闭会话"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+# 全局共享的HTTP客户端
+http_client = SharedHttpClient()
@@ -0,0 +1,191 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, TextIO, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 写入输出文件时使用的缓冲区大小
+WRITE_BUFFER_SIZE = 256 * 1024
+# 比较新旧内容时每次读取的字节数
+COMPARE_CHUNK_SIZE = 1024 * 1024
+# 保留的上一版本文件的后缀
+PREVIOUS_SUFFIX = '.prev'
+
+
+def _fsync_directory(directory: Path):
+    """同步目录项，保证重命名在断电后仍然生效（不支持的平台忽略）"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _same_content(first: Path, second: Path) -> bool:
+    """逐块比较两个文件的内容"""
+    try:
+        if first.stat().st_size != second.stat().st_size:
+            return False
+        with open(first, 'rb') as a, open(second, 'rb') as b:
+            while True:
+                chunk_a = a.read(COMPARE_CHUNK_SIZE)
+                if chunk_a != b.read(COMPARE_CHUNK_SIZE):
+                    return False
+                if not chunk_a:
+                    return True
+    except FileNotFoundError:
+        return False
+
+
+def previous_version_path(path: Union[str, Path]) -> Path:
+    """上一版本文件的路径"""
+    path = Path(path)
+    return path.with_name(path.name + PREVIOUS_SUFFIX)
+
+
+class PublishedFile:
+    """一次发布的结果
+
+    Attributes:
+        path: 目标文件路径
+        changed: 内容是否发生变化（未变化时目标文件及其修改时间保持不变）
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.changed = False
+
+
+class OutputPublisher:
+    """原子地发布输出文件
+
+    内容先写入同目录的临时文件并fsync，完成后通过重命名替换目标文件，
+    读取方只会看到完整的旧文件或完整的新文件，写入中途崩溃也不会损坏目标文件。
+    新内容与现有文件相同时丢弃临时文件，不改写目标文件也不更新修改时间，
+    下游的ETag、预压缩文件等缓存因此保持有效。
+    """
+
+    def __init__(self, path: Union[str, Path], keep_previous: bool = True):
+        """
+        Args:
+            path: 目标文件路径
+            keep_previous: 内容变化时是否将旧文件保留为 <文件名>.prev
+        """
+        self.path = Path(path)
+        self.keep_previous = keep_previous
+        self.temp_path: Optional[Path] = None
+
+    def open_temp(self) -> int:
+        """在目标目录中创建临时文件，返回文件描述符"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + '.', suffix='.tmp')
+        self.temp_path = Path(temp_name)
+        return fd
+
+    def commit(self, mtime_ns: Optional[int] = None) -> PublishedFile:
+        """发布已写完并关闭的临时文件：比较内容，fsync后重命名替换目标文件
+
+        Args:
+            mtime_ns: 发布后目标文件的修改时间，用于与另一个文件保持同步（如预压缩文件）；
+                      内容未变化而修改时间不同时只更新修改时间
+        """
+        result = PublishedFile(self.path)
+        temp_path, self.temp_path = self.temp_path, None
+        try:
+            if _same_content(temp_path, self.path):
+                temp_path.unlink(missing_ok=True)
+                if mtime_ns is not None and self.path.stat().st_mtime_ns != mtime_ns:
+                    os.utime(self.path, ns=(mtime_ns, mtime_ns))
+                logger.debug(f"[输出发布] 内容未变化，跳过: {self.path}")
+                return result
+
+            # 重命名前先将内容落盘，避免断电后目标文件指向未写完的数据
+            fd = os.open(temp_path, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            # mkstemp创建的文件权限为0600，改为常规文件权限
+            os.chmod(temp_path, 0o644)
+            if mtime_ns is not None:
+                os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+
+            if self.keep_previous and self.path.exists():
+                self._keep_previous()
+
+            os.replace(temp_path, self.path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        _fsync_directory(self.path.parent)
+        result.changed = True
+        logger.debug(f"[输出发布] 已发布: {self.path}")
+        return result
+
+    def abort(self):
+        """放弃临时文件"""
+        if self.temp_path is not None:
+            self.temp_path.unlink(missing_ok=True)
+            self.temp_path = None
+
+    def _keep_previous(self):
+        """将当前文件保留为上一版本，目标文件在整个过程中始终存在"""
+        previous = previous_version_path(self.path)
+        link_path = previous.with_name(previous.name + '.tmp')
+        try:
+            link_path.unlink(missing_ok=True)
+            os.link(self.path, link_path)
+            os.replace(link_path, previous)
+        except OSError:
+            # 不支持硬链接的文件系统退回到复制
+            link_path.unlink(missing_ok=True)
+            shutil.copy2(self.path, previous)
+
+
+@contextmanager
+def publish_file(path: Union[str, Path], binary: bool = False, encoding: str = 'utf-8',
+                 keep_previous: bool = True, result: Optional[dict] = None) -> Iterator[Union[TextIO, BinaryIO]]:
+    """以上下文管理器的方式原子发布文件
+
+    with块正常结束时发布，抛出异常时丢弃临时文件，目标文件保持不变。
+
+    Args:
+        path: 目标文件路径
+        binary: 是否以二进制方式写入
+        encoding: 文本方式写入时的编码
+        keep_previous: 内容变化时是否保留上一版本
+        result: 传入字典时在其中记录发布结果 {'changed': bool}
+    """
+    publisher = OutputPublisher(path, keep_previous)
+    fd = publisher.open_temp()
+    try:
+        if binary:
+            f = os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE)
+        else:
+            f = open(fd, 'w', encoding=encoding, buffering=WRITE_BUFFER_SIZE)
+        with f:
+            yield f
+    except BaseException:
+        publisher.abort()
+        raise
+
+    published = publisher.commit()
+    if result is not None:
+        result['changed'] = published.changed
+
+
+def publish_bytes(path: Union[str, Path], content: bytes, keep_previous: bool = True) -> bool:
+    """原子发布字节内容，返回内容是否发生变化"""
+    result = {}
+    with publish_file(path, binary=True, keep_previous=keep_previous, result=result) as f:
+        f.write(content)
+    return result['changed']